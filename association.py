@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from camera_model import skew_matrix
+
+class PersonAssociator:
+    '''
+        Matches the people detected in every view to each other before
+        triangulation.
+
+        The cost between two detections of two views is their symmetric
+        epipolar distance in pixels, averaged over the joints confident in
+        both (computed for all pairs of people of a view pair at once).
+        Views are visited from the most to the least crowded: the people of
+        each view are assigned to the persons built so far with the
+        Hungarian algorithm on the mean cost to the person's detections;
+        pairs above max_distance are rejected and unmatched detections start
+        a new person. Persons seen by fewer than min_views views are dropped.
+    '''
+    def __init__(self, rig, min_confidence=0.1, max_distance=20.0, min_joints=3, min_views=2):
+        self.min_confidence = min_confidence
+        self.max_distance = max_distance # pixels
+        self.min_joints = min_joints # joints shared by two detections for a valid cost
+        self.min_views = min_views
+        self.rig = rig
+
+    @property
+    def rig(self):
+        return self._rig
+
+    @rig.setter
+    def rig(self, rig):
+        # essential matrices of every ordered view pair, x_b^T E[a, b] x_a = 0 in normalized coordinates
+        self._rig = rig
+        num_views = len(rig)
+        R = rig.extrinsics[:, :, :3]
+        T = rig.extrinsics[:, :, 3]
+        self.essentials = np.zeros((num_views, num_views, 3, 3))
+        for a in range(num_views):
+            for b in range(num_views):
+                if a != b:
+                    R_ab = R[b] @ R[a].T
+                    self.essentials[a, b] = skew_matrix(T[b] - R_ab @ T[a]) @ R_ab
+        # normalized -> pixel distance scale per view
+        self.focal = rig.mtx[:, [0, 1], [0, 1]].mean(axis=-1)
+
+    def detection_cost(self, views, points, valid):
+        '''
+            Mean symmetric epipolar distance (N, N) between every pair of the
+            N detections of all views, inf within a view and when fewer than
+            min_joints joints are confident in both detections.
+            points: homogeneous normalized coordinates (N, J, 3).
+        '''
+        # epipolar lines of every detection in every view, (N, V, J, 3); joints that are not
+        # confident get a zero line / point, so they add nothing to the sums below
+        lines = points[:, None] @ np.swapaxes(self.essentials[views], -1, -2)
+        lines *= valid[:, None, :, None] / (np.linalg.norm(lines[..., :2], axis=-1, keepdims=True) + 1e-12)
+        masked_points = points * valid[..., None]
+        # summed point-line distance in pixels of every detection pair, one block of target detections per view
+        total = np.empty((len(points), len(points)))
+        for view in np.unique(views):
+            targets = np.flatnonzero(views == view)
+            distance = np.abs(np.einsum('ajk,bjk->abj', lines[:, view], masked_points[targets]))
+            total[:, targets] = distance.sum(axis=-1) * self.focal[view]
+        # symmetric: line of a in b and line of b in a
+        total = 0.5 * (total + total.T)
+        count = valid.astype(np.float64) @ valid.T.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cost = np.where(count >= self.min_joints, total / count, np.inf)
+        cost[views[:, None] == views[None, :]] = np.inf
+        return cost
+
+    def associate(self, views):
+        '''
+            views: one (P_v, J, 3) array of (u, v, confidence) per rig view.
+            Returns (P, V, J, 3) with the detections of every matched person
+            per view (zero confidence where a view did not see the person),
+            ordered by total confidence, ready for Triangulator.
+        '''
+        num_views = len(views)
+        num_joints = np.shape(views[0])[-2] if num_views else 0
+        counts = [len(people) for people in views]
+        if sum(counts) == 0:
+            return np.zeros((0, num_views, num_joints, 3), dtype=np.float32)
+        detections = np.concatenate([np.asarray(people, dtype=np.float32).reshape(-1, num_joints, 3) for people in views])
+        detection_view = np.repeat(np.arange(num_views), counts)
+        first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        points = np.ones((len(detections), num_joints, 3))
+        for view in range(num_views):
+            if counts[view]:
+                points[first[view]:first[view] + counts[view], :, :2] = self._undistort(view, detections[first[view]:first[view] + counts[view], :, :2])
+        cost = self.detection_cost(detection_view, points, detections[..., 2] >= self.min_confidence)
+
+        # persons: list of detection indices, one per view at most
+        persons = []
+        for view in sorted(range(num_views), key=lambda v: -counts[v]):
+            if counts[view] == 0:
+                continue
+            candidates = np.arange(first[view], first[view] + counts[view])
+            matched = set()
+            if persons:
+                # mean cost of this view's detections to the detections of every person
+                membership = np.zeros((len(persons), len(detections)))
+                for p, person in enumerate(persons):
+                    membership[p, person] = 1
+                block = cost[:, candidates]
+                finite = np.isfinite(block)
+                person_count = membership @ finite
+                with np.errstate(invalid='ignore'):
+                    person_cost = np.where(person_count > 0, (membership @ np.where(finite, block, 0.0)) / person_count, np.inf)
+                # Hungarian assignment, forbidden pairs get a cost above any accepted one
+                rows, cols = linear_sum_assignment(np.where(np.isfinite(person_cost), person_cost, 1e9))
+                for row, col in zip(rows, cols):
+                    if person_cost[row, col] <= self.max_distance:
+                        persons[row].append(candidates[col])
+                        matched.add(col)
+            for col, detection in enumerate(candidates):
+                if col not in matched:
+                    persons.append([detection])
+
+        persons = [person for person in persons if len(person) >= self.min_views]
+        grouped = np.zeros((len(persons), num_views, num_joints, 3), dtype=np.float32)
+        for p, person in enumerate(persons):
+            grouped[p, detection_view[person]] = detections[person]
+        order = np.argsort(-grouped[..., 2].sum(axis=(-1, -2)), kind='stable')
+        return grouped[order]
+
+    def _undistort(self, view, pixels):
+        undistorted = cv2.undistortPoints(
+            np.ascontiguousarray(pixels, dtype=np.float64).reshape(-1, 1, 2),
+            self.rig.mtx[view], self.rig.dist[view]
+        )
+        return undistorted.reshape(pixels.shape)
@@ -0,0 +1,88 @@
+'''
+    Cross-view person association cost as people and cameras scale.
+
+    Several people stand in the capture volume of a synthetic ring rig
+    (see bench_multiview.py); every view detects them in shuffled order
+    with 1 px noise, some joints missing, and occasionally misses a person.
+    Reported per (cameras, people): PersonAssociator.associate time, the
+    association plus batched triangulation time, and the fraction of
+    persons whose views were all matched to the same ground-truth person.
+
+    python benchmarks/bench_association.py --views 2 4 8 --people 1 2 4 8
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from association import PersonAssociator
+from triangulation import Triangulator
+from bench_multiview import synthetic_rig, WIDTH, HEIGHT
+
+def synthetic_people(rig, world_to_ref, num_people, frames, miss_ratio=0.05, seed=0):
+    '''Per frame: one list of (P_v, 25, 3) detections per view and the ground-truth person index of every detection.'''
+    rng = np.random.default_rng(seed)
+    R0, t0 = world_to_ref
+    samples = []
+    for _ in range(frames):
+        # people at least ~700 mm apart on a grid, standing 0..1800 mm tall
+        cells = rng.choice(36, num_people, replace=False)
+        centre = np.stack([(cells % 6 - 2.5) * 700, (cells // 6 - 2.5) * 700, np.zeros(num_people)], axis=-1)
+        joints = centre[:, None] + rng.uniform([-250, -250, 0], [250, 250, 1800], (num_people, 25, 3))
+        pixels, depth = rig.project(joints @ R0.T + t0, world=False) # (P, V, 25, 2)
+        views = []
+        identities = []
+        for view in range(len(rig)):
+            seen = np.flatnonzero(rng.random(num_people) >= miss_ratio)
+            seen = rng.permutation(seen)
+            people = np.empty((len(seen), 25, 3), dtype=np.float32)
+            people[..., :2] = pixels[seen, view] + rng.normal(0, 1.0, (len(seen), 25, 2))
+            people[..., 2] = rng.uniform(0.4, 1.0, (len(seen), 25))
+            inside = (people[..., 0] >= 0) & (people[..., 0] < WIDTH) & (people[..., 1] >= 0) & (people[..., 1] < HEIGHT) & (depth[seen, view] > 0)
+            people[..., 2] *= inside & (rng.random((len(seen), 25)) > 0.1)
+            views.append(people)
+            identities.append(seen)
+        samples.append((views, identities))
+    return samples
+
+def purity(grouped, views, identities):
+    '''Fraction of associated persons whose detections all come from one ground-truth person.'''
+    pure = 0
+    for person in grouped:
+        owners = set()
+        for view, detection in enumerate(person):
+            if detection[:, 2].any():
+                match = np.flatnonzero((views[view] == detection).all(axis=(-1, -2)))
+                owners.add(identities[view][match[0]])
+        pure += len(owners) == 1
+    return pure / len(grouped) if len(grouped) else np.nan
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--views', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--people', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'views':>5} {'people':>6} {'associate us':>13} {'+ triangulate us':>17} {'persons':>8} {'purity':>7}")
+    for num_views in args.views:
+        rig, world_to_ref = synthetic_rig(num_views)
+        associator = PersonAssociator(rig)
+        triangulator = Triangulator(rig)
+        for num_people in args.people:
+            samples = synthetic_people(rig, world_to_ref, num_people, args.frames)
+            start = time.perf_counter()
+            results = [associator.associate(views) for views, _ in samples]
+            associate_time = (time.perf_counter() - start) / args.frames
+            start = time.perf_counter()
+            for views, _ in samples:
+                triangulator.triangulate_robust(associator.associate(views))
+            total_time = (time.perf_counter() - start) / args.frames
+            persons = np.mean([len(grouped) for grouped in results])
+            score = np.nanmean([purity(grouped, views, identities) for grouped, (views, identities) in zip(results, samples)])
+            print(f"{num_views:>5} {num_people:>6} {associate_time * 1e6:>13.1f} {total_time * 1e6:>17.1f} {persons:>8.2f} {score:>7.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+    Joint N-camera extrinsic calibration on a synthetic rig.
+
+    --cameras cameras on a 150 degree arc of radius 3 m look at the centre, where
+    --views chessboard poses (8x6, 28 mm) are placed at random. Every
+    camera observes the boards facing it that project fully into its
+    1280x720 image, with --noise px of corner noise. Like
+    calibration.extract_rig_parameters, per-camera board poses (solvePnP),
+    initial_extrinsics and bundle_adjust are run with the true intrinsics.
+    Reported per rig size: observations, parameters, bundle adjustment
+    time, reprojection rms, and the camera pose error against the truth
+    for the chained initial estimate and after the adjustment.
+
+    python benchmarks/bench_bundle_adjustment.py --cameras 2 4 8 12 --views 300
+'''
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from calibration import initial_extrinsics, bundle_adjust, rotation_matrices
+
+WIDTH, HEIGHT = 1280, 720
+MTX = np.array([[900.0, 0, WIDTH / 2], [0, 900.0, HEIGHT / 2], [0, 0, 1]])
+DIST = np.array([0.05, -0.1, 0.0, 0.0, 0.0])
+ARC = 150 # degrees; the board is printed on one side, so all cameras face roughly the same way
+
+def look_at(center, target):
+    '''World -> camera rotation of a camera at center looking at target (y down).'''
+    z = target - center
+    z /= np.linalg.norm(z)
+    x = np.cross(z, [0, 0, 1.0])
+    x /= np.linalg.norm(x)
+    y = np.cross(z, x)
+    return np.stack([x, y, z])
+
+def synthetic_rig(num_cameras, num_views, noise, rng):
+    objp = np.zeros((48, 3))
+    objp[:, :2] = np.mgrid[0:8, 0:6].T.reshape(-1, 2) * 28.0
+    world = {}
+    for cam_id in range(num_cameras):
+        angle = np.radians(ARC) * (cam_id / max(num_cameras - 1, 1) - 0.5)
+        center = np.array([3000 * np.cos(angle), 3000 * np.sin(angle), 1500 + 300 * (cam_id % 2)])
+        R = look_at(center, np.array([0, 0, 1000.0]))
+        world[cam_id] = (R, -R @ center)
+    # relative to camera 0: X_cam = R X_ref + t
+    R0, t0 = world[0]
+    truth = {cam_id: (R @ R0.T, t - R @ R0.T @ t0) for cam_id, (R, t) in world.items()}
+
+    board_poses = {cam_id: {} for cam_id in world}
+    observations = {cam_id: {} for cam_id in world}
+    for view in range(num_views):
+        R_board = rotation_matrices(rng.normal(0, 1.0, 3))[0]
+        t_board = rng.normal([0, 0, 1000], [600, 600, 300])
+        points = objp @ R_board.T + t_board
+        for cam_id, (R, t) in world.items():
+            # printed side only (camera on the board's -z side), not too edge-on to be detected
+            direction = R_board.T @ (-R.T @ t - t_board)
+            if direction[2] > -0.3 * np.linalg.norm(direction):
+                continue
+            X_cam = points @ R.T + t
+            if (X_cam[:, 2] < 500).any():
+                continue
+            pixels, _ = cv2.projectPoints(X_cam, np.zeros(3), np.zeros(3), MTX, DIST)
+            pixels = pixels.reshape(-1, 2) + rng.normal(0, noise, (len(objp), 2))
+            if (pixels < 0).any() or (pixels[:, 0] >= WIDTH).any() or (pixels[:, 1] >= HEIGHT).any():
+                continue
+            ok, rvec, tvec = cv2.solvePnP(objp, pixels, MTX, DIST)
+            board_poses[cam_id][view] = (cv2.Rodrigues(rvec)[0], tvec.ravel())
+            observations[cam_id][view] = pixels
+    return objp, truth, board_poses, observations
+
+def pose_error(estimate, truth):
+    rotation = []
+    translation = []
+    for cam_id, (R, t) in truth.items():
+        R_est, t_est = estimate[cam_id]
+        rotation.append(np.degrees(np.linalg.norm(cv2.Rodrigues(R_est @ R.T)[0])))
+        translation.append(np.linalg.norm(t_est - t))
+    return max(rotation), max(translation)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, nargs='+', default=[2, 4, 8, 12])
+    parser.add_argument('--views', type=int, default=300)
+    parser.add_argument('--noise', type=float, default=0.3, help="corner noise (px)")
+    args = parser.parse_args()
+
+    print(f"{args.views} board poses, {args.noise} px noise")
+    print(f"{'cams':>4} {'obs':>6} {'params':>6} {'BA s':>7} {'rms px':>7} {'init deg':>8} {'init mm':>8} {'BA deg':>7} {'BA mm':>7}")
+    for num_cameras in args.cameras:
+        rng = np.random.default_rng(num_cameras)
+        objp, truth, board_poses, pixels = synthetic_rig(num_cameras, args.views, args.noise, rng)
+        camera_ids = list(truth)
+        camera_poses = initial_extrinsics(board_poses, camera_ids, 0)
+        view_poses = {}
+        for cam_id in camera_ids:
+            R_c, t_c = camera_poses[cam_id]
+            for view, (R_cb, t_cb) in board_poses[cam_id].items():
+                view_poses.setdefault(view, (R_c.T @ R_cb, R_c.T @ (t_cb - t_c)))
+        observations = [
+            (cam_id, view, cv2.undistortPoints(points.reshape(-1, 1, 2), MTX, DIST).reshape(-1, 2), MTX[0, 0])
+            for cam_id in camera_ids for view, points in pixels[cam_id].items()
+        ]
+        init_rotation, init_translation = pose_error(camera_poses, truth)
+        start = time.perf_counter()
+        refined, _, rms, _ = bundle_adjust(objp, observations, camera_poses, view_poses, 0)
+        elapsed = time.perf_counter() - start
+        rotation, translation = pose_error(refined, truth)
+        params = 6 * (num_cameras - 1 + len(view_poses))
+        print(f"{num_cameras:>4} {len(observations):>6} {params:>6} {elapsed:>7.2f} {rms:>7.3f} "
+              f"{init_rotation:>8.3f} {init_translation:>8.2f} {rotation:>7.3f} {translation:>7.2f}")
+
+if __name__ == '__main__':
+    main()
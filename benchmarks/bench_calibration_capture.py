@@ -0,0 +1,101 @@
+'''
+    Calibration capture: cost of a board check and views kept.
+
+    Renders --views synthetic views per camera (bench_chessboard.render:
+    the board at a random place and tilt, --empty of them without a board)
+    and runs the CalibrationCapture check over them in order:
+        check ms    : board search per frame, coarse (--coarse-width, no
+                      cornerSubPix, as in the capture worker) and at full res
+        kept        : views saved before the coverage targets were met, and
+                      the checks it took
+        blind loop  : the former photo loop saving every --blind-every-th
+                      view: views saved and how many of them had the board
+                      in every camera
+    Coverage and pose classes reached are printed per camera.
+
+    python benchmarks/bench_calibration_capture.py --views 300 --cameras 2
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from calibration import find_chessboard
+from calibration_capture import CalibrationCoverage
+from bench_chessboard import render
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--views', type=int, default=300)
+    parser.add_argument('--cameras', type=int, default=2)
+    parser.add_argument('--empty', type=int, default=60, help="views without board, per camera")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--coarse-width', type=int, default=640)
+    parser.add_argument('--blind-every', type=int, default=25, help="photo loop period in views (5 s at 5 checks/s)")
+    args = parser.parse_args()
+
+    checkerboard_size = (8, 6)
+    path = tempfile.mkdtemp(prefix="bench_calibration_capture_")
+    try:
+        frames = {}
+        has_board = {}
+        rng = np.random.default_rng(0)
+        for cam_id in range(args.cameras):
+            os.makedirs(os.path.join(path, f"{cam_id}"))
+            truth = render(os.path.join(path, f"{cam_id}"), args.views, args.empty, (args.width, args.height), checkerboard_size, seed=cam_id)
+            # the empty views are the first ones, spread them over the sweep
+            order = rng.permutation(args.views)
+            image_fns = sorted(truth)
+            frames[cam_id] = [cv2.imread(image_fns[index]) for index in order]
+            has_board[cam_id] = [truth[image_fns[index]] is not None for index in order]
+
+        gray = np.empty((args.height, args.width), dtype=np.uint8)
+        timings = {'coarse': [], 'full res': []}
+        for name, coarse_width in [('coarse', args.coarse_width), ('full res', 0)]:
+            for frame in frames[0][:50]:
+                cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+                start = time.perf_counter()
+                find_chessboard(gray, checkerboard_size, coarse_width, subpix=False)
+                timings[name].append(time.perf_counter() - start)
+
+        coverage = CalibrationCoverage(range(args.cameras), (args.width, args.height), checkerboard_size)
+        checks = 0
+        check_time = 0.0
+        for view in range(args.views):
+            if coverage.done():
+                break
+            checks += 1
+            start = time.perf_counter()
+            corners = {}
+            for cam_id in range(args.cameras):
+                cv2.cvtColor(frames[cam_id][view], cv2.COLOR_BGR2GRAY, dst=gray)
+                corners[cam_id] = find_chessboard(gray, checkerboard_size, args.coarse_width, subpix=False)
+                if corners[cam_id] is None:
+                    break
+            if all(view_corners is not None for view_corners in corners.values()) and coverage.is_new(corners):
+                coverage.add(corners)
+            check_time += time.perf_counter() - start
+
+        blind = list(range(0, args.views, args.blind_every))
+        blind_usable = sum(all(has_board[cam_id][view] for cam_id in range(args.cameras)) for view in blind)
+
+        print(f"{args.cameras} cameras x {args.views} views {args.width}x{args.height} ({args.empty} without board per camera)")
+        for name, values in timings.items():
+            print(f"check {name:>8}: {np.mean(values) * 1e3:7.2f} ms / frame (max {np.max(values) * 1e3:.2f})")
+        state = "targets met" if coverage.done() else "targets not met"
+        print(f"capture: {coverage.photos} views kept after {checks} checks ({state}), {check_time / max(checks, 1) * 1e3:.2f} ms / check")
+        summary = coverage.summary()
+        for cam_id in range(args.cameras):
+            print(f"  camera {cam_id}: coverage {summary['coverage'][cam_id]:.2f}, pose classes {summary['poses'][cam_id]}")
+        print(f"blind loop: {len(blind)} views saved over the sweep, {blind_usable} with the board in every camera")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
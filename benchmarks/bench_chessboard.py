@@ -0,0 +1,114 @@
+'''
+    Chessboard detection of calibration.detect_chessboards against core count.
+
+    Renders --images synthetic calibration frames (the board under a random
+    perspective, blur and noise; --empty of them without a board) and
+    times detection:
+        full res   : findChessboardCorners on the full image, one process
+                     (the former extract_camera_parameters loop)
+        coarse  xN : coarse pass at --coarse-width + full-res cornerSubPix on N processes
+        cached     : second run, every image found in the corner cache
+    Also reported: images found and the mean corner error (px) against the
+    rendered ground truth.
+
+    python benchmarks/bench_chessboard.py --images 200 --processes 1 2 4 8
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from calibration import detect_chessboards
+
+def render(path, count, empty, size, checkerboard_size, seed=0):
+    '''Writes the frames, returns {image_fn: ground truth corners (N, 2) or None}.'''
+    rng = np.random.default_rng(seed)
+    width, height = size
+    columns, rows = checkerboard_size[0] + 1, checkerboard_size[1] + 1
+    square = 60
+    board = np.full(((rows + 2) * square, (columns + 2) * square), 255, np.uint8)
+    for row in range(rows):
+        for column in range(columns):
+            if (row + column) % 2 == 0:
+                board[(row + 1) * square:(row + 2) * square, (column + 1) * square:(column + 2) * square] = 0
+    inner = np.array([[(column + 2) * square, (row + 2) * square] for row in range(checkerboard_size[1]) for column in range(checkerboard_size[0])], np.float32)
+    source = np.array([[0, 0], [board.shape[1], 0], [board.shape[1], board.shape[0]], [0, board.shape[0]]], np.float32)
+
+    truth = {}
+    for index in range(count):
+        image_fn = os.path.join(path, f"frame_{index:05d}.jpg")
+        background = rng.integers(90, 160, (height // 8, width // 8), dtype=np.uint8)
+        image = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+        corners = None
+        if index >= empty:
+            # board of 30 - 60 % of the frame height, tilted up to ~35 degrees
+            board_height = height * rng.uniform(0.3, 0.6)
+            board_width = board_height * board.shape[1] / board.shape[0]
+            x0 = rng.uniform(0.05 * width, width - board_width * 1.1)
+            y0 = rng.uniform(0.05 * height, height - board_height * 1.1)
+            target = np.array([[x0, y0], [x0 + board_width, y0], [x0 + board_width, y0 + board_height], [x0, y0 + board_height]], np.float32)
+            target += rng.normal(0, 0.08 * board_height, target.shape).astype(np.float32)
+            H = cv2.getPerspectiveTransform(source, target)
+            warped = cv2.warpPerspective(board, H, (width, height), flags=cv2.INTER_LINEAR, borderValue=0)
+            mask = cv2.warpPerspective(np.full(board.shape, 255, np.uint8), H, (width, height)) > 0
+            image[mask] = warped[mask]
+            corners = cv2.perspectiveTransform(inner[None], H)[0]
+        image = cv2.GaussianBlur(image, (3, 3), 0.8)
+        image = np.clip(image + rng.normal(0, 3, image.shape), 0, 255).astype(np.uint8)
+        cv2.imwrite(image_fn, image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        truth[image_fn] = corners
+    return truth
+
+def score(detections, truth):
+    found = [image_fn for image_fn, (corners, _) in detections.items() if corners is not None]
+    errors = []
+    for image_fn in found:
+        if truth[image_fn] is None:
+            continue
+        corners = detections[image_fn][0].reshape(-1, 2)
+        # the board may be detected starting from either end
+        error = min(np.linalg.norm(corners - truth[image_fn], axis=1).mean(), np.linalg.norm(corners[::-1] - truth[image_fn], axis=1).mean())
+        errors.append(error)
+    return len(found), np.mean(errors) if errors else np.nan
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--empty', type=int, default=20, help="frames without a board")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--coarse-width', type=int, default=640)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    checkerboard_size = (8, 6)
+    path = tempfile.mkdtemp(prefix="bench_chessboard_")
+    try:
+        truth = render(path, args.images, args.empty, (args.width, args.height), checkerboard_size)
+        image_fns = sorted(truth)
+        print(f"{args.images} frames {args.width}x{args.height} ({args.empty} without board), {os.cpu_count()} cores")
+        print(f"{'mode':>12} {'wall s':>7} {'ms/img':>7} {'found':>6} {'err px':>7}")
+
+        def run(name, **kwargs):
+            start = time.perf_counter()
+            detections = detect_chessboards(image_fns, checkerboard_size, **kwargs)
+            elapsed = time.perf_counter() - start
+            found, error = score(detections, truth)
+            print(f"{name:>12} {elapsed:>7.2f} {elapsed / len(image_fns) * 1e3:>7.1f} {found:>6} {error:>7.3f}")
+
+        run("full res", coarse_width=0, processes=1, cache_path=None)
+        for processes in args.processes:
+            run(f"coarse x{processes}", coarse_width=args.coarse_width, processes=processes, cache_path=None)
+        cache_path = os.path.join(path, "corners_cache.json")
+        detect_chessboards(image_fns, checkerboard_size, coarse_width=args.coarse_width, processes=max(args.processes), cache_path=cache_path)
+        run("cached", coarse_width=args.coarse_width, processes=max(args.processes), cache_path=cache_path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
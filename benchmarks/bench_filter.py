@@ -0,0 +1,99 @@
+'''
+    Temporal filtering of 3D skeletons: cost and accuracy of SkeletonFilter.
+
+    Synthetic people walk on circles (25 joints swinging around the body
+    centre) sampled at --rate Hz with --noise mm triangulation noise; joints
+    randomly drop below the confidence threshold for short bursts. The pose
+    of a frame becomes available --latency seconds after its capture.
+
+    Reported per person count: median filter cost per frame (update + predict),
+    position error against the truth at the time the pose is used (raw
+    stale pose vs filtered pose predicted by the latency), jitter (RMS
+    frame-to-frame acceleration) and the fraction of dropped joints the
+    filter still outputs.
+
+    python benchmarks/bench_filter.py --people 1 2 4 --frames 2000
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scipy.optimize import linear_sum_assignment
+from filtering import SkeletonFilter
+
+def synthetic_walk(num_people, frames, rate, noise, drop_ratio, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames) / rate
+    offsets = rng.uniform([-250, -250, 0], [250, 250, 1800], (num_people, 25, 3))
+    phase = rng.uniform(0, 2 * np.pi, (num_people, 25))
+    radius = 600 + 400 * np.arange(num_people)
+    speed = 1.2 / (1 + np.arange(num_people)) # rad/s around the circle
+    angle = speed[None, :] * t[:, None] # (T, P)
+    centre = np.stack([radius * np.cos(angle), radius * np.sin(angle), np.zeros_like(angle)], axis=-1)
+    swing = 80 * np.sin(2 * np.pi * 1.5 * t[:, None, None] + phase[None])[..., None] * np.array([1.0, 0.5, 0.2])
+    truth = centre[:, :, None, :] + offsets[None] + swing # (T, P, 25, 3)
+
+    measured = np.empty(truth.shape[:-1] + (4,), dtype=np.float32)
+    measured[..., :3] = truth + rng.normal(0, noise, truth.shape)
+    measured[..., 3] = rng.uniform(0.4, 1.0, truth.shape[:-1])
+    # bursts of 1-8 frames below the confidence threshold
+    dropped = np.zeros(truth.shape[:-1], dtype=bool)
+    starts = np.argwhere(rng.random(truth.shape[:-1]) < drop_ratio / 4)
+    for frame, person, joint in starts:
+        dropped[frame:frame + rng.integers(1, 9), person, joint] = True
+    measured[dropped, 3] = 0.05
+    return t, truth, measured, dropped
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--people', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=60.0)
+    parser.add_argument('--noise', type=float, default=15.0, help="measurement noise (mm)")
+    parser.add_argument('--latency', type=float, default=0.05, help="capture to output latency (s)")
+    parser.add_argument('--drop', type=float, default=0.05, help="fraction of joints below threshold")
+    args = parser.parse_args()
+
+    print(f"{'people':>6} {'us/frame':>9} {'raw err mm':>11} {'filtered err mm':>16} {'raw jitter':>11} {'filtered jitter':>16} {'gap filled':>11}")
+    for num_people in args.people:
+        t, truth, measured, dropped = synthetic_walk(num_people, args.frames, args.rate, args.noise, args.drop)
+        skeleton_filter = SkeletonFilter(max_people=num_people + 1)
+        filtered = np.zeros(truth.shape)
+        filtered_confidence = np.zeros(truth.shape[:-1])
+        timings = np.empty(args.frames)
+        for frame in range(args.frames):
+            start = time.perf_counter()
+            skeleton_filter.update(measured[frame], t[frame])
+            output = skeleton_filter.predict(args.latency)
+            timings[frame] = time.perf_counter() - start
+            # track order is not person order, map every output skeleton to the closest true person
+            if len(output):
+                centroid_error = np.linalg.norm(output[:, None, :, :3].mean(axis=2) - truth[frame, None].mean(axis=2), axis=-1)
+                rows, cols = linear_sum_assignment(centroid_error)
+                filtered[frame, cols] = output[rows, :, :3]
+                filtered_confidence[frame, cols] = output[rows, :, 3]
+
+        # the pose of frame f is used at t[f] + latency
+        shift = int(round(args.latency * args.rate))
+        used = slice(0, args.frames - shift)
+        target = truth[shift:]
+        measured_ok = ~dropped[used]
+        raw_error = np.linalg.norm(measured[used, ..., :3] - target, axis=-1)[measured_ok].mean()
+        filtered_error = np.linalg.norm(filtered[used] - target, axis=-1)[filtered_confidence[used] > 0].mean()
+
+        def jitter(positions, valid):
+            acceleration = positions[2:] - 2 * positions[1:-1] + positions[:-2]
+            ok = valid[2:] & valid[1:-1] & valid[:-2]
+            return np.sqrt((np.linalg.norm(acceleration, axis=-1)[ok] ** 2).mean())
+
+        raw_jitter = jitter(measured[..., :3], ~dropped)
+        filtered_jitter = jitter(filtered, filtered_confidence > 0)
+        gap_filled = (filtered_confidence[dropped] > 0).mean() if dropped.any() else 1.0
+        print(f"{num_people:>6} {np.median(timings) * 1e6:>9.1f} {raw_error:>11.1f} {filtered_error:>16.1f} "
+              f"{raw_jitter:>11.1f} {filtered_jitter:>16.1f} {gap_filled:>11.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''
+    CPU cost of N idle consumers waiting for new frames.
+
+    A publisher posts a small frame at --fps (default 5, i.e. mostly idle).
+    Each consumer waits for new frames in one of three ways and reports the
+    CPU time it burned over the run:
+
+        manager : old busy loop reading shared_dict[...]['image_id'] via the Manager proxy
+        spin    : busy loop on FrameRing.latest_id() (no IPC, still a full core)
+        notify  : FrameSubscription.wait() (sleeps until the publisher notifies)
+
+    python benchmarks/bench_frame_notify.py --consumers 1 2 4 --duration 3
+'''
+import os
+import sys
+import time
+import ctypes
+import argparse
+import numpy as np
+from multiprocessing import Process, Queue, Manager, Value
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frame_buffer import FrameRing, FrameNotifier
+
+STREAM = "CameraReader 0"
+
+def publisher(ring, shared_dict, stop, fps):
+    frame = np.zeros(ring.shape, dtype=ring.dtype)
+    frame_id = 0
+    while not stop.value:
+        ring.write(frame, frame_id)
+        if shared_dict is not None:
+            shared_dict[STREAM] = {'image_id': frame_id}
+        frame_id += 1
+        time.sleep(1.0 / fps)
+
+def consumer(mode, ring, shared_dict, stop, result):
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    prev_id = -1
+    frames = 0
+    if mode == 'manager':
+        while not stop.value:
+            image_id = shared_dict[STREAM]['image_id']
+            if image_id != prev_id:
+                prev_id = image_id
+                frames += 1
+    elif mode == 'spin':
+        while not stop.value:
+            if ring.latest_id() != prev_id:
+                prev_id = ring.latest_id()
+                frames += 1
+    else:
+        subscription = ring.subscribe()
+        while not stop.value:
+            if ring.latest_id() != prev_id:
+                prev_id = ring.latest_id()
+                frames += 1
+            else:
+                subscription.wait(timeout=0.1)
+        subscription.close()
+    result.put((time.process_time() - cpu_start, time.perf_counter() - wall_start, frames))
+
+def run_case(mode, consumers, duration, fps):
+    notifier = FrameNotifier([STREAM], max_subscribers=max(16, consumers))
+    ring = FrameRing((480, 640, 3), np.uint8, num_slots=3, notifier=notifier, stream=STREAM)
+    stop = Value(ctypes.c_bool, False, lock=False)
+    result = Queue()
+    manager = Manager() if mode == 'manager' else None
+    shared_dict = None
+    if manager is not None:
+        shared_dict = manager.dict()
+        shared_dict[STREAM] = {'image_id': -1}
+    procs = [Process(target=consumer, args=(mode, ring, shared_dict, stop, result)) for _ in range(consumers)]
+    procs.append(Process(target=publisher, args=(ring, shared_dict, stop, fps)))
+    for proc in procs:
+        proc.start()
+    time.sleep(duration)
+    stop.value = True
+    rows = [result.get() for _ in range(consumers)]
+    for proc in procs:
+        proc.join()
+    if manager is not None:
+        manager.shutdown()
+    cpu_percent = sum(cpu / wall for cpu, wall, _ in rows) / consumers * 100
+    frames = sum(f for _, _, f in rows) / consumers
+    return cpu_percent, frames
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--fps', type=float, default=5.0, help="publisher rate")
+    parser.add_argument('--consumers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--modes', nargs='+', default=['manager', 'spin', 'notify'])
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'consumers':>9} {'cpu %/consumer':>15} {'frames/consumer':>16}")
+    for mode in args.modes:
+        for consumers in args.consumers:
+            cpu_percent, frames = run_case(mode, consumers, args.duration, args.fps)
+            print(f"{mode:>8} {consumers:>9} {cpu_percent:>15.1f} {frames:>16.1f}")
+
+if __name__ == '__main__':
+    main()
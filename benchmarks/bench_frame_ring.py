@@ -0,0 +1,135 @@
+'''
+    Stress benchmark for FrameRing.
+
+    One writer process fills 1280x720 frames as fast as it can (or at --fps),
+    every frame stamped with (frame_id % 251) over the whole image. Consumer
+    processes read the latest frame and check the stamp on the first, middle
+    and last rows, so a frame that is half one capture and half the next is
+    counted as torn. The "naive" row reproduces the old single
+    multiprocessing.Array without any guard.
+
+    python benchmarks/bench_frame_ring.py --duration 3 --slots 1 2 3 4 8 --consumers 1 2 4
+'''
+import os
+import sys
+import time
+import ctypes
+import argparse
+import numpy as np
+from multiprocessing import Process, Queue, RawArray, Value
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frame_buffer import FrameRing
+
+HEIGHT, WIDTH = 720, 1280
+
+def stamp_of(frame_id):
+    return frame_id % 251
+
+def is_torn(frame, frame_id):
+    stamp = stamp_of(frame_id)
+    return not (frame[0, 0, 0] == stamp and frame[HEIGHT // 2, WIDTH // 2, 1] == stamp and frame[-1, -1, 2] == stamp)
+
+def ring_writer(ring, stop, fps, result):
+    frame_id = 0
+    period = 1.0 / fps if fps else 0
+    start = time.perf_counter()
+    while not stop.value:
+        ring.begin_write().fill(stamp_of(frame_id))
+        ring.end_write(frame_id)
+        frame_id += 1
+        if period:
+            delay = start + frame_id * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    result.put(('writer', frame_id, time.perf_counter() - start))
+
+def ring_consumer(ring, stop, result):
+    out = np.empty(ring.shape, dtype=ring.dtype)
+    prev_id = -1
+    reads = torn = 0
+    start = time.perf_counter()
+    while not stop.value:
+        if ring.latest_id() == prev_id:
+            continue
+        prev_id, _, out = ring.read(out=out)
+        reads += 1
+        torn += is_torn(out, prev_id)
+    result.put(('consumer', reads, torn, time.perf_counter() - start))
+
+def naive_writer(buffer, image_id, stop, fps, result):
+    frame = np.frombuffer(buffer, dtype=np.uint8).reshape((HEIGHT, WIDTH, 3))
+    frame_id = 0
+    period = 1.0 / fps if fps else 0
+    start = time.perf_counter()
+    while not stop.value:
+        image_id.value = frame_id
+        frame.fill(stamp_of(frame_id))
+        frame_id += 1
+        if period:
+            delay = start + frame_id * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    result.put(('writer', frame_id, time.perf_counter() - start))
+
+def naive_consumer(buffer, image_id, stop, result):
+    frame = np.frombuffer(buffer, dtype=np.uint8).reshape((HEIGHT, WIDTH, 3))
+    out = np.empty_like(frame)
+    prev_id = -1
+    reads = torn = 0
+    start = time.perf_counter()
+    while not stop.value:
+        if image_id.value == prev_id:
+            continue
+        prev_id = image_id.value
+        out[:] = frame
+        reads += 1
+        torn += is_torn(out, prev_id)
+    result.put(('consumer', reads, torn, time.perf_counter() - start))
+
+def run_case(slots, consumers, duration, fps):
+    stop = Value(ctypes.c_bool, False, lock=False)
+    result = Queue()
+    if slots == 0:
+        buffer = RawArray(ctypes.c_uint8, HEIGHT * WIDTH * 3)
+        image_id = Value(ctypes.c_int64, -1, lock=False)
+        procs = [Process(target=naive_writer, args=(buffer, image_id, stop, fps, result))]
+        procs += [Process(target=naive_consumer, args=(buffer, image_id, stop, result)) for _ in range(consumers)]
+    else:
+        ring = FrameRing((HEIGHT, WIDTH, 3), np.uint8, num_slots=slots)
+        procs = [Process(target=ring_writer, args=(ring, stop, fps, result))]
+        procs += [Process(target=ring_consumer, args=(ring, stop, result)) for _ in range(consumers)]
+    for proc in procs:
+        proc.start()
+    time.sleep(duration)
+    stop.value = True
+    rows = [result.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    writes, write_time = [(r[1], r[2]) for r in rows if r[0] == 'writer'][0]
+    reads = sum(r[1] for r in rows if r[0] == 'consumer')
+    torn = sum(r[2] for r in rows if r[0] == 'consumer')
+    read_time = max(r[3] for r in rows if r[0] == 'consumer')
+    return writes / write_time, reads / read_time / consumers, torn, reads
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--fps', type=float, default=0, help="writer rate, 0 = as fast as possible")
+    parser.add_argument('--slots', type=int, nargs='+', default=[1, 2, 3, 4, 8])
+    parser.add_argument('--consumers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--no-naive', action='store_true', help="skip the unguarded single-buffer baseline")
+    args = parser.parse_args()
+
+    cases = [] if args.no_naive else [0]
+    cases += args.slots
+    print(f"{'slots':>6} {'consumers':>9} {'writes/s':>10} {'reads/s/consumer':>17} {'reads':>8} {'torn':>6}")
+    for slots in cases:
+        for consumers in args.consumers:
+            write_rate, read_rate, torn, reads = run_case(slots, consumers, args.duration, args.fps)
+            label = 'naive' if slots == 0 else str(slots)
+            print(f"{label:>6} {consumers:>9} {write_rate:>10.1f} {read_rate:>17.1f} {reads:>8} {torn:>6}")
+
+if __name__ == '__main__':
+    main()
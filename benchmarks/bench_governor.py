@@ -0,0 +1,76 @@
+'''
+    QualityGovernor reaction to a load step, with the stub backend.
+
+    Frames "arrive" at --camera-fps; the loop always runs the newest one
+    (like PoseEstimator) and feeds the governor the capture -> result
+    latency and the inference time. The per-frame cost of the stub is
+    --frame-cost at 128x192, scaled by the network area of the current
+    tier, and multiplied by --load during the middle third of the run
+    (another process taking the GPU). Printed per second: the quality
+    level, the processed fps and the mean / p95 latency.
+
+    python benchmarks/bench_governor.py --duration 15 --frame-cost 0.004 --load 4
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pose_backend import create_pose_backend
+from governor import QualityGovernor, DEFAULT_QUALITY_TIERS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=15.0, help="seconds")
+    parser.add_argument('--camera-fps', type=float, default=30.0)
+    parser.add_argument('--frame-cost', type=float, default=0.004, help="stub seconds per frame at 128x192")
+    parser.add_argument('--load', type=float, default=4.0, help="cost multiplier of the middle third")
+    parser.add_argument('--latency-budget', type=float, default=0.05)
+    parser.add_argument('--initial', default=DEFAULT_QUALITY_TIERS[0])
+    args = parser.parse_args()
+
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    config = {'pose_backend': 'stub', 'net_resolution': args.initial, 'stub_frame_cost': args.frame_cost}
+    backend = create_pose_backend(config)
+    backend.load()
+    governor = QualityGovernor(DEFAULT_QUALITY_TIERS, initial_tier=args.initial,
+        target_fps=args.camera_fps, latency_budget=args.latency_budget)
+
+    print(f"{'t s':>4} {'load':>5} {'level':>5} {'quality':>16} {'fps':>6} {'lat ms':>7} {'p95 ms':>7}")
+    start = time.perf_counter()
+    prev_id = -1
+    second = 1
+    latencies = []
+    while True:
+        now = time.perf_counter() - start
+        if now >= args.duration:
+            break
+        frame_id = int(now * args.camera_fps)
+        capture_time = frame_id / args.camera_fps
+        if frame_id == prev_id or 0 <= frame_id - prev_id <= governor.skip:
+            time.sleep(max(0.0, (frame_id + 1) / args.camera_fps - now))
+            continue
+        prev_id = frame_id
+
+        load = args.load if args.duration / 3 <= now < 2 * args.duration / 3 else 1.0
+        config['stub_frame_cost'] = args.frame_cost * load
+        inference_start = time.perf_counter()
+        backend.infer([frame])
+        inference_time = time.perf_counter() - inference_start
+        latency = time.perf_counter() - start - capture_time
+        latencies.append(latency)
+        if governor.observe(latency, inference_time):
+            backend.set_net_resolution(governor.net_resolution)
+
+        if now >= second:
+            print(f"{second:>4} {load:>5.1f} {governor.level:>5} {governor.describe():>16} {len(latencies):>6} "
+                  f"{np.mean(latencies) * 1e3:>7.1f} {np.percentile(latencies, 95) * 1e3:>7.1f}")
+            latencies = []
+            second += 1
+    backend.close()
+    print(f"{governor.changes} level changes")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+    Keypoint recording write cost, memory and loading.
+
+    Appends --minutes of poses at --fps for --cameras 2D streams
+    (max_people x 25 x 3) plus the 3D stream (max_people x 25 x 4) with
+    KeypointWriter, then opens the result with KeypointRecording and slices
+    a --window second range out of the middle. Reported: append time per
+    row, memory allocated by Python during the appends (tracemalloc, should
+    stay flat), peak RSS, size on disk, open time and slice time.
+
+    python benchmarks/bench_keypoint_recording.py --minutes 60 --cameras 4
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from keypoint_recording import KeypointWriter, KeypointRecording
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=10.0)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--max-people', type=int, default=4)
+    parser.add_argument('--window', type=float, default=10.0, help="seconds sliced by the loader")
+    args = parser.parse_args()
+
+    rows = int(args.minutes * 60 * args.fps)
+    rng = np.random.default_rng(0)
+    people_2d = rng.random((8, 2, 25, 3), dtype=np.float32)
+    people_3d = rng.random((8, 2, 25, 4), dtype=np.float32)
+    path = tempfile.mkdtemp(prefix="bench_keypoints_")
+    try:
+        writer = KeypointWriter(path)
+        names = [f"2d_{cam_id}" for cam_id in range(args.cameras)]
+        for name in names:
+            writer.add_stream(name, (args.max_people, 25, 3))
+        writer.add_stream("3d", (args.max_people, 25, 4))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for row in range(rows):
+            timestamp = row / args.fps
+            for name in names:
+                writer.append(name, row, timestamp, people_2d[row % 8])
+            writer.append("3d", row, timestamp, people_3d[row % 8])
+            if row % args.fps == 0:
+                writer.flush()
+        writer.close()
+        append_time = (time.perf_counter() - start) / (rows * (len(names) + 1))
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        disk = sum(os.path.getsize(os.path.join(path, fn)) for fn in os.listdir(path))
+
+        start = time.perf_counter()
+        recording = KeypointRecording(path)
+        open_time = time.perf_counter() - start
+        middle = rows / args.fps / 2
+        start = time.perf_counter()
+        window = recording.slice("3d", middle, middle + args.window)
+        poses = np.asarray(window['keypoints'][:, 0])
+        slice_time = time.perf_counter() - start
+        assert len(poses) == int(args.window * args.fps)
+        recording.close()
+
+        print(f"{rows} rows x {len(names) + 1} streams ({args.minutes:.0f} min at {args.fps} fps)")
+        print(f"append      {append_time * 1e6:.2f} us / row")
+        print(f"python peak {traced_peak / 1e3:.1f} kB (tracemalloc)")
+        print(f"peak RSS    {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3:.1f} MB")
+        print(f"on disk     {disk / 1e6:.1f} MB")
+        print(f"open        {open_time * 1e3:.3f} ms")
+        print(f"slice {args.window:.0f} s  {slice_time * 1e3:.3f} ms ({len(poses)} rows)")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
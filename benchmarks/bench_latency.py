@@ -0,0 +1,110 @@
+'''
+    Latency tracing (latency.py) and the fps estimate (utils.RateMeter).
+
+        record    : cost of one LatencyRecorder.age() call, the per-frame
+                    overhead added to every stage
+        accuracy  : p50 / p95 / p99 of the shared histogram against the exact
+                    percentiles of the same samples (lognormal around
+                    --median ms)
+        writers   : --writers processes record into their own rows while the
+                    parent keeps taking snapshots; every sample must be
+                    counted once (no lock, one writer per row)
+        fps       : RateMeter against the former 1 / mean(times) with the
+                    frame intervals rounded to 10 ms, at several true rates
+
+    python benchmarks/bench_latency.py --samples 100000 --writers 4
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from multiprocessing import Process
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from latency import LatencyTable, NUM_BINS, percentiles
+from utils import RateMeter
+
+def bench_record(samples):
+    table = LatencyTable(["PoseEstimator 0"])
+    recorder = table.recorder("PoseEstimator 0")
+    values = np.random.default_rng(0).lognormal(np.log(0.03), 0.5, samples).tolist()
+    start = time.perf_counter()
+    for value in values:
+        recorder.age(0.0, value)
+    return (time.perf_counter() - start) / samples
+
+def bench_accuracy(samples, median):
+    table = LatencyTable(["CameraDisplayer 0"])
+    recorder = table.recorder("CameraDisplayer 0")
+    values = np.random.default_rng(1).lognormal(np.log(median * 1e-3), 0.6, samples)
+    for value in values.tolist():
+        recorder.age(0.0, value)
+    estimate = percentiles(table.snapshot()[0, 0], (50, 95, 99))
+    exact = np.percentile(values, [50, 95, 99])
+    return exact, estimate
+
+def writer(table, name, samples):
+    recorder = table.recorder(name)
+    for i in range(samples):
+        recorder.age(0.0, 0.001 * (1 + i % 100))
+
+def bench_writers(writers, samples):
+    names = [f"PoseEstimator {i}" for i in range(writers)]
+    table = LatencyTable(names)
+    processes = [Process(target=writer, args=(table, name, samples)) for name in names]
+    for process in processes:
+        process.start()
+    snapshots = 0
+    monotonic = True
+    prev = table.snapshot()[:, 0, :NUM_BINS].sum(axis=-1)
+    while any(process.is_alive() for process in processes):
+        counts = table.snapshot()[:, 0, :NUM_BINS].sum(axis=-1)
+        monotonic &= bool(np.all(counts >= prev))
+        prev = counts
+        snapshots += 1
+    for process in processes:
+        process.join()
+    counts = table.snapshot()[:, 0, :NUM_BINS].sum(axis=-1)
+    return counts, snapshots, monotonic
+
+def bench_fps(rates, frames=600, jitter=0.1):
+    rng = np.random.default_rng(2)
+    rows = []
+    for rate in rates:
+        intervals = np.clip(rng.normal(1 / rate, jitter / rate, frames), 0.1 / rate, None)
+        stamps = np.cumsum(intervals)
+        meter = RateMeter()
+        times = [1]
+        for i in range(1, frames):
+            fps = meter.tick(stamps[i])
+            times.append(round(stamps[i] - stamps[i - 1], 2))
+            times = times[-60:]
+        true = 59 / (stamps[-1] - stamps[-60])
+        rows.append((rate, true, fps, 1 / np.mean(times)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=100000)
+    parser.add_argument('--median', type=float, default=40.0, help="ms")
+    parser.add_argument('--writers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"record    : {bench_record(args.samples) * 1e6:.2f} us per sample")
+
+    exact, estimate = bench_accuracy(args.samples, args.median)
+    for q, e, h in zip([50, 95, 99], exact, estimate):
+        print(f"accuracy  : p{q} exact {e * 1e3:7.2f} ms histogram {h * 1e3:7.2f} ms ({(h / e - 1) * 100:+.1f}%)")
+
+    counts, snapshots, monotonic = bench_writers(args.writers, args.samples // args.writers)
+    lost = int(args.writers * (args.samples // args.writers) - counts.sum())
+    print(f"writers   : {args.writers} processes, {snapshots} snapshots taken while writing, "
+          f"counts {'monotonic' if monotonic else 'NOT monotonic'}, {lost} samples lost")
+
+    print(f"fps       : {'true':>7} {'RateMeter':>10} {'rounded':>8}")
+    for rate, true, meter, rounded in bench_fps([15, 30, 60, 90, 120]):
+        print(f"  {rate:>4} fps  {true:>7.2f} {meter:>10.2f} {rounded:>8.2f}")
+
+if __name__ == '__main__':
+    main()
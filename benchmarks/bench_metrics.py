@@ -0,0 +1,107 @@
+'''
+    Overhead of the metrics exporter (metrics.py).
+
+    Builds the status and latency tables of a --cameras camera pipeline
+    with every row in use and filled histograms, then times
+        worker    : the per-frame additions in the workers, frames += 1 and
+                    cpu_time = time.process_time() on the shared status row
+        render    : collect() + the Prometheus text of one scrape
+        csv/jsonl : one sample appended to the rolling metrics file
+        http      : --scrapes GET /metrics over localhost, wall time per
+                    scrape and the exporter's own CPU time
+    and prints the CPU share of the exporter at a --scrape-interval and
+    --file-interval (s), the cost it adds while left on.
+
+    python benchmarks/bench_metrics.py --cameras 2 4 --scrapes 200
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import urllib.request
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from status_table import StatusTable
+from latency import LatencyTable
+from metrics import MetricsExporter
+
+def make_tables(cameras):
+    camera_ids = list(range(cameras))
+    process_names = [f"{proc_type} {cam_id}" for cam_id in camera_ids for proc_type in ["CameraReader", "CameraDisplayer", "PoseEstimator"]]
+    process_names += ["BatchPoseEstimator 0", "PoseEstimator3D 0", "PoseViewer3D 0", "Recorder", "KeypointRecorder", "CalibrationCapture"]
+    status_table = StatusTable(process_names)
+    for name in process_names:
+        status = status_table.reset(name)
+        status.frames = 12345
+        status.fps = 59.9
+    latency_names = [f"{proc_type} {cam_id}" for cam_id in camera_ids for proc_type in ["CameraReader", "CameraDisplayer", "PoseEstimator", "Recorder"]]
+    latency_names += ["PoseEstimator3D 0", "PoseViewer3D 0", "KeypointRecorder"]
+    latency_table = LatencyTable(latency_names)
+    rng = np.random.default_rng(0)
+    for name in latency_names:
+        recorder = latency_table.recorder(name)
+        for value in rng.lognormal(np.log(0.02), 0.5, 2000).tolist():
+            recorder.age(0.0, value)
+            recorder.stage(0.0, value / 4)
+    return status_table, latency_table
+
+def per_call(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+def bench_worker(status_table, count=100000):
+    status = status_table["PoseEstimator 0"]
+    def frame():
+        status.frames += 1
+        status.cpu_time = time.process_time()
+    return per_call(frame, count)
+
+def bench_http(exporter, scrapes):
+    url = f"http://127.0.0.1:{exporter.server.server_address[1]}/metrics"
+    cpu_before = exporter.cpu_time
+    start = time.perf_counter()
+    for _ in range(scrapes):
+        with urllib.request.urlopen(url) as response:
+            body = response.read()
+    wall = (time.perf_counter() - start) / scrapes
+    return wall, (exporter.cpu_time - cpu_before) / scrapes, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--scrapes', type=int, default=200)
+    parser.add_argument('--scrape-interval', type=float, default=15.0)
+    parser.add_argument('--file-interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="bench_metrics_")
+    try:
+        print(f"{'cameras':>7} {'worker us':>10} {'render ms':>10} {'csv ms':>7} {'jsonl ms':>9} {'http ms':>8} {'cpu/scrape ms':>14} {'bytes':>7} {'cpu %':>7}")
+        for cameras in args.cameras:
+            status_table, latency_table = make_tables(cameras)
+            worker = bench_worker(status_table)
+            exporter = MetricsExporter(status_table, latency_table, port=0, interval=3600)
+            exporter.start()
+            render = per_call(exporter.render, 200)
+            sample = exporter.collect()
+            exporter.file = os.path.join(path, f"metrics_{cameras}.csv")
+            csv_time = per_call(lambda: exporter.write_sample(sample), 200)
+            exporter.file = os.path.join(path, f"metrics_{cameras}.jsonl")
+            jsonl_time = per_call(lambda: exporter.write_sample(sample), 200)
+            exporter.file = None
+            http, cpu_per_scrape, size = bench_http(exporter, args.scrapes)
+            exporter.stop()
+            # exporter CPU per second of running, in percent of one core
+            share = (cpu_per_scrape / args.scrape_interval + (per_call(exporter.collect, 50) + csv_time) / args.file_interval) * 100
+            print(f"{cameras:>7} {worker * 1e6:>10.2f} {render * 1e3:>10.2f} {csv_time * 1e3:>7.2f} {jsonl_time * 1e3:>9.2f} "
+                  f"{http * 1e3:>8.2f} {cpu_per_scrape * 1e3:>14.2f} {size:>7} {share:>7.3f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''
+    N-view triangulation sweep on synthetic rigs of 2 to 16 cameras.
+
+    Cameras sit on a ring around the capture volume and look at its centre.
+    Detections get 1 px noise and a fraction of them are replaced by
+    confident outliers (wrong person / wrong limb). For every camera count
+    the plain weighted DLT and the robust per-joint view selection are timed
+    per skeleton and per batched sequence, and their 3D error against the
+    ground truth is reported.
+
+    python benchmarks/bench_multiview.py --views 2 4 8 16 --outliers 0.1
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from camera_model import CameraModel, CameraRig
+from triangulation import Triangulator
+
+WIDTH, HEIGHT = 1280, 720
+
+def look_at(position, target):
+    # world -> camera rotation of a camera at position looking at target (world z up)
+    forward = target - position
+    forward = forward / np.linalg.norm(forward)
+    right = np.cross(forward, [0, 0, 1.0])
+    right = right / np.linalg.norm(right)
+    down = np.cross(forward, right)
+    return np.stack([right, down, forward])
+
+def synthetic_rig(num_views, radius=3500.0, height=1200.0):
+    '''
+        Rig of num_views cameras on a ring, with R, T relative to camera 0.
+        Returns the rig and the world -> camera 0 transform (R0, t0).
+    '''
+    mtx = np.array([[1000.0, 0, WIDTH / 2], [0, 1000.0, HEIGHT / 2], [0, 0, 1]])
+    dist = np.array([-0.05, 0.01, 0, 0, 0])
+    poses = []
+    for view in range(num_views):
+        angle = 2 * np.pi * view / num_views
+        position = np.array([radius * np.cos(angle), radius * np.sin(angle), height])
+        R = look_at(position, np.array([0, 0, 900.0]))
+        poses.append((R, -R @ position))
+    R0, t0 = poses[0]
+    cameras = {}
+    for view, (R, t) in enumerate(poses):
+        R_rel = R @ R0.T
+        cameras[view] = CameraModel(mtx, dist, R_rel, t - R_rel @ t0)
+    return CameraRig(cameras, world_transform=np.eye(3)), (R0, t0)
+
+def synthetic_observations(rig, world_to_ref, frames, outlier_ratio, seed=0):
+    rng = np.random.default_rng(seed)
+    R0, t0 = world_to_ref
+    # 25 joints spread over a person-sized box near the centre
+    centre = rng.uniform([-500, -500, 0], [500, 500, 0], (frames, 1, 3))
+    joints_world = centre + rng.uniform([-300, -300, 0], [300, 300, 1800], (frames, 25, 3))
+    joints_ref = joints_world @ R0.T + t0
+    pixels, depth = rig.project(joints_ref, world=False)
+    poses = np.empty(pixels.shape[:-1] + (3,), dtype=np.float32)
+    poses[..., :2] = pixels + rng.normal(0, 1.0, pixels.shape)
+    poses[..., 2] = rng.uniform(0.4, 1.0, pixels.shape[:-1])
+    outliers = rng.random(pixels.shape[:-1]) < outlier_ratio
+    poses[outliers, 0] = rng.uniform(0, WIDTH, outliers.sum())
+    poses[outliers, 1] = rng.uniform(0, HEIGHT, outliers.sum())
+    # joints outside the image are not detected
+    outside = (pixels[..., 0] < 0) | (pixels[..., 0] >= WIDTH) | (pixels[..., 1] < 0) | (pixels[..., 1] >= HEIGHT) | (depth <= 0)
+    poses[outside & ~outliers, 2] = 0
+    return poses, joints_ref
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--views', type=int, nargs='+', default=[2, 3, 4, 6, 8, 12, 16])
+    parser.add_argument('--frames', type=int, default=200, help="frames in the batched sequence run")
+    parser.add_argument('--repeat', type=int, default=50, help="single-skeleton repetitions")
+    parser.add_argument('--outliers', type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{'views':>5} {'plain us':>9} {'robust us':>10} {'robust us/view':>15} {'seq us/skel':>12} "
+          f"{'plain err mm':>13} {'robust err mm':>14} {'mean views':>11}")
+    for num_views in args.views:
+        rig, world_to_ref = synthetic_rig(num_views)
+        poses, truth = synthetic_observations(rig, world_to_ref, args.frames, args.outliers)
+        triangulator = Triangulator(rig)
+
+        plain_time, _ = timed(lambda: triangulator.triangulate(poses[0]), args.repeat)
+        robust_time, _ = timed(lambda: triangulator.triangulate_robust(poses[0]), args.repeat)
+        sequence_time, (pose_3d, error, view_count) = timed(lambda: triangulator.triangulate_robust(poses), 3)
+        plain_3d = triangulator.triangulate(poses)
+
+        def median_error(estimate):
+            solved = estimate[..., 3] > 0
+            return np.median(np.linalg.norm(estimate[..., :3] - truth, axis=-1)[solved])
+
+        print(f"{num_views:>5} {plain_time * 1e6:>9.1f} {robust_time * 1e6:>10.1f} {robust_time * 1e6 / num_views:>15.1f} "
+              f"{sequence_time * 1e6 / args.frames:>12.1f} {median_error(plain_3d):>13.1f} {median_error(pose_3d):>14.1f} "
+              f"{view_count[view_count >= 2].mean():>11.2f}")
+
+if __name__ == '__main__':
+    main()
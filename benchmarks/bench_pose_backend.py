@@ -0,0 +1,110 @@
+'''
+    2D inference throughput: one PoseEstimator per camera against one
+    BatchPoseEstimator for all cameras.
+
+    Feeder processes publish synthetic frames into one FrameRing per camera
+    at --fps; the workers run the selected backend and publish 2D poses.
+    Reported per mode: time until every camera got its first pose (model
+    loads included), and poses per second in total and per camera.
+
+    With the default stub backend, --call-cost / --frame-cost emulate one
+    accelerator call and each frame in it, serialized across processes like
+    kernels sharing one GPU (--no-shared-device lets them overlap instead).
+    --backend openpose measures the real thing on a GPU machine.
+
+    python benchmarks/bench_pose_backend.py --cameras 1 2 4 --duration 5
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from multiprocessing import Process, Value, Lock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frame_buffer import FrameRing, PoseRing, FrameNotifier
+from status_table import StatusTable
+from pose_estimation_2d import PoseEstimator, BatchPoseEstimator
+
+def feeder(ring, stop, fps):
+    rng = np.random.default_rng(ring.stream.__hash__() % 1000)
+    frames = rng.integers(0, 255, (4,) + ring.shape, dtype=np.uint8)
+    frame_id = 0
+    next_time = time.perf_counter()
+    while not stop.value:
+        ring.write(frames[frame_id % len(frames)], frame_id)
+        frame_id += 1
+        next_time += 1.0 / fps
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+
+def published(ring):
+    # write sequence of the latest complete slot, i.e. poses published - 1
+    return int(ring._header_np[0]) + 1
+
+def run_mode(mode, camera_ids, config, args):
+    notifier = FrameNotifier(
+        [f"{proc_type} {cam_id}" for cam_id in camera_ids for proc_type in ["CameraReader", "PoseEstimator"]]
+    )
+    frames = {cam_id: FrameRing((args.height, args.width, 3), np.uint8, notifier=notifier, stream=f"CameraReader {cam_id}") for cam_id in camera_ids}
+    poses = {cam_id: PoseRing(4, notifier=notifier, stream=f"PoseEstimator {cam_id}") for cam_id in camera_ids}
+    status_table = StatusTable([f"PoseEstimator {cam_id}" for cam_id in camera_ids] + ["BatchPoseEstimator 0"])
+
+    stop = Value('i', 0)
+    feeders = [Process(target=feeder, args=(frames[cam_id], stop, args.fps)) for cam_id in camera_ids]
+    if mode == 'per-camera':
+        workers = [PoseEstimator(cam_id, config, frames[cam_id], poses[cam_id], f"CameraReader {cam_id}", status_table) for cam_id in camera_ids]
+    else:
+        workers = [BatchPoseEstimator(0, config, frames, poses, camera_ids, status_table)]
+    for name in status_table.process_names:
+        status_table.reset(name)
+
+    start = time.perf_counter()
+    for process in feeders + workers:
+        process.start()
+    while not all(published(poses[cam_id]) > 0 for cam_id in camera_ids):
+        if any(status_table[name].error for name in status_table.process_names):
+            raise RuntimeError(f"{mode} worker failed to start")
+        time.sleep(0.005)
+    ready = time.perf_counter() - start
+
+    counts = {cam_id: published(poses[cam_id]) for cam_id in camera_ids}
+    time.sleep(args.duration)
+    counts = {cam_id: published(poses[cam_id]) - counts[cam_id] for cam_id in camera_ids}
+
+    for name in status_table.process_names:
+        status_table[name].halt = 1
+    stop.value = 1
+    for process in workers + feeders:
+        process.join()
+    total = sum(counts.values()) / args.duration
+    return ready, total, total / len(camera_ids)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--backend', default='stub', choices=['stub', 'openpose'])
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=60)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--load-time', type=float, default=1.0, help="stub model load time (s)")
+    parser.add_argument('--call-cost', type=float, default=0.010, help="stub time per inference call (s)")
+    parser.add_argument('--frame-cost', type=float, default=0.004, help="stub time per frame in a call (s)")
+    parser.add_argument('--no-shared-device', action='store_true')
+    args = parser.parse_args()
+
+    config = {
+        'pose_backend': args.backend,
+        'stub_load_time': args.load_time,
+        'stub_call_cost': args.call_cost,
+        'stub_frame_cost': args.frame_cost,
+        'stub_device_lock': None if args.no_shared_device else Lock(),
+    }
+    print(f"{'cameras':>7} {'mode':>10} {'ready s':>8} {'poses/s':>9} {'per camera':>11}")
+    for num_cameras in args.cameras:
+        for mode in ['per-camera', 'batched']:
+            ready, total, per_camera = run_mode(mode, list(range(num_cameras)), config, args)
+            print(f"{num_cameras:>7} {mode:>10} {ready:>8.2f} {total:>9.1f} {per_camera:>11.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''
+    Sustained recording throughput of the Recorder.
+
+    One feeder process per camera publishes frames into a FrameRing at
+    --fps (720p60 by default) while the Recorder writes them to a
+    temporary folder for --duration seconds. Afterwards the sidecar
+    "<date>_recording.json" is read back and, per camera count, the frames
+    published, written, missed (overwritten in the ring before the recorder
+    read them) and dropped (encoder queue full) are reported. A run is
+    lossless when written == published for every camera.
+
+    Frames are a smooth moving pattern plus a little noise, roughly as hard
+    to MJPG-encode as a camera image; --replay uses frames of a recording.
+    Every camera needs about one core for feeding + encoding at 720p60.
+
+    python benchmarks/bench_recorder.py --cameras 2 4 8 --duration 10
+'''
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from multiprocessing import Process, Value
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frame_buffer import FrameRing, FrameNotifier
+from status_table import StatusTable
+from recorder import Recorder
+
+def make_frames(width, height, count, replay=None):
+    if replay is not None:
+        from capture_source import VideoFileSource
+        source = VideoFileSource(0, replay, (width, height), realtime=False, loop=True)
+        if not source.open():
+            raise RuntimeError(f"Cannot open {replay}")
+        frames = np.stack([source.read()[1] for _ in range(count)])
+        source.release()
+        return frames
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    frames = np.empty((count, height, width, 3), dtype=np.uint8)
+    for index in range(count):
+        phase = 2 * np.pi * index / count
+        base = 128 + 60 * np.sin(x / 90 + phase) * np.cos(y / 70 - phase)
+        for channel in range(3):
+            frames[index, ..., channel] = np.clip(base + 20 * channel + rng.normal(0, 4, base.shape), 0, 255)
+    return frames
+
+def feeder(ring, frames, stop, fps, published):
+    frame_id = 0
+    next_time = time.perf_counter()
+    while not stop.value:
+        ring.write(frames[frame_id % len(frames)], frame_id)
+        frame_id += 1
+        published.value = frame_id
+        next_time += 1.0 / fps
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+
+def run(num_cameras, frames, args, save_path):
+    height, width = frames.shape[1:3]
+    camera_ids = list(range(num_cameras))
+    notifier = FrameNotifier([f"CameraReader {cam_id}" for cam_id in camera_ids])
+    rings = {cam_id: FrameRing((height, width, 3), np.uint8, num_slots=args.slots, notifier=notifier, stream=f"CameraReader {cam_id}") for cam_id in camera_ids}
+    status_table = StatusTable(["Recorder"])
+    status_table.reset("Recorder")
+    config = {'resolution_fps_setting': f"{width}x{height}@{args.fps}", 'record_queue_size': args.queue_size, 'record_format': args.format}
+
+    stop = Value('i', 0)
+    published = {cam_id: Value('q', 0) for cam_id in camera_ids}
+    recorder = Recorder(config, rings, status_table, save_path=save_path)
+    recorder.start()
+    time.sleep(1.0) # writers opened
+    feeders = [Process(target=feeder, args=(rings[cam_id], frames, stop, args.fps, published[cam_id])) for cam_id in camera_ids]
+    for process in feeders:
+        process.start()
+    time.sleep(args.duration)
+    stop.value = 1
+    for process in feeders:
+        process.join()
+    time.sleep(0.5) # let the recorder read the last frames
+    status_table["Recorder"].halt = 1
+    recorder.join()
+
+    with open(glob.glob(os.path.join(save_path, "*_recording.json"))[0]) as f:
+        summary = json.load(f)['cameras']
+    return [(published[cam_id].value, summary[str(cam_id)]) for cam_id in camera_ids]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--slots', type=int, default=3, help="FrameRing slots (config 'frame_slots')")
+    parser.add_argument('--queue-size', type=int, default=8, help="config 'record_queue_size'")
+    parser.add_argument('--format', default='avi', choices=['avi', 'chunked'], help="config 'record_format'")
+    parser.add_argument('--replay', default=None, help="take the frames from a video file")
+    args = parser.parse_args()
+
+    frames = make_frames(args.width, args.height, 16, args.replay)
+    print(f"{args.width}x{args.height}@{args.fps}, {args.format}, {args.duration:.0f} s, {os.cpu_count()} cores")
+    print(f"{'cams':>4} {'published':>9} {'written':>8} {'missed':>7} {'dropped':>7} {'max q':>5} {'enc ms':>7} {'lossless':>8}")
+    for num_cameras in args.cameras:
+        save_path = tempfile.mkdtemp(prefix="bench_recorder_")
+        try:
+            results = run(num_cameras, frames, args, save_path)
+        finally:
+            shutil.rmtree(save_path, ignore_errors=True)
+        published = sum(count for count, _ in results)
+        written = sum(summary['written'] for _, summary in results)
+        missed = sum(summary['missed'] for _, summary in results)
+        dropped = sum(summary['dropped'] for _, summary in results)
+        max_queued = max(summary['max_queued'] for _, summary in results)
+        encode = np.mean([summary['mean_encode_ms'] for _, summary in results])
+        print(f"{num_cameras:>4} {published:>9} {written:>8} {missed:>7} {dropped:>7} {max_queued:>5} {encode:>7.2f} {str(written == published):>8}")
+
+if __name__ == '__main__':
+    main()
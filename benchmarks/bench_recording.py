@@ -0,0 +1,106 @@
+'''
+    Random access into a chunked recording against an MJPG .avi.
+
+    Writes --frames synthetic frames per camera both as a chunked recording
+    (RecordingWriter) and as one .avi per camera (cv2.VideoWriter, like the
+    'avi' record format), then measures
+        open      : open the recording (index memmap) / the video files
+        seek+read : fetch --reads random frames, decoded
+        sync      : build the synchronized multi-camera table
+        extract   : write --reads frames as .jpg for calibration
+                    (payload copy for the recording, decode + encode for avi)
+    Camera timestamps are offset by a few ms to exercise the sync table.
+
+    python benchmarks/bench_recording.py --frames 600 --cameras 2 --reads 100
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recording import RecordingWriter, Recording, extract_images
+from bench_recorder import make_frames
+
+def write_inputs(path, camera_ids, frames, count, fps):
+    height, width = frames.shape[1:3]
+    writer = RecordingWriter(os.path.join(path, "recording"), camera_ids, (width, height), fps)
+    videos = {cam_id: cv2.VideoWriter(os.path.join(path, f"{cam_id}.avi"), cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height)) for cam_id in camera_ids}
+    for frame_id in range(count):
+        for cam_id in camera_ids:
+            frame = frames[(frame_id + cam_id) % len(frames)]
+            writer.track(cam_id).write(frame_id, frame_id / fps + 0.003 * cam_id, frame)
+            videos[cam_id].write(frame)
+    writer.release()
+    for video in videos.values():
+        video.release()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--cameras', type=int, default=2)
+    parser.add_argument('--reads', type=int, default=100)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=int, default=60)
+    args = parser.parse_args()
+
+    camera_ids = list(range(args.cameras))
+    frames = make_frames(args.width, args.height, 16)
+    path = tempfile.mkdtemp(prefix="bench_recording_")
+    rng = np.random.default_rng(0)
+    targets = [(int(rng.integers(args.cameras)), int(rng.integers(args.frames))) for _ in range(args.reads)]
+    try:
+        write_inputs(path, camera_ids, frames, args.frames, args.fps)
+        results = {}
+
+        start = time.perf_counter()
+        recording = Recording(os.path.join(path, "recording"))
+        results['open'] = [time.perf_counter() - start]
+        start = time.perf_counter()
+        videos = {cam_id: cv2.VideoCapture(os.path.join(path, f"{cam_id}.avi")) for cam_id in camera_ids}
+        results['open'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for cam_id, frame_id in targets:
+            frame = recording.read_frame(cam_id, frame_id)
+        chunked_read = time.perf_counter() - start
+        start = time.perf_counter()
+        for cam_id, frame_id in targets:
+            videos[cam_id].set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+            _, frame = videos[cam_id].read()
+        results['seek+read'] = [chunked_read / args.reads, (time.perf_counter() - start) / args.reads]
+
+        start = time.perf_counter()
+        table = recording.sync_table()
+        results['sync'] = [time.perf_counter() - start, np.nan]
+        assert (table >= 0).all(), "synthetic cameras should all be in sync"
+
+        rows = [row for _, row in targets]
+        start = time.perf_counter()
+        extract_images(recording, 0, os.path.join(path, "images_chunked"), rows)
+        chunked_extract = time.perf_counter() - start
+        os.makedirs(os.path.join(path, "images_avi"))
+        start = time.perf_counter()
+        for frame_id in rows:
+            videos[0].set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+            _, frame = videos[0].read()
+            cv2.imwrite(os.path.join(path, "images_avi", f"frame_{frame_id:05d}.jpg"), frame)
+        results['extract'] = [chunked_extract / args.reads, (time.perf_counter() - start) / args.reads]
+        for video in videos.values():
+            video.release()
+        recording.close()
+
+        print(f"{args.cameras} cameras x {args.frames} frames {args.width}x{args.height}, {args.reads} random frames")
+        print(f"{'':>10} {'chunked ms':>11} {'avi ms':>9}")
+        for name, (chunked, avi) in results.items():
+            print(f"{name:>10} {chunked * 1e3:>11.3f} {avi * 1e3:>9.3f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
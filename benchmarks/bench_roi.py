@@ -0,0 +1,103 @@
+'''
+    ROI-cropped against full-frame 2D inference on a replayed recording.
+
+    Three passes over the same frames (video file or image folder):
+        reference : full frame at --reference-net (e.g. 656x368), taken as ground truth
+        full      : full frame at --net, the current default
+        roi       : RoiTracker crops at --net, full frame when tracking is lost
+    For full and roi the mean / p95 inference time per frame and the
+    keypoint agreement with the reference (mean pixel error and PCK, the
+    fraction of reference keypoints found within --pck pixels) of the most
+    confident person are reported, plus how often the ROI pass ran on a crop.
+
+    The numbers only mean something with a real model (--backend openpose);
+    the stub backend just exercises the code path.
+
+    python benchmarks/bench_roi.py --replay outputs/2024-09-01_10-30-06_0.avi --frames 300
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from capture_source import VideoFileSource, ImageSequenceSource
+from pose_backend import create_pose_backend
+from roi import RoiTracker
+
+def read_frames(path, max_frames, frame_size):
+    source_class = ImageSequenceSource if os.path.isdir(path) else VideoFileSource
+    source = source_class(0, path, frame_size, realtime=False)
+    if not source.open():
+        raise RuntimeError(f"Cannot open {path}")
+    frames = []
+    while len(frames) < max_frames:
+        rval, frame = source.read()
+        if not rval:
+            break
+        frames.append(frame)
+    source.release()
+    return frames
+
+def run_pass(frames, config, roi=None):
+    backend = create_pose_backend(config)
+    backend.load()
+    backend.infer([frames[0]]) # warm up
+    poses = np.zeros((len(frames), 25, 3), dtype=np.float32)
+    timings = np.empty(len(frames))
+    for index, frame in enumerate(frames):
+        start = time.perf_counter()
+        if roi is not None:
+            image, region = roi.crop(frame)
+            people = roi.to_frame(backend.infer([image])[0], region)
+            roi.update(people)
+        else:
+            people = backend.infer([frame])[0]
+        timings[index] = time.perf_counter() - start
+        if len(people):
+            poses[index] = people[np.argmax(people[..., 2].sum(axis=-1))]
+    backend.close()
+    return poses, timings
+
+def agreement(poses, reference, min_confidence, pck):
+    '''Mean pixel error and PCK over the keypoints confident in the reference.'''
+    valid = reference[..., 2] >= min_confidence
+    found = poses[..., 2] >= min_confidence
+    error = np.linalg.norm(poses[..., :2] - reference[..., :2], axis=-1)
+    mean_error = error[valid & found].mean() if (valid & found).any() else np.nan
+    return mean_error, ((error <= pck) & found)[valid].mean() if valid.any() else np.nan
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replay', required=True, help="video file or image folder")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--backend', default='openpose', choices=['openpose', 'stub'])
+    parser.add_argument('--openpose-path', default=None)
+    parser.add_argument('--net', default='128x192', help="net_resolution of the full / roi passes")
+    parser.add_argument('--reference-net', default='656x368')
+    parser.add_argument('--padding', type=float, default=0.25)
+    parser.add_argument('--refresh', type=int, default=30, help="full-frame refresh interval of the roi pass")
+    parser.add_argument('--pck', type=float, default=10.0, help="PCK threshold (px)")
+    args = parser.parse_args()
+
+    frames = read_frames(args.replay, args.frames, (args.width, args.height))
+    config = {'pose_backend': args.backend}
+    if args.openpose_path:
+        config['openpose_path'] = args.openpose_path
+
+    reference, _ = run_pass(frames, dict(config, net_resolution=args.reference_net))
+    print(f"{len(frames)} frames of {args.replay}, reference net {args.reference_net}")
+    print(f"{'mode':>5} {'net':>9} {'mean ms':>8} {'p95 ms':>7} {'err px':>7} {'PCK@' + str(int(args.pck)):>7} {'roi frames':>11}")
+    for mode in ['full', 'roi']:
+        roi = RoiTracker((args.width, args.height), args.net, padding=args.padding, refresh_interval=args.refresh) if mode == 'roi' else None
+        poses, timings = run_pass(frames, dict(config, net_resolution=args.net), roi)
+        mean_error, pck = agreement(poses, reference, 0.15, args.pck)
+        roi_share = roi.roi_frames / len(frames) if roi is not None else 0.0
+        print(f"{mode:>5} {args.net:>9} {timings.mean() * 1e3:>8.2f} {np.percentile(timings, 95) * 1e3:>7.2f} "
+              f"{mean_error:>7.1f} {pck:>7.3f} {roi_share:>11.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+    Status updates per second as the number of cameras grows.
+
+    Every camera runs the per-frame bookkeeping the pipeline processes do
+    (read the halt flag, write fps / frame id / last update) in its own
+    process, once through the old Manager dict and once through StatusTable.
+
+    python benchmarks/bench_status_table.py --cameras 1 2 4 8 --duration 2
+'''
+import os
+import sys
+import time
+import ctypes
+import argparse
+from multiprocessing import Process, Queue, Manager, Value
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from status_table import StatusTable
+
+def manager_worker(name, shared_dict, start, result):
+    while not start.value:
+        pass
+    updates = 0
+    t0 = time.perf_counter()
+    while not shared_dict["control signals"][name]["halt"]:
+        local_dict = shared_dict[name]
+        local_dict['fps'] = 60.0
+        local_dict['image_id'] = updates
+        local_dict['last_update'] = time.time()
+        shared_dict[name] = local_dict
+        updates += 1
+    result.put(updates / (time.perf_counter() - t0))
+
+def table_worker(name, status_table, start, result):
+    status = status_table[name]
+    while not start.value:
+        pass
+    updates = 0
+    t0 = time.perf_counter()
+    while not status.halt:
+        status.fps = 60.0
+        status.frame_id = updates
+        status.last_update = time.time()
+        updates += 1
+    result.put(updates / (time.perf_counter() - t0))
+
+def run_case(mode, cameras, duration):
+    names = [f"CameraReader {cam_id}" for cam_id in range(cameras)]
+    start = Value(ctypes.c_bool, False, lock=False)
+    result = Queue()
+    manager = None
+    if mode == 'manager':
+        manager = Manager()
+        shared_dict = manager.dict()
+        shared_dict["control signals"] = {name: {"halt": False} for name in names}
+        for name in names:
+            shared_dict[name] = {'fps': 0, 'running': True, 'image_id': 0}
+        procs = [Process(target=manager_worker, args=(name, shared_dict, start, result)) for name in names]
+    else:
+        status_table = StatusTable(names)
+        for name in names:
+            status_table.reset(name)
+        procs = [Process(target=table_worker, args=(name, status_table, start, result)) for name in names]
+    for proc in procs:
+        proc.start()
+    start.value = True
+    time.sleep(duration)
+    if mode == 'manager':
+        shared_dict["control signals"] = {name: {"halt": True} for name in names}
+    else:
+        for name in names:
+            status_table[name].halt = 1
+    rates = [result.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    if manager is not None:
+        manager.shutdown()
+    return sum(rates)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=2.0)
+    parser.add_argument('--cameras', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{'cameras':>7} {'manager updates/s':>18} {'table updates/s':>16}")
+    for cameras in args.cameras:
+        manager_rate = run_case('manager', cameras, args.duration)
+        table_rate = run_case('table', cameras, args.duration)
+        print(f"{cameras:>7} {manager_rate:>18.0f} {table_rate:>16.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+'''
+    Microbenchmarks of the pipeline hot paths, on synthetic frames and
+    keypoints (no camera, no OpenPose), one stage at a time:
+        triangulation     Triangulator.triangulate_robust, one person in 2 views
+        draw_human_2d     CameraDisplayer.draw_human_2d of one skeleton
+        ring_write        FrameRing.write, the CameraReader copy into shared memory
+        ring_read_next    FrameRing.read_next into a reused buffer (Recorder, HPE)
+        recorder_copy     the Recorder loop: buffer from the CameraWriter pool,
+                          read_next into it, push to the encoder queue
+        recorder_avi      VideoSink.write, MJPG encoding of the 'avi' format
+        recorder_chunked  RecordingTrack.write, JPEG encoding of the 'chunked' format
+    Frame stages run at every utils.FRAME_SIZE_RATES resolution. Each stage
+    runs for --min-time seconds (at least --min-ops operations) after a
+    warm-up; reported are ops/s and the p50 / p99 of one operation.
+
+    --output saves the results with the machine and library versions as
+    JSON; --compare old.json new.json prints the change per stage and flags
+    a regression when ops/s fall or p99 grows by more than --threshold
+    (exit status 1 if any).
+
+    python benchmarks/bench_suite.py --output results/base.json
+    python benchmarks/bench_suite.py --stages ring_write recorder_avi --resolutions 1280x720@60
+    python benchmarks/bench_suite.py --compare results/base.json results/new.json --threshold 0.1
+'''
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import platform
+import argparse
+import datetime
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils import FRAME_SIZE_RATES
+from frame_buffer import FrameRing
+from triangulation import Triangulator
+from camera_model import CameraRig
+from camera_displayer import CameraDisplayer
+from recorder import CameraWriter, VideoSink
+from recording import RecordingWriter
+from bench_recorder import make_frames
+from bench_triangulation import synthetic_stereo
+
+def setup_triangulation(width, height, path):
+    parameters, poses = synthetic_stereo(256)
+    triangulator = Triangulator(CameraRig.from_parameters(parameters))
+    state = {'index': 0}
+    def op():
+        triangulator.triangulate_robust(poses[state['index'] % len(poses)])
+        state['index'] += 1
+    return op, None
+
+def synthetic_skeletons(width, height, count, rng):
+    '''(count, 25, 3) standing people of about half the frame height, confidence 0.2 - 1.'''
+    skeleton = rng.uniform([-0.15, -0.5], [0.15, 0.5], (count, 25, 2))
+    center = rng.uniform([0.3, 0.4], [0.7, 0.6], (count, 1, 2))
+    people = np.empty((count, 25, 3), dtype=np.float32)
+    people[..., :2] = (center + skeleton * 0.6) * [width, height]
+    people[..., 2] = rng.uniform(0.2, 1.0, (count, 25))
+    return people
+
+def setup_draw_human_2d(width, height, path):
+    frame = make_frames(width, height, 1)[0]
+    people = synthetic_skeletons(width, height, 64, np.random.default_rng(0))
+    state = {'index': 0}
+    def op():
+        # draw_human_2d does not use the displayer's state
+        CameraDisplayer.draw_human_2d(None, frame, people[state['index'] % len(people)])
+        state['index'] += 1
+    return op, None
+
+def setup_ring_write(width, height, path):
+    frames = make_frames(width, height, 4)
+    ring = FrameRing((height, width, 3), np.uint8)
+    state = {'frame_id': 0}
+    def op():
+        ring.write(frames[state['frame_id'] % len(frames)], state['frame_id'], time.perf_counter())
+        state['frame_id'] += 1
+    return op, None
+
+def setup_ring_read_next(width, height, path):
+    frames = make_frames(width, height, 4)
+    ring = FrameRing((height, width, 3), np.uint8)
+    out = np.empty((height, width, 3), dtype=np.uint8)
+    state = {'frame_id': 0}
+    def op():
+        # the write is outside the timed part, see run_stage
+        frame_id, _, _ = ring.read_next(state['frame_id'] - 1, out=out)
+        assert frame_id == state['frame_id']
+    def prepare():
+        state['frame_id'] += 1
+        ring.write(frames[state['frame_id'] % len(frames)], state['frame_id'])
+    return op, prepare
+
+class NullSink:
+    def write(self, frame_id, capture_time, frame):
+        pass
+
+    def write_duplicate(self, frame_id, capture_time, frame):
+        pass
+
+    def release(self):
+        pass
+
+def setup_recorder_copy(width, height, path):
+    frames = make_frames(width, height, 4)
+    ring = FrameRing((height, width, 3), np.uint8)
+    # encoder thread not started: the queue is drained here, only the loop's own work is timed
+    writer = CameraWriter(0, NullSink(), os.path.join(path, "null"), (width, height), queue_size=8)
+    state = {'frame_id': 0}
+    def op():
+        buffer = writer.get_buffer()
+        frame_id, capture_time, buffer = ring.read_next(state['frame_id'] - 1, out=buffer)
+        writer.push(frame_id, capture_time, buffer)
+    def prepare():
+        while True:
+            try:
+                item = writer.frames.get_nowait()
+            except queue.Empty:
+                break
+            writer.free.put(item[2])
+        state['frame_id'] += 1
+        ring.write(frames[state['frame_id'] % len(frames)], state['frame_id'])
+    return op, prepare
+
+def setup_recorder_avi(width, height, path):
+    frames = make_frames(width, height, 8)
+    sink = VideoSink(os.path.join(path, f"bench_{width}x{height}.avi"), cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+    state = {'frame_id': 0}
+    def op():
+        sink.write(state['frame_id'], 0.0, frames[state['frame_id'] % len(frames)])
+        state['frame_id'] += 1
+    return op, None
+
+def setup_recorder_chunked(width, height, path):
+    frames = make_frames(width, height, 8)
+    writer = RecordingWriter(os.path.join(path, f"bench_{width}x{height}"), [0], (width, height), 30)
+    track = writer.track(0)
+    state = {'frame_id': 0}
+    def op():
+        track.write(state['frame_id'], state['frame_id'] / 30, frames[state['frame_id'] % len(frames)])
+        state['frame_id'] += 1
+    return op, None
+
+# name -> (setup(width, height, path) -> (op, prepare or None), depends on the resolution)
+STAGES = {
+    'triangulation': (setup_triangulation, False),
+    'draw_human_2d': (setup_draw_human_2d, True),
+    'ring_write': (setup_ring_write, True),
+    'ring_read_next': (setup_ring_read_next, True),
+    'recorder_copy': (setup_recorder_copy, True),
+    'recorder_avi': (setup_recorder_avi, True),
+    'recorder_chunked': (setup_recorder_chunked, True),
+}
+
+def run_stage(op, prepare, min_time, min_ops, warmup=5):
+    '''Times op until min_time s and min_ops operations; prepare (untimed) runs before each op.'''
+    for _ in range(warmup):
+        if prepare is not None:
+            prepare()
+        op()
+    durations = []
+    total = 0.0
+    while total < min_time or len(durations) < min_ops:
+        if prepare is not None:
+            prepare()
+        start = time.perf_counter()
+        op()
+        elapsed = time.perf_counter() - start
+        durations.append(elapsed)
+        total += elapsed
+    durations = np.array(durations)
+    return {
+        'ops': len(durations),
+        'ops_per_s': len(durations) / total,
+        'p50_us': float(np.percentile(durations, 50) * 1e6),
+        'p99_us': float(np.percentile(durations, 99) * 1e6),
+    }
+
+def machine_info():
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+def print_results(results):
+    print(f"{'stage':>34} {'ops/s':>10} {'p50 us':>10} {'p99 us':>10}")
+    for name, result in results.items():
+        print(f"{name:>34} {result['ops_per_s']:>10.1f} {result['p50_us']:>10.1f} {result['p99_us']:>10.1f}")
+
+def compare(old_fn, new_fn, threshold):
+    '''Prints the change of every stage in both files, returns the names of the regressions.'''
+    with open(old_fn) as f:
+        old = json.load(f)
+    with open(new_fn) as f:
+        new = json.load(f)
+    for label, fn, data in [('old', old_fn, old), ('new', new_fn, new)]:
+        meta = data['meta']
+        print(f"{label}: {fn} ({meta['date']}, {meta['processor']}, {meta['cpu_count']} cores, opencv {meta['opencv']})")
+    print(f"{'stage':>34} {'old ops/s':>10} {'new ops/s':>10} {'change':>8} {'old p99':>9} {'new p99':>9} {'change':>8}")
+    regressions = []
+    for name in old['results']:
+        if name not in new['results']:
+            continue
+        before, after = old['results'][name], new['results'][name]
+        speed = after['ops_per_s'] / before['ops_per_s'] - 1
+        tail = after['p99_us'] / before['p99_us'] - 1
+        flag = ""
+        if speed < -threshold or tail > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif speed > threshold:
+            flag = "  faster"
+        print(f"{name:>34} {before['ops_per_s']:>10.1f} {after['ops_per_s']:>10.1f} {speed * 100:>+7.1f}% "
+              f"{before['p99_us']:>9.1f} {after['p99_us']:>9.1f} {tail * 100:>+7.1f}%{flag}")
+    missing = set(old['results']) ^ set(new['results'])
+    if missing:
+        print(f"{len(missing)} stage(s) in only one of the files, not compared")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--resolutions', nargs='+', default=list(FRAME_SIZE_RATES), choices=list(FRAME_SIZE_RATES))
+    parser.add_argument('--min-time', type=float, default=1.0, help="s per stage")
+    parser.add_argument('--min-ops', type=int, default=50)
+    parser.add_argument('--output', default=None, help="result JSON file")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), default=None)
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change flagged by --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold * 100:.0f}%")
+            sys.exit(1)
+        return
+
+    info = machine_info()
+    print(f"{info['processor']}, {info['cpu_count']} cores, python {info['python']}, numpy {info['numpy']}, opencv {info['opencv']}")
+    path = tempfile.mkdtemp(prefix="bench_suite_")
+    results = {}
+    try:
+        for stage in args.stages:
+            setup, per_resolution = STAGES[stage]
+            for setting in (args.resolutions if per_resolution else [None]):
+                width, height, _ = FRAME_SIZE_RATES[setting] if setting else FRAME_SIZE_RATES[args.resolutions[0]]
+                name = f"{stage}@{setting}" if setting else stage
+                op, prepare = setup(width, height, path)
+                results[name] = run_stage(op, prepare, args.min_time, args.min_ops)
+                print(f"{name:>34} {results[name]['ops_per_s']:>10.1f} ops/s", flush=True)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    print()
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'meta': info, 'settings': {'min_time': args.min_time, 'min_ops': args.min_ops}, 'results': results}, f, indent=4)
+        print(f"Saved {args.output}")
+
+if __name__ == '__main__':
+    main()
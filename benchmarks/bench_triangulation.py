@@ -0,0 +1,143 @@
+'''
+    Triangulation benchmark: the former per-keypoint
+    PoseEstimator3D.camera_2D_to_global loop against the batched Triangulator.
+
+    A synthetic stereo rig observes random 25-joint skeletons; timings are
+    reported in microseconds per skeleton and skeletons per second, plus the
+    batched sequence mode on (T, views, 25, 3) input.
+
+    python benchmarks/bench_triangulation.py --skeletons 200 --sequence 2000
+'''
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from triangulation import Triangulator
+from camera_model import CameraRig
+
+def legacy_camera_2D_to_global(parameters, vec):
+    # verbatim copy of the removed PoseEstimator3D.camera_2D_to_global
+    u0 = vec[0][0]
+    v0 = vec[0][1]
+    u1 = vec[1][0]
+    v1 = vec[1][1]
+
+    mtx0 = np.array(parameters['mtx0'])
+    mtx1 = np.array(parameters['mtx1'])
+    dist0 = np.array(parameters['dist0'])
+    dist1 = np.array(parameters['dist1'])
+    R = np.array(parameters['R'])
+    T = np.array(parameters['T'])
+
+    distorted_point_0 = np.array([[[u0, v0]]], dtype=np.float32)
+    undistorted_point_0 = cv2.undistortPoints(distorted_point_0, mtx0, dist0, P=mtx0)
+    distorted_point_1 = np.array([[[u1, v1]]], dtype=np.float32)
+    undistorted_point_1 = cv2.undistortPoints(distorted_point_1, mtx1, dist1, P=mtx1)
+
+    direction_0 = undistorted_point_0[0][0]
+    direction_1 = undistorted_point_1[0][0]
+
+    ray_0_camera = np.array([[direction_0[0]], [direction_0[1]], [1.0]])
+    ray_1_camera = np.array([[direction_1[0]], [direction_1[1]], [1.0]])
+
+    ray_0_world = ray_0_camera
+    ray_1_world = np.linalg.inv(R) @ ray_1_camera
+    ray_1_world += T
+
+    O_L = np.array([[0], [0], [0]])
+    O_R = T
+    d_L = ray_0_world / np.linalg.norm(ray_0_world)
+    d_R = ray_1_world / np.linalg.norm(ray_1_world)
+
+    A = d_L.T @ d_L
+    B = d_L.T @ d_R
+    C = d_R.T @ d_R
+    D = (O_R - O_L).T @ d_L
+    E = (O_R - O_L).T @ d_R
+
+    denom = A * C - B * B
+
+    if denom != 0:
+        t = (B * E - C * D) / denom
+        s = (A * E - B * D) / denom
+    else:
+        t, s = 0, 0
+
+    P_L_closest = O_L + t * d_L
+    P_R_closest = O_R + s * d_R
+
+    P_3D = (P_L_closest + P_R_closest) / 2
+
+    return P_3D
+
+def legacy_skeleton(parameters, pose_2ds):
+    # the former per-keypoint loop of PoseEstimator3D.pose_estimation_3D
+    pose_3d = np.zeros((25, 4), dtype=np.float32)
+    for i in range(25):
+        u0, v0, c0 = pose_2ds[0][i]
+        u1, v1, c1 = pose_2ds[1][i]
+        if c0 < 0.1 or c1 < 0.1:
+            continue
+        vec3 = legacy_camera_2D_to_global(parameters, [[u0, v0], [u1, v1]])
+        M = np.array([
+            [1, 0, 0],
+            [0, 0, 1],
+            [0, -1, 0]
+        ])
+        vec3_rotate = M @ vec3
+        pose_3d[i, 0:3] = vec3_rotate.T
+        pose_3d[i, 3] = c0 * c1
+    return pose_3d
+
+def synthetic_stereo(num_skeletons, seed=0):
+    rng = np.random.default_rng(seed)
+    mtx = np.array([[900.0, 0, 640], [0, 900.0, 360], [0, 0, 1]])
+    dist = np.array([[-0.1, 0.02, 0.0, 0.0, 0.0]])
+    R, _ = cv2.Rodrigues(np.array([0.0, -0.35, 0.0]))
+    T = np.array([[450.0], [0.0], [80.0]])
+    parameters = {
+        'mtx0': mtx.tolist(), 'dist0': dist.tolist(),
+        'mtx1': mtx.tolist(), 'dist1': dist.tolist(),
+        'R': R.tolist(), 'T': T.tolist(),
+    }
+    joints = rng.uniform([-300, -800, 1800], [300, 800, 2600], (num_skeletons, 25, 3))
+    poses = np.empty((num_skeletons, 2, 25, 3), dtype=np.float32)
+    for view, (rvec, tvec) in enumerate([(np.zeros(3), np.zeros(3)), (cv2.Rodrigues(R)[0], T)]):
+        projected, _ = cv2.projectPoints(joints.reshape(-1, 3), rvec, tvec, mtx, dist)
+        poses[:, view, :, :2] = projected.reshape(num_skeletons, 25, 2)
+    poses[..., 2] = rng.uniform(0.3, 1.0, poses.shape[:-1])
+    return parameters, poses
+
+def report(name, seconds, skeletons):
+    per_skeleton = seconds / skeletons * 1e6
+    print(f"{name:<32} {per_skeleton:>12.1f} us/skeleton {skeletons / seconds:>12.0f} skeletons/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skeletons', type=int, default=200)
+    parser.add_argument('--sequence', type=int, default=2000, help="frames in the batched sequence run")
+    args = parser.parse_args()
+
+    parameters, poses = synthetic_stereo(max(args.skeletons, args.sequence))
+    triangulator = Triangulator(CameraRig.from_parameters(parameters))
+
+    start = time.perf_counter()
+    for pose_2ds in poses[:args.skeletons]:
+        legacy_skeleton(parameters, pose_2ds)
+    report("legacy camera_2D_to_global", time.perf_counter() - start, args.skeletons)
+
+    start = time.perf_counter()
+    for pose_2ds in poses[:args.skeletons]:
+        triangulator.triangulate(pose_2ds)
+    report("Triangulator, per skeleton", time.perf_counter() - start, args.skeletons)
+
+    start = time.perf_counter()
+    triangulator.triangulate(poses[:args.sequence])
+    report(f"Triangulator, sequence T={args.sequence}", time.perf_counter() - start, args.sequence)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+    Frame extraction of tools/video_to_images.py.
+
+    Writes --cameras MJPG videos of --frames synthetic calibration frames
+    (bench_chessboard.render, a tenth without board) and times
+        all frames  : decode and write every frame, one video after the other
+                      (the former script)
+        stride N    : every --stride-th frame, skipped frames only demuxed
+        stride N xP : the same with one process per video
+        corners     : stride N streamed into the chessboard detection, only
+                      views with the board in every video kept
+    Reported: wall time, frames written and disk use.
+
+    python benchmarks/bench_video_to_images.py --frames 600 --cameras 2 --stride 30
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from video_to_images import make_jobs, extract_job, merge_corners
+from bench_chessboard import render
+from multiprocessing import Pool
+
+def write_videos(path, cameras, frames, size):
+    image_path = os.path.join(path, "render")
+    os.makedirs(image_path)
+    # a few distinct views repeated, rendering every frame would dominate the run
+    truth = render(image_path, 60, 6, size, (8, 6))
+    images = [cv2.imread(image_fn) for image_fn in sorted(truth)]
+    video_fns = []
+    for cam_id in range(cameras):
+        video_fn = os.path.join(path, f"2024-01-01_00-00-00_{cam_id}.avi")
+        writer = cv2.VideoWriter(video_fn, cv2.VideoWriter_fourcc(*'MJPG'), 30, size)
+        for index in range(frames):
+            writer.write(images[(index // 3 + 7 * cam_id) % len(images)])
+        writer.release()
+        video_fns.append(video_fn)
+    shutil.rmtree(image_path)
+    return video_fns
+
+def disk_use(path):
+    return sum(os.path.getsize(os.path.join(root, fn)) for root, _, fns in os.walk(path) for fn in fns)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--cameras', type=int, default=2)
+    parser.add_argument('--stride', type=int, default=30)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="bench_video_to_images_")
+    try:
+        video_fns = write_videos(path, args.cameras, args.frames, (args.width, args.height))
+        print(f"{args.cameras} videos x {args.frames} frames {args.width}x{args.height}, {os.cpu_count()} cores")
+        print(f"{'mode':>14} {'wall s':>7} {'written':>8} {'MB':>7}")
+        runs = [
+            ("all frames", 1, False, 1),
+            (f"stride {args.stride}", args.stride, False, 1),
+            (f"stride {args.stride} x{args.cameras}", args.stride, False, args.cameras),
+            ("corners", args.stride, True, args.cameras),
+        ]
+        for name, stride, corners, processes in runs:
+            output = os.path.join(path, name.replace(' ', '_'), "{cam_id}")
+            options = {
+                'selection': {'start': None, 'end': None, 'stride': stride, 'wanted': None},
+                'corners': corners, 'checkerboard_size': (8, 6), 'coarse_width': 640, 'quality': 95,
+            }
+            jobs = make_jobs(video_fns, None, output, options)
+            start = time.perf_counter()
+            if processes == 1:
+                results = list(map(extract_job, jobs))
+            else:
+                with Pool(processes) as pool:
+                    results = list(pool.imap_unordered(extract_job, jobs))
+            if corners:
+                merge_corners(results, options['checkerboard_size'], options['coarse_width'])
+            elapsed = time.perf_counter() - start
+            written = sum(result['written'] for result in results)
+            print(f"{name:>14} {elapsed:>7.2f} {written:>8} {disk_use(os.path.dirname(output)) / 1e6:>7.1f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
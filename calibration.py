@@ -1,7 +1,98 @@
+import os
 import cv2
 import numpy as np
 import glob
 import json
+import hashlib
+from multiprocessing import Pool
+from camera_model import skew_matrix
+
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+def find_chessboard(gray, checkerboard_size=(8, 6), coarse_width=640, subpix=True):
+    '''
+        Chessboard corners of a grayscale image: findChessboardCorners on a
+        copy downscaled to coarse_width, then (subpix) cornerSubPix at full
+        resolution from the scaled-up estimate. coarse_width None or 0
+        detects at full resolution. Returns corners (N, 1, 2) float32 in
+        full resolution pixels, or None.
+    '''
+    width = gray.shape[1]
+    scale = min(1.0, coarse_width / width) if coarse_width else 1.0
+    coarse = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+    flags = cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE | cv2.CALIB_CB_FAST_CHECK
+    found, corners = cv2.findChessboardCorners(coarse, checkerboard_size, flags)
+    if not found:
+        return None
+    corners = (corners / scale).astype(np.float32)
+    if subpix:
+        # search window covers the coarse localization error, kept inside one square
+        half_window = int(np.clip(2.0 / scale, 5, 11))
+        corners = cv2.cornerSubPix(gray, corners, (half_window, half_window), (-1, -1), SUBPIX_CRITERIA)
+    return corners
+
+def detect_chessboard(image_fn, checkerboard_size=(8, 6), coarse_width=640):
+    '''find_chessboard on an image file. Returns (corners (N, 1, 2) float32 or None, (width, height)).'''
+    gray = cv2.imread(image_fn, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None, None
+    height, width = gray.shape
+    return find_chessboard(gray, checkerboard_size, coarse_width), (width, height)
+
+def _detect_job(job):
+    image_fn, checkerboard_size, coarse_width = job
+    corners, size = detect_chessboard(image_fn, checkerboard_size, coarse_width)
+    return image_fn, None if corners is None else corners.reshape(-1, 2).tolist(), size
+
+def image_hash(image_fn):
+    with open(image_fn, 'rb') as fin:
+        return hashlib.sha1(fin.read()).hexdigest()
+
+def corner_cache_key(image_fn, checkerboard_size, coarse_width):
+    return f"{image_hash(image_fn)}:{checkerboard_size[0]}x{checkerboard_size[1]}@{coarse_width}"
+
+def load_corner_cache(cache_path):
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r') as fin:
+            return json.load(fin)
+    return {}
+
+def save_corner_cache(cache_path, cache):
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    with open(cache_path + '.tmp', 'w') as fout:
+        json.dump(cache, fout)
+    os.replace(cache_path + '.tmp', cache_path)
+
+def detect_chessboards(image_fns, checkerboard_size=(8, 6), coarse_width=640, processes=None,
+        cache_path='outputs/calibration/corners_cache.json'):
+    '''
+        detect_chessboard for many images on a process pool (processes None:
+        one per core). Results are cached in cache_path keyed by the SHA-1 of
+        the image file and the detection settings, so re-runs only detect
+        new or changed images. Returns {image_fn: (corners or None, (width, height))}.
+    '''
+    cache = load_corner_cache(cache_path)
+    keys = {image_fn: corner_cache_key(image_fn, checkerboard_size, coarse_width) for image_fn in image_fns}
+
+    jobs = [(image_fn, tuple(checkerboard_size), coarse_width) for image_fn in image_fns if keys[image_fn] not in cache]
+    if jobs:
+        if processes == 1 or len(jobs) == 1:
+            results = list(map(_detect_job, jobs))
+        else:
+            with Pool(processes) as pool:
+                chunksize = max(1, len(jobs) // (4 * (processes or os.cpu_count() or 1)))
+                results = list(pool.imap_unordered(_detect_job, jobs, chunksize=chunksize))
+        for image_fn, corners, size in results:
+            cache[keys[image_fn]] = {'corners': corners, 'size': size}
+        if cache_path:
+            save_corner_cache(cache_path, cache)
+
+    detections = {}
+    for image_fn in image_fns:
+        entry = cache[keys[image_fn]]
+        corners = None if entry['corners'] is None else np.asarray(entry['corners'], dtype=np.float32).reshape(-1, 1, 2)
+        detections[image_fn] = (corners, None if entry['size'] is None else tuple(entry['size']))
+    return detections
 
 def extract_camera_parameters(
         # 兩個相機的資料夾
@@ -12,7 +103,11 @@ def extract_camera_parameters(
         # 設定棋盤格大小 (寬度, 高度)
         checkerboard_size = (8, 6),
         # (mm) 實際每個方格的大小，例如1.0 cm
-        square_size = 28
+        square_size = 28,
+        # 偵測: 縮小到 coarse_width 找角點, processes 個行程, 角點快取
+        coarse_width = 640,
+        processes = None,
+        cache_path = 'outputs/calibration/corners_cache.json'
     ):
     # 準備棋盤格點在世界坐標系中的位置，例如 (0,0,0), (1,0,0), (2,0,0), ...
     objp = np.zeros((checkerboard_size[0] * checkerboard_size[1], 3), np.float32)
@@ -24,19 +119,19 @@ def extract_camera_parameters(
     imgpoints_0 = []  # 在左視角圖像中的2D點
     imgpoints_1 = []  # 在右視角圖像中的2D點
 
-    # 加載左右相機的圖像
+    # 加載左右相機的圖像, 以檔名配對同一時刻的兩張圖
     images_0 = sorted(glob.glob(camera0_image_dir))
-    images_1 = sorted(glob.glob(camera1_image_dir))
+    images_1 = {os.path.basename(image_fn): image_fn for image_fn in glob.glob(camera1_image_dir)}
+    pairs = [(image_fn, images_1[os.path.basename(image_fn)]) for image_fn in images_0 if os.path.basename(image_fn) in images_1]
 
-    for img_0, img_1 in zip(images_0, images_1):
-        img0 = cv2.imread(img_0)
-        img1 = cv2.imread(img_1)
-        gray0 = cv2.cvtColor(img0, cv2.COLOR_BGR2GRAY)
-        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
+    # 尋找左右相機的棋盤格角點 (平行, 有快取)
+    detections = detect_chessboards(sum(map(list, pairs), []), checkerboard_size, coarse_width, processes, cache_path)
 
-        # 尋找左右相機的棋盤格角點
-        ret0, corners0 = cv2.findChessboardCorners(gray0, checkerboard_size, None)
-        ret1, corners1 = cv2.findChessboardCorners(gray1, checkerboard_size, None)
+    for img_0, img_1 in pairs:
+        corners0, image_size = detections[img_0]
+        corners1, image_size_1 = detections[img_1]
+        ret0 = corners0 is not None
+        ret1 = corners1 is not None
 
         if ret0 and ret1:
             objpoints.append(objp)
@@ -50,8 +145,8 @@ def extract_camera_parameters(
             # cv2.waitKey(1500)
 
     # 校準兩個相機
-    ret0, mtx0, dist0, _, _ = cv2.calibrateCamera(objpoints, imgpoints_0, gray0.shape[::-1], None, None)
-    ret1, mtx1, dist1, _, _ = cv2.calibrateCamera(objpoints, imgpoints_1, gray1.shape[::-1], None, None)
+    ret0, mtx0, dist0, _, _ = cv2.calibrateCamera(objpoints, imgpoints_0, image_size, None, None)
+    ret1, mtx1, dist1, _, _ = cv2.calibrateCamera(objpoints, imgpoints_1, image_size_1, None, None)
 
     # 進行立體校準
     flags = 0
@@ -62,7 +157,7 @@ def extract_camera_parameters(
     # criteria = (cv2.TERM_CRITERIA_COUNT + cv2.TERM_CRITERIA_EPS, 100, 1e-5)
 
     ret, mtx0, dist0, mtx1, dist1, R, T, E, F = cv2.stereoCalibrate(
-        objpoints, imgpoints_0, imgpoints_1, mtx0, dist0, mtx1, dist1, gray0.shape[::-1], criteria=criteria, flags=flags)
+        objpoints, imgpoints_0, imgpoints_1, mtx0, dist0, mtx1, dist1, image_size, criteria=criteria, flags=flags)
     
     parameters = {
         'ret': ret,
@@ -75,8 +170,10 @@ def extract_camera_parameters(
         'E': E.tolist(),
         'F': F.tolist()
     }
-    with open(output_dir, 'w') as fout:
+    # write then rename, so a running 3D process never reloads a half-written file
+    with open(output_dir + '.tmp', 'w') as fout:
         json.dump(parameters, fout)
+    os.replace(output_dir + '.tmp', output_dir)
         
 
     return ret, mtx0, dist0, mtx1, dist1, R, T, E, F
@@ -100,9 +197,234 @@ def extract_camera_parameters(
     # print(F)
     # print()
 
+def rotation_matrices(rvecs):
+    '''Rodrigues for many rotation vectors at once: (K, 3) -> (K, 3, 3).'''
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    small = theta < 1e-12
+    axis = rvecs / np.where(small, 1.0, theta)[:, None]
+    x, y, z = axis.T
+    zero = np.zeros_like(x)
+    K = np.stack([zero, -z, y, z, zero, -x, -y, x, zero], axis=1).reshape(-1, 3, 3)
+    sin = np.sin(theta)[:, None, None]
+    cos = np.cos(theta)[:, None, None]
+    R = np.eye(3) + sin * K + (1 - cos) * (K @ K)
+    R[small] = np.eye(3)
+    return R
+
+def rotation_vector(R):
+    return cv2.Rodrigues(np.asarray(R, dtype=np.float64))[0].ravel()
+
+def initial_extrinsics(board_poses, camera_ids, reference):
+    '''
+        Camera poses relative to the reference camera from per-camera board
+        poses {cam_id: {view: (R_board->cam, t)}}. Pairwise relative poses
+        are the rotation medoid and median translation over the shared
+        views; cameras are chained from the
+        reference along the pairs with the most shared views (maximum
+        spanning tree), so every camera gets the best-supported path.
+        Returns {cam_id: (R, t)} with X_cam = R @ X_ref + t.
+    '''
+    def relative(i, j):
+        views = sorted(board_poses[i].keys() & board_poses[j].keys())
+        R_i = np.stack([board_poses[i][view][0] for view in views])
+        t_i = np.stack([board_poses[i][view][1] for view in views])
+        R_j = np.stack([board_poses[j][view][0] for view in views])
+        t_j = np.stack([board_poses[j][view][1] for view in views])
+        R_ji = R_j @ R_i.swapaxes(1, 2)
+        # rotation medoid: the candidate with the smallest median angle to all others
+        # (component-wise medians of rotation vectors break near 180 degrees)
+        cos = (np.einsum('aij,bij->ab', R_ji, R_ji) - 1) / 2
+        best = np.argmin(np.median(np.arccos(np.clip(cos, -1, 1)), axis=1))
+        t_ji = t_j - np.einsum('ij,vj->vi', R_ji[best], t_i)
+        return R_ji[best], np.median(t_ji, axis=0)
+
+    shared = {(i, j): len(board_poses[i].keys() & board_poses[j].keys()) for i in camera_ids for j in camera_ids if i != j}
+    poses = {reference: (np.eye(3), np.zeros(3))}
+    while len(poses) < len(camera_ids):
+        candidates = [(count, i, j) for (i, j), count in shared.items() if i in poses and j not in poses and count > 0]
+        if not candidates:
+            missing = [cam_id for cam_id in camera_ids if cam_id not in poses]
+            raise RuntimeError(f"cameras {missing} share no chessboard view with the calibrated ones")
+        _, i, j = max(candidates, key=lambda candidate: candidate[0])
+        R_ji, t_ji = relative(i, j)
+        R_i, t_i = poses[i]
+        poses[j] = (R_ji @ R_i, R_ji @ t_i + t_ji)
+    return poses
+
+def bundle_adjust(object_points, observations, camera_poses, view_poses, reference, loss='linear', f_scale=1.0, verbose=0):
+    '''
+        Joint refinement of all camera poses (the reference stays fixed) and
+        all board poses, intrinsics fixed. observations is a list of
+        (cam_id, view, points, focal): points (N, 2) undistorted normalized
+        image coordinates of the board corners, focal the camera's mean focal
+        length so residuals are in pixels. Every observation only depends on
+        its camera's 6 and its board's 6 parameters; that block structure is
+        passed to least_squares as jac_sparsity, so the cost grows with the
+        number of observations instead of cameras x views. A robust loss
+        ('huber', f_scale px) converges far slower with trf and is only
+        worth it with bad detections in the set.
+        Returns (camera_poses, view_poses, rms px, per-camera rms px).
+    '''
+    from scipy.optimize import least_squares
+    from scipy.sparse import lil_matrix
+
+    free_cameras = [cam_id for cam_id in camera_poses if cam_id != reference]
+    views = list(view_poses)
+    camera_index = {cam_id: index for index, cam_id in enumerate(free_cameras)}
+    view_index = {view: index for index, view in enumerate(views)}
+    object_points = np.asarray(object_points, dtype=np.float64)
+    num_points = len(object_points)
+
+    obs_camera = np.array([camera_index.get(cam_id, -1) for cam_id, _, _, _ in observations])
+    obs_view = np.array([view_index[view] for _, view, _, _ in observations])
+    obs_points = np.stack([np.asarray(points, dtype=np.float64).reshape(num_points, 2) for _, _, points, _ in observations])
+    obs_focal = np.array([focal for _, _, _, focal in observations], dtype=np.float64)
+
+    def pack(camera_poses, view_poses):
+        blocks = [np.r_[rotation_vector(camera_poses[cam_id][0]), camera_poses[cam_id][1]] for cam_id in free_cameras]
+        blocks += [np.r_[rotation_vector(view_poses[view][0]), view_poses[view][1]] for view in views]
+        return np.concatenate(blocks)
+
+    def unpack(x):
+        cameras = x[:6 * len(free_cameras)].reshape(-1, 6)
+        boards = x[6 * len(free_cameras):].reshape(-1, 6)
+        # the reference camera is appended as the last row, obs_camera -1 picks it
+        R_cam = np.concatenate([rotation_matrices(cameras[:, :3]), np.eye(3)[None]])
+        t_cam = np.concatenate([cameras[:, 3:], np.zeros((1, 3))])
+        return R_cam, t_cam, rotation_matrices(boards[:, :3]), boards[:, 3:]
+
+    def residuals(x):
+        R_cam, t_cam, R_board, t_board = unpack(x)
+        X_ref = object_points @ R_board[obs_view].swapaxes(1, 2) + t_board[obs_view, None, :]
+        X_cam = X_ref @ R_cam[obs_camera].swapaxes(1, 2) + t_cam[obs_camera, None, :]
+        projected = X_cam[..., :2] / X_cam[..., 2:]
+        return ((projected - obs_points) * obs_focal[:, None, None]).ravel()
+
+    num_params = 6 * (len(free_cameras) + len(views))
+    sparsity = lil_matrix((2 * num_points * len(observations), num_params), dtype=np.uint8)
+    for index in range(len(observations)):
+        rows = slice(2 * num_points * index, 2 * num_points * (index + 1))
+        if obs_camera[index] >= 0:
+            sparsity[rows, 6 * obs_camera[index]:6 * obs_camera[index] + 6] = 1
+        column = 6 * (len(free_cameras) + obs_view[index])
+        sparsity[rows, column:column + 6] = 1
+
+    result = least_squares(residuals, pack(camera_poses, view_poses), jac_sparsity=sparsity, method='trf',
+        x_scale='jac', loss=loss, f_scale=f_scale, verbose=verbose)
+
+    R_cam, t_cam, R_board, t_board = unpack(result.x)
+    camera_poses = {reference: (np.eye(3), np.zeros(3))}
+    for cam_id, index in camera_index.items():
+        camera_poses[cam_id] = (R_cam[index], t_cam[index])
+    view_poses = {view: (R_board[index], t_board[index]) for view, index in view_index.items()}
+    errors = result.fun.reshape(len(observations), num_points, 2)
+    squared = (errors ** 2).sum(axis=-1).mean(axis=-1)
+    per_camera = {cam_id: float(np.sqrt(squared[np.array([obs[0] == cam_id for obs in observations])].mean())) for cam_id in camera_poses}
+    return camera_poses, view_poses, float(np.sqrt(squared.mean())), per_camera
+
+def extract_rig_parameters(
+        camera_ids = [0, 1],
+        # 各相機的資料夾, {cam_id} 代入相機編號; 同一時間的影像檔名相同
+        image_pattern = 'outputs/calibration/{cam_id}/*.jpg',
+        output_dir = 'outputs/calibration/parameters.json',
+        checkerboard_size = (8, 6),
+        square_size = 28,
+        # 其他相機的外參都相對於 reference
+        reference = None,
+        coarse_width = 640,
+        processes = None,
+        cache_path = 'outputs/calibration/corners_cache.json',
+        verbose = 0
+    ):
+    '''
+        Calibrates N cameras at once. Intrinsics come from
+        cv2.calibrateCamera per camera, every camera pose relative to the
+        reference from the shared chessboard views (initial_extrinsics),
+        and all poses are then refined together by bundle_adjust. Views
+        are matched across cameras by file name (CalibrationCapture and
+        tools/video_to_images.py write frame_<n>.jpg with the same n for
+        every camera). parameters.json gets the
+        'cameras' table read by CameraRig plus, for the reference and the
+        next camera, the keys of the stereo layout, so older readers keep
+        working.
+    '''
+    reference = camera_ids[0] if reference is None else reference
+    objp = np.zeros((checkerboard_size[0] * checkerboard_size[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:checkerboard_size[0], 0:checkerboard_size[1]].T.reshape(-1, 2)
+    objp *= square_size
+
+    images = {cam_id: sorted(glob.glob(image_pattern.format(cam_id=cam_id))) for cam_id in camera_ids}
+    detections = detect_chessboards(sum(images.values(), []), checkerboard_size, coarse_width, processes, cache_path)
+
+    intrinsics = {}
+    board_poses = {}
+    corners = {}
+    for cam_id in camera_ids:
+        found = [(os.path.basename(image_fn), detections[image_fn]) for image_fn in images[cam_id] if detections[image_fn][0] is not None]
+        if len(found) < 3:
+            raise RuntimeError(f"camera {cam_id}: chessboard found in {len(found)} images, at least 3 are needed")
+        image_size = found[0][1][1]
+        rms, mtx, dist, rvecs, tvecs = cv2.calibrateCamera([objp] * len(found), [corners for _, (corners, _) in found], image_size, None, None)
+        print(f"camera {cam_id}: {len(found)} views, intrinsic rms {rms:.3f} px")
+        intrinsics[cam_id] = (mtx, dist, image_size)
+        board_poses[cam_id] = {view: (cv2.Rodrigues(rvec)[0], tvec.ravel()) for (view, _), rvec, tvec in zip(found, rvecs, tvecs)}
+        corners[cam_id] = {view: view_corners for view, (view_corners, _) in found}
+
+    camera_poses = initial_extrinsics(board_poses, camera_ids, reference)
+    # board pose in the reference frame, from the first camera (in rig order) that saw it
+    view_poses = {}
+    for cam_id in camera_ids:
+        R_c, t_c = camera_poses[cam_id]
+        for view, (R_cb, t_cb) in board_poses[cam_id].items():
+            if view not in view_poses:
+                view_poses[view] = (R_c.T @ R_cb, R_c.T @ (t_cb - t_c))
+    observations = []
+    for cam_id in camera_ids:
+        mtx, dist, _ = intrinsics[cam_id]
+        focal = (mtx[0, 0] + mtx[1, 1]) / 2
+        for view, view_corners in corners[cam_id].items():
+            observations.append((cam_id, view, cv2.undistortPoints(view_corners, mtx, dist).reshape(-1, 2), focal))
+    print(f"bundle adjustment: {len(camera_ids)} cameras, {len(view_poses)} board poses, {len(observations)} observations")
+    camera_poses, _, rms, per_camera = bundle_adjust(objp, observations, camera_poses, view_poses, reference, verbose=verbose)
+    print(f"reprojection rms {rms:.3f} px, per camera { {cam_id: round(error, 3) for cam_id, error in per_camera.items()} }")
+
+    parameters = {'ret': rms, 'reference': reference, 'cameras': {}}
+    for cam_id in camera_ids:
+        mtx, dist, image_size = intrinsics[cam_id]
+        R, t = camera_poses[cam_id]
+        parameters['cameras'][str(cam_id)] = {
+            'mtx': mtx.tolist(),
+            'dist': dist.tolist(),
+            'R': R.tolist(),
+            'T': t.reshape(3, 1).tolist(),
+            'image_size': list(image_size),
+            'rms': per_camera[cam_id],
+        }
+    if len(camera_ids) > 1:
+        # stereo layout of extract_camera_parameters for the first pair
+        other = [cam_id for cam_id in camera_ids if cam_id != reference][0]
+        (mtx0, dist0, _), (mtx1, dist1, _) = intrinsics[reference], intrinsics[other]
+        R, t = camera_poses[other]
+        E = skew_matrix(t) @ R
+        F = np.linalg.inv(mtx1).T @ E @ np.linalg.inv(mtx0)
+        parameters.update({
+            'mtx0': mtx0.tolist(), 'dist0': dist0.tolist(),
+            'mtx1': mtx1.tolist(), 'dist1': dist1.tolist(),
+            'R': R.tolist(), 'T': t.reshape(3, 1).tolist(),
+            'E': E.tolist(), 'F': F.tolist()
+        })
+    # write then rename, so a running 3D process never reloads a half-written file
+    with open(output_dir + '.tmp', 'w') as fout:
+        json.dump(parameters, fout)
+    os.replace(output_dir + '.tmp', output_dir)
+    return parameters
+
 '''
 distortion coefficient
 k1 k2 p1 p2 [k3 [k4 k5 k6 [s1 s2 s3 s4 [tx ty]]]]
 '''
 if __name__ == '__main__':
-    ret, mtx0, dist0, mtx1, dist1, R, T, E, F = extract_camera_parameters()
\ No newline at end of file
+    ret, mtx0, dist0, mtx1, dist1, R, T, E, F = extract_camera_parameters()
+    # 多相機 (N > 2) 一次校準:
+    # parameters = extract_rig_parameters(camera_ids=[0, 1, 2, 3])
\ No newline at end of file
@@ -0,0 +1,237 @@
+import os
+import re
+import cv2
+import glob
+import time
+import numpy as np
+from multiprocessing import Process
+from singleton_lock import tprint
+from utils import decode_frame_size_rate
+from frame_buffer import subscribe_frames
+from status_table import STATUS_ERROR
+from calibration import find_chessboard
+
+SCALE_BINS = [0.2, 0.35]     # board size / image size: far, middle, near
+TILT_THRESHOLD = np.log(1.15) # opposite board edges differing by more than 15 %: tilted
+
+def board_pose_bin(corners, checkerboard_size, image_size):
+    '''
+        Coarse pose class of a detected board from its corners alone (no
+        intrinsics needed): distance from the apparent size (3 bins) times
+        frontal / turned left-right / tilted up-down from the perspective
+        foreshortening of opposite edges (3 bins), 9 classes in total.
+    '''
+    columns = checkerboard_size[0]
+    corners = corners.reshape(-1, 2)
+    c00, c10, c01, c11 = corners[0], corners[columns - 1], corners[-columns], corners[-1]
+    top, bottom = np.linalg.norm(c10 - c00), np.linalg.norm(c11 - c01)
+    left, right = np.linalg.norm(c01 - c00), np.linalg.norm(c11 - c10)
+    # the board may be detected starting from either end, only the magnitude is used
+    yaw, pitch = abs(np.log(right / left)), abs(np.log(bottom / top))
+    if max(yaw, pitch) < TILT_THRESHOLD:
+        tilt = 0
+    else:
+        tilt = 1 if yaw >= pitch else 2
+    size = np.sqrt(cv2.contourArea(cv2.convexHull(corners.astype(np.float32))) / (image_size[0] * image_size[1]))
+    return int(np.searchsorted(SCALE_BINS, size)) * 3 + tilt
+
+class CalibrationCoverage:
+    '''
+        Per-camera coverage of the kept calibration views: image cells
+        (grid columns x rows) holding a board corner, and the board pose
+        classes of board_pose_bin. A synchronized view is worth keeping
+        only if, for some camera, it covers at least min_new_cells new
+        cells or a new pose class. done() once every camera covers
+        target_coverage of the cells and target_poses pose classes, with at
+        least min_photos views kept (or max_photos in any case).
+    '''
+    def __init__(self, camera_ids, image_size, checkerboard_size=(8, 6), grid=(6, 4),
+            min_new_cells=2, target_coverage=0.7, target_poses=6, min_photos=10, max_photos=40):
+        self.camera_ids = list(camera_ids)
+        self.image_size = image_size
+        self.checkerboard_size = checkerboard_size
+        self.grid = grid
+        self.min_new_cells = min_new_cells
+        self.target_coverage = target_coverage
+        self.target_poses = target_poses
+        self.min_photos = min_photos
+        self.max_photos = max_photos
+        self.cells = {cam_id: np.zeros((grid[1], grid[0]), dtype=bool) for cam_id in self.camera_ids}
+        self.poses = {cam_id: set() for cam_id in self.camera_ids}
+        self.photos = 0
+
+    def _view(self, corners):
+        corners = corners.reshape(-1, 2)
+        cells = np.zeros((self.grid[1], self.grid[0]), dtype=bool)
+        column = np.clip((corners[:, 0] * self.grid[0] / self.image_size[0]).astype(int), 0, self.grid[0] - 1)
+        row = np.clip((corners[:, 1] * self.grid[1] / self.image_size[1]).astype(int), 0, self.grid[1] - 1)
+        cells[row, column] = True
+        return cells, board_pose_bin(corners, self.checkerboard_size, self.image_size)
+
+    def is_new(self, corners):
+        '''corners {cam_id: (N, 1, 2)} of one synchronized view.'''
+        for cam_id, view_corners in corners.items():
+            cells, pose = self._view(view_corners)
+            if (cells & ~self.cells[cam_id]).sum() >= self.min_new_cells or pose not in self.poses[cam_id]:
+                return True
+        return False
+
+    def add(self, corners):
+        for cam_id, view_corners in corners.items():
+            cells, pose = self._view(view_corners)
+            self.cells[cam_id] |= cells
+            self.poses[cam_id].add(pose)
+        self.photos += 1
+
+    def coverage(self, cam_id):
+        return float(self.cells[cam_id].mean())
+
+    def progress(self):
+        '''0 .. 1, the least advanced of the targets over all cameras.'''
+        if self.photos >= self.max_photos:
+            return 1.0
+        parts = [self.photos / self.min_photos]
+        for cam_id in self.camera_ids:
+            parts.append(self.coverage(cam_id) / self.target_coverage)
+            parts.append(len(self.poses[cam_id]) / self.target_poses)
+        return float(min(1.0, min(parts)))
+
+    def done(self):
+        return self.progress() >= 1.0
+
+    def summary(self):
+        return {
+            'photos': self.photos,
+            'coverage': {cam_id: round(self.coverage(cam_id), 3) for cam_id in self.camera_ids},
+            'poses': {cam_id: len(self.poses[cam_id]) for cam_id in self.camera_ids},
+        }
+
+class CalibrationCapture(Process):
+    '''
+        Collects chessboard views for calibration in the background,
+        replacing the panel's photo loop. A few times per second it takes
+        the latest frame of every camera, re-reading cameras that lag behind
+        the newest one by more than the sync tolerance, and looks for the
+        board on a downscaled copy (find_chessboard without cornerSubPix;
+        the first camera without a board ends the check). Views where every
+        camera sees the board and CalibrationCoverage finds something new
+        are written as "<save_path>/<cam_id>/frame_<n>.jpg", numbering after
+        the frames already there. Stops by itself once the coverage targets
+        are met. Status: frame_id views kept, dropped views every camera saw
+        but that added nothing new, fps checks per second, progress towards
+        the targets. Config:
+            'calib_checkerboard_size'  inner corners, default (8, 6)
+            'calib_check_fps'          checks per second, default 5
+            'calib_coarse_width'       detection width, default 640
+            'calib_sync_tolerance'     s, default half a frame period
+            'calib_grid'               coverage cells (columns, rows), default (6, 4)
+            'calib_target_coverage'    default 0.7 of the cells per camera
+            'calib_target_poses'       default 6 of the 9 pose classes per camera
+            'calib_min_photos' / 'calib_max_photos'  default 10 / 40
+    '''
+    def __init__(self, config, original_images, status_table, save_path = "outputs/calibration"):
+        super().__init__()
+        self.config = config
+        self.original_images = original_images
+        self.status_table = status_table
+        self.save_path = save_path
+        self.process_name = "CalibrationCapture"
+
+    def run(self):
+        tprint(f"Start calibration capture")
+        self.status = self.status_table[self.process_name]
+        try:
+            self.capture()
+        except Exception as e:
+            self.status.error = STATUS_ERROR
+            tprint(f"Exception in CalibrationCapture: {e}")
+        finally:
+            self.status.running = 0
+            tprint(f"Stopping calibration capture")
+
+    def grab(self, frames, subscription, tolerance):
+        '''Latest frame of every camera into frames, within tolerance of each other. Returns the frame ids or None.'''
+        frame_ids, timestamps = {}, {}
+        for cam_id, frame_ring in self.original_images.items():
+            frame_ids[cam_id], timestamps[cam_id], _ = frame_ring.read(out=frames[cam_id])
+            if frame_ids[cam_id] < 0:
+                return None
+        for _ in range(3):
+            newest = max(timestamps.values())
+            lagging = [cam_id for cam_id, timestamp in timestamps.items() if timestamp < newest - tolerance]
+            if not lagging:
+                return frame_ids
+            subscription.wait(timeout=tolerance * 2)
+            for cam_id in lagging:
+                frame_ids[cam_id], timestamps[cam_id], _ = self.original_images[cam_id].read(out=frames[cam_id])
+        return None
+
+    def capture(self):
+        frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
+        checkerboard_size = tuple(self.config.get('calib_checkerboard_size', (8, 6)))
+        coarse_width = self.config.get('calib_coarse_width', 640)
+        tolerance = self.config.get('calib_sync_tolerance', 0.5 / fps)
+        check_period = 1.0 / self.config.get('calib_check_fps', 5)
+        coverage = CalibrationCoverage(
+            self.original_images.keys(), (frameWidth, frameHeight), checkerboard_size,
+            grid = tuple(self.config.get('calib_grid', (6, 4))),
+            target_coverage = self.config.get('calib_target_coverage', 0.7),
+            target_poses = self.config.get('calib_target_poses', 6),
+            min_photos = self.config.get('calib_min_photos', 10),
+            max_photos = self.config.get('calib_max_photos', 40)
+        )
+        for cam_id in self.original_images:
+            os.makedirs(os.path.join(self.save_path, f"{cam_id}"), exist_ok=True)
+        photo_id = self.next_photo_id()
+
+        frames = {cam_id: np.empty((frameHeight, frameWidth, 3), dtype=np.uint8) for cam_id in self.original_images}
+        gray = np.empty((frameHeight, frameWidth), dtype=np.uint8)
+        self.status.frame_id = 0
+        prev_time = time.time()
+        checks = 0
+        subscription = subscribe_frames(self.original_images.values())
+        while not self.status.halt and not coverage.done():
+            next_check = time.time() + check_period
+            frame_ids = self.grab(frames, subscription, tolerance)
+            if frame_ids is not None:
+                checks += 1
+                self.status.frames += 1
+                corners = {}
+                for cam_id, frame in frames.items():
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+                    corners[cam_id] = find_chessboard(gray, checkerboard_size, coarse_width, subpix=False)
+                    if corners[cam_id] is None:
+                        break
+                if all(view_corners is not None for view_corners in corners.values()):
+                    if coverage.is_new(corners):
+                        coverage.add(corners)
+                        for cam_id, frame in frames.items():
+                            cv2.imwrite(os.path.join(self.save_path, f"{cam_id}", f"frame_{photo_id:05d}.jpg"), frame)
+                        tprint(f"Calibration view {photo_id} saved (frames {frame_ids}), progress {coverage.progress() * 100:.0f}%")
+                        photo_id += 1
+                    else:
+                        self.status.dropped += 1
+                    self.status.frame_id = coverage.photos
+                    self.status.progress = coverage.progress()
+
+            current_time = time.time()
+            if current_time - prev_time >= 1.0:
+                self.status.fps = checks / (current_time - prev_time)
+                self.status.last_update = current_time
+                self.status.cpu_time = time.process_time()
+                checks = 0
+                prev_time = current_time
+            # the checks are throttled, the cameras run on regardless
+            time.sleep(max(0.0, next_check - time.time()))
+        subscription.close()
+        tprint(f"Calibration capture: {coverage.summary()}")
+
+    def next_photo_id(self):
+        '''One past the highest frame_<n>.jpg of any camera, so earlier captures are kept.'''
+        numbers = [-1]
+        for cam_id in self.original_images:
+            for image_fn in glob.glob(os.path.join(self.save_path, f"{cam_id}", "frame_*.jpg")):
+                match = re.match(r"frame_(\d+)\.jpg$", os.path.basename(image_fn))
+                if match:
+                    numbers.append(int(match.group(1)))
+        return max(numbers) + 1
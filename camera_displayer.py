@@ -3,10 +3,11 @@ import numpy as np
 import time
 from multiprocessing import Process, Queue
 from singleton_lock import print_lock, tprint
-from utils import decode_frame_size_rate, BODY25_SKELETON_EDGES
+from utils import decode_frame_size_rate, capture_clock, RateMeter, BODY25_SKELETON_EDGES
+from status_table import STATUS_ERROR
 
 class CameraDisplayer(Process):
-    def __init__(self, cam_id, config, original_image, pose_2d, input_camera_name, input_hpe_name, shared_dict):
+    def __init__(self, cam_id, config, original_image, pose_2d, input_camera_name, input_hpe_name, status_table, latency_table=None):
         super().__init__()
         self.cam_id = cam_id
         self.process_name = f"CameraDisplayer {self.cam_id}"
@@ -16,19 +17,19 @@ class CameraDisplayer(Process):
         self.pose_2d = pose_2d
         self.input_camera_name = input_camera_name
         self.input_hpe_name = input_hpe_name
-        self.shared_dict = shared_dict
-        self.shared_dict[self.process_name] = {
-            'fps': 0,
-            'running': True
-        }
+        self.status_table = status_table
+        self.latency_table = latency_table
 
     def run(self):
         tprint("Displaying camera" + str(self.cam_id))
+        self.status = self.status_table[self.process_name]
         try:
             self.display_camera()
         except Exception as e:
+            self.status.error = STATUS_ERROR
             tprint(f"Exception in camera {self.cam_id}: {e}")
         finally:
+            self.status.running = 0
             tprint(f"Stopping camera {self.cam_id}")
             cv2.destroyWindow(self.screen_name)
     
@@ -36,42 +37,46 @@ class CameraDisplayer(Process):
         frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
         cv2.namedWindow(self.screen_name)
 
-        prev_time = time.time()
-        times = [1]
-        maxCount = 60
+        # capture -> on screen (glass-to-glass), and read -> on screen
+        latency = self.latency_table.recorder(self.process_name) if self.latency_table is not None else None
+        rate = RateMeter()
         prev_image_id = -1
-        while not self.shared_dict["control signals"][self.process_name]["halt"]:
-            input_frame = np.frombuffer(self.original_image.get_obj(), dtype=np.uint8).reshape((frameHeight, frameWidth, 3))
-            if (input_frame is not None) and not (prev_image_id == self.shared_dict[self.input_camera_name]['image_id']):
-                prev_image_id = self.shared_dict[self.input_camera_name]['image_id']
-                current_time = time.time()
-                times.append(round(current_time - prev_time, 2))
-                times = times[-maxCount:]
-                status = self.shared_dict[self.process_name]
-                status['fps'] = 1 / np.mean(times) #計算時間
-                self.shared_dict[self.process_name] = status
-                prev_time = current_time
+        frame = np.empty((frameHeight, frameWidth, 3), dtype=np.uint8)
+        people = np.zeros(self.pose_2d.shape, dtype=np.float32)
+        subscription = self.original_image.subscribe()
+        while not self.status.halt:
+            if not (prev_image_id == self.original_image.latest_id()):
+                read_time = capture_clock()
+                prev_image_id, capture_time, frame = self.original_image.read(out=frame)
+                self.status.fps = rate.tick(read_time) #計算時間
+                self.status.frame_id = prev_image_id
+                self.status.last_update = time.time()
+                self.status.cpu_time = time.process_time()
 
-                frame = np.copy(input_frame)
-                pose_2d = np.frombuffer(self.pose_2d.get_obj(), dtype=np.float32).reshape((25, 3))
-                frame = self.draw_human_2d(frame, pose_2d)
+                _, _, pose_2ds = self.pose_2d.read_people(out=people)
+                for pose_2d in pose_2ds:
+                    frame = self.draw_human_2d(frame, pose_2d)
                 cv2.putText(
-                    frame, 'FPS : {0:.2f}'.format(round(self.shared_dict[self.process_name]['fps'], 2)), 
+                    frame, 'FPS : {0:.2f}'.format(round(self.status.fps, 2)), 
                     (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 cv2.putText(
-                    frame, 'Time : {0:.2f}'.format(round(1 / self.shared_dict[self.process_name]['fps'], 5)), 
+                    frame, 'Time : {0:.2f}'.format(round(1 / self.status.fps if self.status.fps else 0, 5)), 
                     (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 cv2.imshow(self.screen_name, frame)
                 # 按下 'q' 鍵退出
-                if cv2.waitKey(1) == ord('q'):
-                    status = self.shared_dict[self.process_name]
-                    status['running'] = False
-                    self.shared_dict[self.process_name] = status
+                key = cv2.waitKey(1)
+                self.status.frames += 1
+                if latency is not None:
+                    # the window is repainted inside waitKey
+                    shown_time = capture_clock()
+                    latency.age(capture_time, shown_time)
+                    latency.stage(read_time, shown_time)
+                if key == ord('q'):
                     break
             else:
-                # tprint(f"queue {self.cam_id} empty!")
-                # time.sleep(0.005)
-                pass
+                # sleep until the camera publishes a new frame
+                subscription.wait(timeout=0.1)
+        subscription.close()
     
     def draw_human_2d(self, frame, pose_2d):
         '''
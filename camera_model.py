@@ -0,0 +1,168 @@
+import os
+import cv2
+import json
+import time
+import numpy as np
+from singleton_lock import tprint
+
+# reference camera frame (x right, y down, z forward) -> plotting frame (x right, y forward, z up)
+WORLD_AXIS_REMAP = np.array([
+    [1, 0, 0],
+    [0, 0, 1],
+    [0, -1, 0]
+], dtype=np.float64)
+
+def skew_matrix(t):
+    '''Cross-product matrix [t]x, skew_matrix(t) @ v == np.cross(t, v).'''
+    t = np.asarray(t, dtype=np.float64).ravel()
+    return np.array([
+        [0, -t[2], t[1]],
+        [t[2], 0, -t[0]],
+        [-t[1], t[0], 0]
+    ])
+
+class CameraModel:
+    '''
+        One calibrated camera. R, T map reference-camera coordinates into this
+        camera (X_cam = R @ X_ref + T), as returned by cv2.stereoCalibrate.
+        Everything derived from them is computed once here.
+    '''
+    def __init__(self, mtx, dist, R=None, T=None):
+        self.mtx = np.asarray(mtx, dtype=np.float64).reshape((3, 3))
+        self.mtx_inv = np.linalg.inv(self.mtx)
+        self.dist = np.asarray(dist, dtype=np.float64).ravel()
+        self.R = np.eye(3) if R is None else np.asarray(R, dtype=np.float64).reshape((3, 3))
+        self.T = np.zeros((3, 1)) if T is None else np.asarray(T, dtype=np.float64).reshape((3, 1))
+        self.R_inv = self.R.T
+        self.rvec = cv2.Rodrigues(self.R)[0]
+        self.extrinsic = np.hstack([self.R, self.T]) # normalized projection matrix
+        self.projection = self.mtx @ self.extrinsic
+        self.center = (-self.R_inv @ self.T).ravel()
+
+class CameraRig:
+    '''
+        The calibrated cameras of the capture volume, keyed by camera id, with
+        the per-camera matrices stacked for vectorized use:
+            mtx (V, 3, 3), extrinsics / projections (V, 3, 4), centers (V, 3)
+        world_transform maps reference-camera coordinates to world coordinates.
+    '''
+    def __init__(self, cameras, world_transform=WORLD_AXIS_REMAP):
+        self.cameras = dict(cameras)
+        self.camera_ids = list(self.cameras.keys())
+        models = [self.cameras[cam_id] for cam_id in self.camera_ids]
+        self.mtx = np.stack([model.mtx for model in models])
+        self.dist = [model.dist for model in models]
+        # k1 k2 p1 p2 k3 k4 k5 k6 (zero padded) for the vectorized projection
+        self.dist_padded = np.stack([np.pad(model.dist[:8], (0, 8 - len(model.dist[:8]))) for model in models])
+        self.extrinsics = np.stack([model.extrinsic for model in models])
+        self.projections = np.stack([model.projection for model in models])
+        self.centers = np.stack([model.center for model in models])
+        self.world_transform = np.asarray(world_transform, dtype=np.float64)
+        self.world_transform_inv = self.world_transform.T # rotation
+
+    @classmethod
+    def from_parameters(cls, parameters, **kwargs):
+        '''
+            parameters.json with a 'cameras' table
+                {"cameras": {"<cam_id>": {"mtx": ..., "dist": ..., "R": ..., "T": ...}, ...}}
+            (R, T relative to the reference camera), or the stereo layout of
+            calibration.extract_camera_parameters (camera 0 is the reference).
+        '''
+        if 'cameras' in parameters:
+            cameras = {}
+            for key, camera in parameters['cameras'].items():
+                cam_id = int(key) if str(key).isdigit() else key
+                cameras[cam_id] = CameraModel(camera['mtx'], camera['dist'], camera.get('R'), camera.get('T'))
+        else:
+            cameras = {
+                0: CameraModel(parameters['mtx0'], parameters['dist0']),
+                1: CameraModel(parameters['mtx1'], parameters['dist1'], parameters['R'], parameters['T']),
+            }
+        return cls(cameras, **kwargs)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with open(path, 'r') as fin:
+            parameters = json.load(fin)
+        return cls.from_parameters(parameters, **kwargs)
+
+    def __len__(self):
+        return len(self.camera_ids)
+
+    def subset(self, camera_ids):
+        return CameraRig({cam_id: self.cameras[cam_id] for cam_id in camera_ids}, self.world_transform)
+
+    def undistort(self, points):
+        '''
+            Pixel keypoints (..., V, J, 2) -> normalized image coordinates.
+            One cv2.undistortPoints call per view covers every joint of every frame.
+        '''
+        normalized = np.empty(points.shape, dtype=np.float64)
+        if normalized.size == 0:
+            return normalized
+        for view, (mtx, dist) in enumerate(zip(self.mtx, self.dist)):
+            view_points = np.ascontiguousarray(points[..., view, :, :], dtype=np.float64)
+            undistorted = cv2.undistortPoints(view_points.reshape(-1, 1, 2), mtx, dist)
+            normalized[..., view, :, :] = undistorted.reshape(view_points.shape)
+        return normalized
+
+    def project(self, points, world=True):
+        '''
+            World points (..., J, 3) -> pixel coordinates in every view (..., V, J, 2)
+            and depth (..., V, J), with lens distortion applied. world=False
+            takes points already in the reference camera frame.
+        '''
+        points_ref = np.asarray(points, dtype=np.float64)
+        if world:
+            points_ref = points_ref @ self.world_transform_inv.T
+        # all views at once: (..., V, J, 3) in every camera frame
+        points_cam = points_ref[..., None, :, :] @ np.swapaxes(self.extrinsics[:, :, :3], -1, -2) + self.extrinsics[:, None, :, 3]
+        depth = points_cam[..., 2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # points on a camera plane (e.g. unsolved joints at the origin) give inf / nan
+            x = points_cam[..., 0] / depth
+            y = points_cam[..., 1] / depth
+            k1, k2, p1, p2, k3, k4, k5, k6 = [self.dist_padded[:, i, None] for i in range(8)]
+            r2 = x * x + y * y
+            radial = (1 + ((k3 * r2 + k2) * r2 + k1) * r2) / (1 + ((k6 * r2 + k5) * r2 + k4) * r2)
+            x_distorted = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+            y_distorted = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+        projected = np.stack([
+            self.mtx[:, 0, 0, None] * x_distorted + self.mtx[:, 0, 1, None] * y_distorted + self.mtx[:, 0, 2, None],
+            self.mtx[:, 1, 1, None] * y_distorted + self.mtx[:, 1, 2, None]
+        ], axis=-1)
+        return projected, depth
+
+class CalibrationWatcher:
+    '''
+        Keeps the CameraRig of a parameters.json up to date. poll() is meant
+        to be called from a processing loop: it stats the file at most every
+        `interval` seconds and, when it changed, builds the new rig completely
+        before swapping the `rig` reference, so the loop always sees either
+        the old or the new calibration. A file that fails to load (e.g. being
+        written) keeps the old rig.
+    '''
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.mtime = os.stat(path).st_mtime
+        self.rig = CameraRig.load(path)
+        self.version = 0
+        self.last_check = time.monotonic()
+
+    def poll(self):
+        now = time.monotonic()
+        if now - self.last_check < self.interval:
+            return self.rig
+        self.last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime != self.mtime:
+                rig = CameraRig.load(self.path)
+                self.rig = rig
+                self.mtime = mtime
+                self.version = self.version + 1
+                tprint(f"Reloaded calibration {self.path} (version {self.version})")
+        except (OSError, ValueError, KeyError) as e:
+            tprint(f"Keeping previous calibration, failed to reload {self.path}: {e}")
+        return self.rig
@@ -1,31 +1,30 @@
-import cv2
-import numpy as np
 import time
-from multiprocessing import Process, Queue
+from multiprocessing import Process
 from singleton_lock import print_lock, tprint
-from utils import decode_frame_size_rate, print_cam_informations
+from capture_source import open_capture_source
+from utils import capture_clock, RateMeter
+from status_table import STATUS_ERROR
 
 class CameraReader(Process):
-    def __init__(self, cam_id, config, original_image, shared_dict):
+    def __init__(self, cam_id, config, original_image, status_table, latency_table=None):
         super().__init__()
         self.cam_id = cam_id
         self.process_name = f"CameraReader {self.cam_id}"
         self.config = config
         self.original_image = original_image
-        self.shared_dict = shared_dict
-        self.shared_dict[self.process_name] = {
-            'fps': 0,
-            'running': True,
-            'image_id': 0
-        }
+        self.status_table = status_table
+        self.latency_table = latency_table
 
     def run(self):
         tprint(f"Start camera {self.cam_id}")
+        self.status = self.status_table[self.process_name]
         try:
             self.read_camera()
         except Exception as e:
+            self.status.error = STATUS_ERROR
             tprint(f"Exception in camera {self.cam_id}: {e}")
         finally:
+            self.status.running = 0
             # queue cancel_join_thread() to prevent block join_thread()
             # https://docs.python.org/3/library/multiprocessing.html#pipes-and-queues
             # self.queue.close()
@@ -33,43 +32,36 @@ class CameraReader(Process):
             tprint(f"Stopping camera {self.cam_id}")
 
     def read_camera(self):
-        frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
+        # live camera, or a recorded video / image folder when config['replay'] names one
+        cam = open_capture_source(self.cam_id, self.config)
 
-        cam = cv2.VideoCapture(self.cam_id, self.config['api'])
-        cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
-        cam.set(cv2.CAP_PROP_FRAME_WIDTH,  frameWidth)
-        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, frameHeight)
-        cam.set(cv2.CAP_PROP_FPS, fps)
-        cam.set(cv2.CAP_PROP_EXPOSURE, self.config['exposure'])
-        cam.set(cv2.CAP_PROP_GAIN, self.config['gain'])
-
-        if cam.isOpened():  # try to get the first frame
+        if cam.open():  # try to get the first frame
             rval, frame = cam.read()
         else:
             rval = False
         with print_lock:
-            print_cam_informations(self.cam_id, cam)
+            cam.print_informations()
 
-        prev_time = time.time()
-        times = [1]
-        maxCount = 60
+        # capture -> published in the FrameRing
+        latency = self.latency_table.recorder(self.process_name) if self.latency_table is not None else None
+        rate = RateMeter()
         image_id = 0
-        while rval and not self.shared_dict["control signals"][self.process_name]["halt"]:
-            current_time = time.time()
-            times.append(round(current_time - prev_time, 2))
-            times = times[-maxCount:]
-            local_dict = self.shared_dict[self.process_name]
-            local_dict['fps'] = 1 / np.mean(times) #計算時間
-            local_dict['image_id'] = image_id
-            prev_time = current_time
-            self.shared_dict[self.process_name] = local_dict
+        while rval and not self.status.halt:
+            self.status.fps = rate.tick() #計算時間
+            self.status.frame_id = image_id
+            self.status.last_update = time.time()
+            self.status.cpu_time = time.process_time()
 
             rval, frame = cam.read()
-            original_image = np.frombuffer(self.original_image.get_obj(), dtype=np.uint8).reshape((frameHeight, frameWidth, 3))
-            original_image[:] = frame
+            capture_time = capture_clock()
+            if not rval:
+                break
+            self.original_image.begin_write()[:] = frame
+            if latency is not None:
+                # copy into shared memory, stamped before publishing wakes the consumers
+                latency.age(capture_time, capture_clock())
+            self.original_image.end_write(image_id, capture_time)
+            self.status.frames += 1
             image_id = image_id + 1
-        local_dict = self.shared_dict[self.process_name]
-        local_dict['running'] = False
-        self.shared_dict[self.process_name] = local_dict
         cam.release()
         tprint(f"Released camera {self.cam_id}")
\ No newline at end of file
@@ -0,0 +1,176 @@
+import os
+import cv2
+import glob
+import time
+from utils import decode_frame_size_rate, print_cam_informations
+from recording import Recording, is_recording
+
+IMAGE_EXTENSIONS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+class CameraSource:
+    '''Live camera through cv2.VideoCapture, configured like the original CameraReader.'''
+    def __init__(self, cam_id, config):
+        self.cam_id = cam_id
+        self.config = config
+        self.cam = None
+
+    def open(self):
+        frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
+        self.cam = cv2.VideoCapture(self.cam_id, self.config['api'])
+        self.cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
+        self.cam.set(cv2.CAP_PROP_FRAME_WIDTH,  frameWidth)
+        self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, frameHeight)
+        self.cam.set(cv2.CAP_PROP_FPS, fps)
+        self.cam.set(cv2.CAP_PROP_EXPOSURE, self.config['exposure'])
+        self.cam.set(cv2.CAP_PROP_GAIN, self.config['gain'])
+        return self.cam.isOpened()
+
+    def read(self):
+        return self.cam.read()
+
+    def print_informations(self):
+        print_cam_informations(self.cam_id, self.cam)
+
+    def release(self):
+        if self.cam is not None:
+            self.cam.release()
+
+class ReplaySource:
+    '''
+        Base class for recorded inputs. In realtime mode frames are paced at
+        the recorded fps (no catch-up: a slow consumer just lags), otherwise
+        frames are returned as fast as they can be decoded. Frames whose size
+        differs from the configured resolution are resized so they fit the
+        camera's FrameRing.
+    '''
+    def __init__(self, cam_id, path, frame_size, fps=None, realtime=True, loop=False):
+        self.cam_id = cam_id
+        self.path = path
+        self.frame_size = frame_size # (width, height)
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self.frame_count = 0
+        self.start_time = None
+
+    def _read_raw(self):
+        raise NotImplementedError
+
+    def _rewind(self):
+        raise NotImplementedError
+
+    def read(self):
+        rval, frame = self._read_raw()
+        if not rval and self.loop:
+            self._rewind()
+            rval, frame = self._read_raw()
+        if not rval:
+            return False, None
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            frame = cv2.resize(frame, self.frame_size)
+        if self.realtime and self.fps:
+            if self.start_time is None:
+                self.start_time = time.perf_counter()
+            delay = self.start_time + self.frame_count / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.frame_count = self.frame_count + 1
+        return True, frame
+
+    def print_informations(self):
+        print("=============" + "replay " + str(self.cam_id) + "=============")
+        print("Source :", self.path)
+        print("FPS :", self.fps, "(realtime)" if self.realtime else "(as fast as possible)")
+        print("Frame size :", self.frame_size[0], self.frame_size[1])
+
+    def release(self):
+        pass
+
+class VideoFileSource(ReplaySource):
+    '''Replays a video file, e.g. the .avi files written by Recorder.'''
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            return False
+        if self.fps is None:
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or None
+        return True
+
+    def _read_raw(self):
+        return self.cap.read()
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self.cap.release()
+
+class ImageSequenceSource(ReplaySource):
+    '''Replays a folder of images such as the ones tools/video_to_images.py writes.'''
+    def open(self):
+        self.image_fns = []
+        for extension in IMAGE_EXTENSIONS:
+            self.image_fns.extend(glob.glob(os.path.join(self.path, extension)))
+        self.image_fns = sorted(self.image_fns)
+        self.index = 0
+        return len(self.image_fns) > 0
+
+    def _read_raw(self):
+        if self.index >= len(self.image_fns):
+            return False, None
+        frame = cv2.imread(self.image_fns[self.index])
+        self.index = self.index + 1
+        return frame is not None, frame
+
+    def _rewind(self):
+        self.index = 0
+
+class RecordingSource(ReplaySource):
+    '''Replays one camera of an indexed recording directory written with record_format 'chunked'.'''
+    def open(self):
+        self.recording = Recording(self.path)
+        if self.cam_id not in self.recording.camera_ids:
+            return False
+        if self.fps is None:
+            self.fps = self.recording.fps
+        self.row = 0
+        return len(self.recording.index[self.cam_id]) > 0
+
+    def _read_raw(self):
+        if self.row >= len(self.recording.index[self.cam_id]):
+            return False, None
+        frame = self.recording.read(self.cam_id, self.row)
+        self.row = self.row + 1
+        return frame is not None, frame
+
+    def _rewind(self):
+        self.row = 0
+
+    def release(self):
+        self.recording.close()
+
+def open_capture_source(cam_id, config):
+    '''
+        Build the capture source of a camera from the config:
+            'replay': {cam_id: path to a video file, an image folder or a recording directory}
+            'replay_realtime': pace at the recorded fps (default True)
+            'replay_loop': restart at the end of the input (default False)
+            'replay_fps': fps of image folders / override of the file fps
+        Cameras without a replay entry use the live camera.
+    '''
+    replay = config.get('replay') or {}
+    path = replay.get(cam_id, replay.get(str(cam_id)))
+    if path is None:
+        return CameraSource(cam_id, config)
+
+    frameWidth, frameHeight, fps = decode_frame_size_rate(config['resolution_fps_setting'])
+    if is_recording(path):
+        source_class = RecordingSource
+    else:
+        source_class = ImageSequenceSource if os.path.isdir(path) else VideoFileSource
+    return source_class(
+        cam_id, path, (frameWidth, frameHeight),
+        fps = config.get('replay_fps', fps if source_class is ImageSequenceSource else None),
+        realtime = config.get('replay_realtime', True),
+        loop = config.get('replay_loop', False)
+    )
@@ -0,0 +1,150 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+class SkeletonFilter:
+    '''
+        Constant-velocity Kalman filter over every joint of every tracked
+        person at once, for the (people, J, 4) output of the triangulation.
+
+        Each joint coordinate is a (position, velocity) state driven by
+        white-noise acceleration (process_noise, units^2/s^3); the three
+        axes of a joint share one 2x2 covariance, so the whole filter is a
+        handful of elementwise operations on (max_people, J) arrays.
+        Measurements are weighted by confidence (measurement_noise / c).
+
+        Persons are matched to tracks by mean joint distance (Hungarian,
+        gated by max_match_distance). A joint below min_confidence, or a
+        person missing from a frame, keeps being predicted for up to
+        max_gap seconds, with its confidence fading to zero, before it is
+        dropped. predict(lead) extrapolates the filtered state to compensate
+        the pipeline latency.
+    '''
+    def __init__(self, max_people=4, num_joints=25, process_noise=2e6, measurement_noise=100.0,
+            min_confidence=0.15, max_gap=0.25, max_match_distance=500.0, initial_velocity_variance=1e6):
+        self.max_people = max_people
+        self.num_joints = num_joints
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.min_confidence = min_confidence
+        self.max_gap = max_gap
+        self.max_match_distance = max_match_distance
+        self.initial_velocity_variance = initial_velocity_variance
+
+        shape = (max_people, num_joints)
+        self.position = np.zeros(shape + (3,))
+        self.velocity = np.zeros(shape + (3,))
+        self.P00 = np.zeros(shape)
+        self.P01 = np.zeros(shape)
+        self.P11 = np.zeros(shape)
+        self.confidence = np.zeros(shape)
+        self.last_seen = np.full(shape, -np.inf) # time of the last measurement per joint
+        self.time = 0.0 # time of the filtered state
+
+    @property
+    def alive(self):
+        '''(max_people, J) joints measured within max_gap of the filter time.'''
+        return self.time - self.last_seen <= self.max_gap
+
+    def reset(self):
+        self.last_seen[:] = -np.inf
+
+    def update(self, pose_3d, timestamp):
+        '''
+            Advance the filter to timestamp (capture time of pose_3d) and
+            fuse the measured persons (P, J, 4) of x, y, z, confidence.
+            Read the result with output() or predict().
+        '''
+        pose_3d = np.asarray(pose_3d, dtype=np.float64).reshape((-1, self.num_joints, 4))
+        self._predict(timestamp - self.time)
+        self.time = timestamp
+        alive = self.alive
+
+        measured = np.zeros((self.max_people, self.num_joints, 4))
+        tracks, persons = self._match(pose_3d, alive)
+        measured[tracks] = pose_3d[persons]
+        confidence = measured[..., 3]
+        valid = confidence >= self.min_confidence
+        z = measured[..., :3]
+
+        # Kalman update of the joints that were already tracked
+        r = self.measurement_noise / np.maximum(confidence, 1e-3)
+        gain = (valid & alive) / (self.P00 + r)
+        K0 = gain * self.P00
+        K1 = gain * self.P01
+        innovation = z - self.position
+        self.position += K0[..., None] * innovation
+        self.velocity += K1[..., None] * innovation
+        self.P11 -= K1 * self.P01
+        self.P01 *= 1 - K0
+        self.P00 *= 1 - K0
+
+        restart = valid & ~alive
+        if restart.any():
+            # (re)start the joints that were not tracked
+            self.position[restart] = z[restart]
+            self.velocity[restart] = 0
+            self.P00[restart] = r[restart]
+            self.P01[restart] = 0
+            self.P11[restart] = self.initial_velocity_variance
+
+        np.copyto(self.confidence, confidence, where=valid)
+        np.copyto(self.last_seen, timestamp, where=valid)
+
+    def predict(self, lead):
+        '''Filtered poses extrapolated lead seconds ahead of the filter time, see output().'''
+        return self.output(lead)
+
+    def output(self, lead=0.0):
+        '''
+            (P, J, 4) of x, y, z, confidence for the tracks with any live
+            joint, in track order. Joints in a gap fade linearly over
+            max_gap, dropped joints have zero confidence and position.
+        '''
+        # 1 for a joint measured now, 0 once it is max_gap old (and beyond)
+        fade = np.maximum(1 - (self.time - self.last_seen) / self.max_gap, 0.0)
+        pose_3d = np.empty((self.max_people, self.num_joints, 4), dtype=np.float32)
+        pose_3d[..., :3] = self.position + lead * self.velocity if lead else self.position
+        pose_3d[..., :3] *= (fade > 0)[..., None]
+        pose_3d[..., 3] = fade * self.confidence
+        return pose_3d[(fade > 0).any(axis=-1)]
+
+    def _predict(self, dt):
+        if dt <= 0:
+            return
+        q = self.process_noise
+        self.position += self.velocity * dt
+        self.P00 += dt * (2 * self.P01 + dt * self.P11) + q * dt ** 3 / 3
+        self.P01 += dt * self.P11 + q * dt ** 2 / 2
+        self.P11 += q * dt
+
+    def _match(self, pose_3d, alive):
+        '''Track slot of every measured person, returns (tracks, persons) index arrays.'''
+        num_persons = len(pose_3d)
+        if num_persons == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        valid = pose_3d[..., 3] >= self.min_confidence
+        track_alive = alive.any(axis=-1)
+        live = np.flatnonzero(track_alive)
+        tracks = []
+        persons = []
+        if len(live):
+            # mean distance over the joints alive in the track and measured in the person: (tracks, persons)
+            shared = alive[live, None, :] & valid[None, :, :]
+            difference = self.position[live, None] - pose_3d[None, ..., :3]
+            distance = np.sqrt(np.einsum('tpjk,tpjk->tpj', difference, difference))
+            count = shared.sum(axis=-1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cost = (distance * shared).sum(axis=-1) / count
+            gated = ~(cost <= self.max_match_distance) # also catches nan (nothing shared)
+            rows, cols = linear_sum_assignment(np.where(gated, 1e12, cost))
+            matched = ~gated[rows, cols]
+            tracks = list(live[rows[matched]])
+            persons = list(cols[matched])
+        if len(persons) < num_persons:
+            # unmatched persons take the free track slots, the most confident first
+            free = list(np.flatnonzero(~track_alive))
+            for person in np.argsort(-pose_3d[..., 3].sum(axis=-1), kind='stable'):
+                if person not in persons and free and valid[person].any():
+                    tracks.append(free.pop(0))
+                    persons.append(person)
+        return np.array(tracks, dtype=int), np.array(persons, dtype=int)
@@ -0,0 +1,332 @@
+import ctypes
+import numpy as np
+from multiprocessing import RawArray, Lock, Semaphore
+from utils import capture_clock
+
+class FrameNotifier:
+    '''
+        Wait/notify for frame streams shared by all processes.
+
+        Each subscriber owns one semaphore and an interest row over the
+        streams. Publishing a frame releases the semaphore of every subscriber
+        interested in that stream (at most once until it wakes up), so idle
+        consumers sleep in the kernel and one consumer can wait on several
+        cameras at once. Stream names follow the process names, e.g.
+        "CameraReader 0". Must be created before the processes are started.
+    '''
+    def __init__(self, stream_names, max_subscribers=16):
+        self.stream_names = list(stream_names)
+        self.max_subscribers = max_subscribers
+        self._stream_index = {name: i for i, name in enumerate(self.stream_names)}
+        self._semaphores = [Semaphore(0) for _ in range(max_subscribers)]
+        self._lock = Lock()
+        self._used = RawArray(ctypes.c_uint8, max_subscribers)
+        self._pending = RawArray(ctypes.c_uint8, max_subscribers)
+        self._interest = RawArray(ctypes.c_uint8, len(self.stream_names) * max_subscribers)
+        self._attach()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('_pending_np', '_interest_np'):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def _attach(self):
+        self._pending_np = np.frombuffer(self._pending, dtype=np.uint8)
+        self._interest_np = np.frombuffer(self._interest, dtype=np.uint8).reshape((len(self.stream_names), self.max_subscribers))
+
+    def notify(self, stream):
+        interested = self._interest_np[self._stream_index[stream]]
+        for slot in np.flatnonzero(interested & (self._pending_np == 0)):
+            self._pending_np[slot] = 1
+            self._semaphores[slot].release()
+
+    def subscribe(self, streams):
+        with self._lock:
+            for slot in range(self.max_subscribers):
+                if not self._used[slot]:
+                    break
+            else:
+                raise RuntimeError(f"FrameNotifier: all {self.max_subscribers} subscriber slots are in use")
+            self._used[slot] = 1
+            self._pending_np[slot] = 0
+            while self._semaphores[slot].acquire(block=False):
+                pass # drop wake-ups left over by the previous owner
+            for stream in streams:
+                self._interest_np[self._stream_index[stream], slot] = 1
+        return FrameSubscription(self, slot)
+
+    def _unsubscribe(self, slot):
+        with self._lock:
+            self._interest_np[:, slot] = 0
+            self._used[slot] = 0
+
+class FrameSubscription:
+    '''
+        Handle returned by FrameNotifier.subscribe. Check the rings first and
+        only wait when there is nothing new; a frame published in between
+        still wakes the waiter because the semaphore keeps the release.
+    '''
+    def __init__(self, notifier, slot):
+        self.notifier = notifier
+        self.slot = slot
+
+    def wait(self, timeout=None):
+        '''Block until any subscribed stream publishes. Returns False on timeout.'''
+        woken = self.notifier._semaphores[self.slot].acquire(timeout=timeout)
+        self.notifier._pending_np[self.slot] = 0
+        return woken
+
+    def close(self):
+        if self.slot is not None:
+            self.notifier._unsubscribe(self.slot)
+            self.slot = None
+
+def subscribe_frames(rings):
+    '''Subscribe to several FrameRings that publish through the same notifier.'''
+    rings = list(rings)
+    return rings[0].notifier.subscribe([ring.stream for ring in rings])
+
+class FrameRing:
+    '''
+        Single-writer / multi-reader ring of N slots in shared memory.
+
+        Every slot is guarded by a seqlock counter: the writer makes it odd
+        before touching the pixels and even again once the frame is complete,
+        so the writer never waits for readers. Readers pick the latest
+        published slot and check that its counter did not move while they
+        were using it; a moved counter means the slot was recycled and the
+        read is retried (or reported as stale for zero-copy reads).
+    '''
+    def __init__(self, shape, dtype=np.uint8, num_slots=3, notifier=None, stream=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.num_slots = num_slots
+        self.slot_size = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._data = RawArray(ctypes.c_uint8, self.slot_size * num_slots)
+        # [0]: write sequence of the latest complete slot (-1 before the first frame)
+        self._header = RawArray(ctypes.c_int64, 1)
+        self._header[0] = -1
+        self._seq = RawArray(ctypes.c_int64, num_slots)
+        self._frame_ids = RawArray(ctypes.c_int64, num_slots)
+        self._timestamps = RawArray(ctypes.c_double, num_slots)
+        # capture_clock() time of the camera capture the slot derives from
+        self._capture_times = RawArray(ctypes.c_double, num_slots)
+        self._write_seq = 0
+        self.notifier = notifier
+        self.stream = stream
+        self._attach()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('_slots', '_header_np', '_seq_np', '_frame_ids_np', '_timestamps_np', '_capture_times_np'):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def _attach(self):
+        self._slots = np.frombuffer(self._data, dtype=self.dtype).reshape((self.num_slots,) + self.shape)
+        self._header_np = np.frombuffer(self._header, dtype=np.int64)
+        self._seq_np = np.frombuffer(self._seq, dtype=np.int64)
+        self._frame_ids_np = np.frombuffer(self._frame_ids, dtype=np.int64)
+        self._timestamps_np = np.frombuffer(self._timestamps, dtype=np.float64)
+        self._capture_times_np = np.frombuffer(self._capture_times, dtype=np.float64)
+
+    # ---------------- writer side ----------------
+    def begin_write(self):
+        '''Return the slot array the next frame should be written into.'''
+        slot = self._write_seq % self.num_slots
+        self._seq_np[slot] += 1 # odd: slot is being written
+        return self._slots[slot]
+
+    def end_write(self, frame_id, timestamp=None, capture_time=None):
+        '''
+            Publish the slot. timestamp is the capture_clock() time of the
+            capture the data comes from (now if None), so derived data such as
+            2D poses carry the timestamp of their source frame. capture_time
+            is that capture time when timestamp is something else, e.g. the
+            predicted time of a filtered 3D pose (default: timestamp).
+        '''
+        slot = self._write_seq % self.num_slots
+        self._frame_ids_np[slot] = frame_id
+        self._timestamps_np[slot] = capture_clock() if timestamp is None else timestamp
+        self._capture_times_np[slot] = self._timestamps_np[slot] if capture_time is None else capture_time
+        self._seq_np[slot] += 1 # even: slot is complete
+        self._header_np[0] = self._write_seq
+        self._write_seq += 1
+        if self.notifier is not None:
+            self.notifier.notify(self.stream)
+
+    def write(self, frame, frame_id, timestamp=None, capture_time=None):
+        self.begin_write()[:] = frame
+        self.end_write(frame_id, timestamp, capture_time)
+
+    # ---------------- reader side ----------------
+    def subscribe(self):
+        return self.notifier.subscribe([self.stream])
+
+    def write_count(self):
+        '''Number of frames published so far.'''
+        return int(self._header_np[0]) + 1
+
+    def latest_id(self):
+        '''Frame id of the latest complete frame, -1 if nothing was written yet.'''
+        return self.write_position()[1]
+
+    def write_position(self):
+        '''(write_count(), latest_id()) from a single read of the header, so the two agree.'''
+        write_seq = int(self._header_np[0])
+        if write_seq < 0:
+            return 0, -1
+        return write_seq + 1, int(self._frame_ids_np[write_seq % self.num_slots])
+
+    def capture_time(self, frame_id):
+        '''Capture time of frame_id while it is still in the ring, None once it was recycled.'''
+        for slot in range(self.num_slots):
+            if self._frame_ids_np[slot] == frame_id:
+                capture_time = float(self._capture_times_np[slot])
+                if self._frame_ids_np[slot] == frame_id:
+                    return capture_time
+        return None
+
+    def peek(self):
+        '''
+            Zero-copy access to the latest complete frame.
+            Returns (frame_id, timestamp, view, token) or None. The view stays valid until
+            the writer recycles the slot; call is_intact(token) after using it.
+        '''
+        while True:
+            write_seq = self._header_np[0]
+            if write_seq < 0:
+                return None
+            slot = write_seq % self.num_slots
+            seq = self._seq_np[slot]
+            if seq & 1:
+                # the writer lapped us and is refilling this slot
+                continue
+            frame_id = self._frame_ids_np[slot]
+            timestamp = self._timestamps_np[slot]
+            if self._seq_np[slot] != seq:
+                continue
+            return int(frame_id), float(timestamp), self._slots[slot], (slot, int(seq))
+
+    def is_intact(self, token):
+        slot, seq = token
+        return self._seq_np[slot] == seq
+
+    def read(self, out=None):
+        '''
+            Copy the latest complete frame into out (allocated if None).
+            Returns (frame_id, timestamp, out), frame_id is -1 if nothing was written yet.
+        '''
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        while True:
+            peeked = self.peek()
+            if peeked is None:
+                return -1, 0.0, out
+            frame_id, timestamp, view, token = peeked
+            out[:] = view
+            if self.is_intact(token):
+                return frame_id, timestamp, out
+
+    def _next_slot(self, prev_id):
+        '''(slot, seq, frame_id) of the oldest complete slot newer than prev_id, or None.'''
+        seqs = self._seq_np.copy()
+        frame_ids = self._frame_ids_np.copy()
+        candidates = [slot for slot in range(self.num_slots) if not seqs[slot] & 1 and seqs[slot] > 0 and frame_ids[slot] > prev_id]
+        if not candidates:
+            return None
+        slot = min(candidates, key=lambda slot: frame_ids[slot])
+        return slot, int(seqs[slot]), int(frame_ids[slot])
+
+    def read_next(self, prev_id, out=None):
+        '''
+            Copy the oldest complete frame newer than prev_id into out, so a
+            consumer that falls behind by less than num_slots frames still
+            gets every frame in order. Returns (frame_id, timestamp, out),
+            frame_id is -1 if there is no newer frame.
+        '''
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        while True:
+            found = self._next_slot(prev_id)
+            if found is None:
+                return -1, 0.0, out
+            slot, seq, frame_id = found
+            timestamp = self._timestamps_np[slot]
+            out[:] = self._slots[slot]
+            if self._seq_np[slot] == seq and self._frame_ids_np[slot] == frame_id:
+                return frame_id, float(timestamp), out
+
+class PoseRing(FrameRing):
+    '''
+        FrameRing of multi-person keypoints: every slot holds up to
+        max_people skeletons (max_people, num_keypoints, channels) plus the
+        number of valid ones, published under the same seqlock as the data.
+        Unused rows are zeroed, so plain read() users see zero confidences.
+    '''
+    def __init__(self, max_people, num_keypoints=25, channels=3, num_slots=3, notifier=None, stream=None):
+        super().__init__((max_people, num_keypoints, channels), np.float32, num_slots, notifier, stream)
+        self.max_people = max_people
+        self._counts = RawArray(ctypes.c_int32, num_slots)
+        self._counts_np = np.frombuffer(self._counts, dtype=np.int32)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['_counts_np']
+        return state
+
+    def _attach(self):
+        super()._attach()
+        if hasattr(self, '_counts'):
+            self._counts_np = np.frombuffer(self._counts, dtype=np.int32)
+
+    def write_people(self, people, frame_id, timestamp=None, capture_time=None):
+        '''Publish the skeletons in people (n, num_keypoints, channels), the first max_people are kept.'''
+        count = min(len(people), self.max_people)
+        slot = self.begin_write()
+        slot[:count] = people[:count]
+        slot[count:] = 0
+        self._counts_np[self._write_seq % self.num_slots] = count
+        self.end_write(frame_id, timestamp, capture_time)
+
+    def read_people(self, out=None):
+        '''
+            Copy the latest complete slot into out (allocated if None).
+            Returns (frame_id, timestamp, people) with people = out[:count],
+            frame_id is -1 (and people empty) if nothing was written yet.
+        '''
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        while True:
+            peeked = self.peek()
+            if peeked is None:
+                return -1, 0.0, out[:0]
+            frame_id, timestamp, view, token = peeked
+            count = int(self._counts_np[token[0]])
+            out[:count] = view[:count]
+            if self.is_intact(token):
+                return frame_id, timestamp, out[:count]
+
+    def read_people_next(self, prev_id, out=None):
+        '''read_people() of the oldest complete slot newer than prev_id, see FrameRing.read_next.'''
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        while True:
+            found = self._next_slot(prev_id)
+            if found is None:
+                return -1, 0.0, out[:0]
+            slot, seq, frame_id = found
+            timestamp = self._timestamps_np[slot]
+            count = int(self._counts_np[slot])
+            out[:count] = self._slots[slot][:count]
+            if self._seq_np[slot] == seq and self._frame_ids_np[slot] == frame_id:
+                return frame_id, float(timestamp), out[:count]
@@ -0,0 +1,75 @@
+from collections import deque, namedtuple
+
+FrameBundle = namedtuple('FrameBundle', ['frame_ids', 'timestamps', 'views', 'timestamp', 'skew'])
+
+class FrameSynchronizer:
+    '''
+        Groups per-camera items (2D poses, frames...) into multi-view bundles
+        whose capture timestamps lie within `tolerance` seconds.
+
+        Items are pushed in capture order per camera. A bundle is emitted as
+        soon as every camera has a pending item and the oldest pending items
+        are within tolerance; items that are too old to ever be matched (or
+        that overflow `max_pending` while another camera stalls) are dropped
+        and counted.
+    '''
+    def __init__(self, camera_ids, tolerance=0.008, max_pending=8):
+        self.camera_ids = list(camera_ids)
+        self.tolerance = tolerance
+        self.max_pending = max_pending
+        self.pending = {cam_id: deque() for cam_id in self.camera_ids}
+        self.bundles = 0
+        self.dropped = {cam_id: 0 for cam_id in self.camera_ids}
+        self.skew_sum = 0.0
+        self.skew_max = 0.0
+
+    def push(self, cam_id, frame_id, timestamp, data):
+        '''Add one item, returns the list of bundles completed by it (usually 0 or 1).'''
+        queue = self.pending[cam_id]
+        if queue and frame_id <= queue[-1][0]:
+            # duplicate or out of order item
+            self.dropped[cam_id] += 1
+            return []
+        queue.append((frame_id, timestamp, data))
+        if len(queue) > self.max_pending:
+            queue.popleft()
+            self.dropped[cam_id] += 1
+        return self._match()
+
+    def _match(self):
+        bundles = []
+        while all(self.pending.values()):
+            newest_head = max(queue[0][1] for queue in self.pending.values())
+            dropped_any = False
+            for cam_id, queue in self.pending.items():
+                # nothing pending on the other cameras is older than newest_head,
+                # so an item older than newest_head - tolerance can never be matched
+                while queue and queue[0][1] < newest_head - self.tolerance:
+                    queue.popleft()
+                    self.dropped[cam_id] += 1
+                    dropped_any = True
+            if dropped_any:
+                continue
+
+            heads = {cam_id: queue.popleft() for cam_id, queue in self.pending.items()}
+            timestamps = {cam_id: head[1] for cam_id, head in heads.items()}
+            skew = newest_head - min(timestamps.values())
+            self.bundles += 1
+            self.skew_sum += skew
+            self.skew_max = max(self.skew_max, skew)
+            bundles.append(FrameBundle(
+                frame_ids = {cam_id: head[0] for cam_id, head in heads.items()},
+                timestamps = timestamps,
+                views = {cam_id: head[2] for cam_id, head in heads.items()},
+                timestamp = min(timestamps.values()),
+                skew = skew
+            ))
+        return bundles
+
+    def stats(self):
+        return {
+            'bundles': self.bundles,
+            'dropped': dict(self.dropped),
+            'mean_skew': self.skew_sum / self.bundles if self.bundles else 0.0,
+            'max_skew': self.skew_max,
+        }
@@ -0,0 +1,100 @@
+import time
+
+# OpenPose net_resolution presets, best quality first, all about 16:9 like the cameras
+DEFAULT_QUALITY_TIERS = ['656x368', '496x272', '368x208', '256x144', '192x112']
+
+class QualityGovernor:
+    '''
+        Picks the 2D inference quality that holds a latency budget.
+
+        Quality levels are the net_resolution tiers (best first) followed by
+        frame skipping at the lowest tier: level len(tiers) - 1 + k runs the
+        lowest tier on every (k + 1)-th frame, up to max_skip. observe() is
+        fed after every inference with the capture -> result latency and
+        the inference time; their moving averages drive the level:
+          - degrade when the latency exceeds latency_budget, or inference
+            cannot keep target_fps, for degrade_after consecutive frames
+          - upgrade when both stay below upgrade_margin of their limits for
+            upgrade_after consecutive frames
+        and no change is made within `cooldown` seconds of the previous one,
+        so the setting does not flap around a threshold.
+    '''
+    def __init__(self, tiers=DEFAULT_QUALITY_TIERS, initial_tier=None, max_skip=2, target_fps=30, latency_budget=0.05,
+            smoothing=0.1, degrade_after=15, upgrade_after=90, upgrade_margin=0.7, cooldown=2.0):
+        self.tiers = list(tiers)
+        self.max_skip = max_skip
+        self.frame_budget = 1.0 / target_fps
+        self.latency_budget = latency_budget
+        self.smoothing = smoothing
+        self.degrade_after = degrade_after
+        self.upgrade_after = upgrade_after
+        self.upgrade_margin = upgrade_margin
+        self.cooldown = cooldown
+        self.level = self.tiers.index(initial_tier) if initial_tier in self.tiers else len(self.tiers) - 1
+        self.latency = None
+        self.inference = None
+        self.over = 0
+        self.under = 0
+        self.changes = 0
+        self.last_change = -float('inf')
+
+    @property
+    def num_levels(self):
+        return len(self.tiers) + self.max_skip
+
+    @property
+    def net_resolution(self):
+        return self.tiers[min(self.level, len(self.tiers) - 1)]
+
+    @property
+    def skip(self):
+        '''Frames skipped between two inferences.'''
+        return max(0, self.level - len(self.tiers) + 1)
+
+    def observe(self, latency, inference, now=None):
+        '''Add one measurement (seconds), returns True when the level changed.'''
+        now = time.monotonic() if now is None else now
+        if self.latency is None:
+            self.latency, self.inference = latency, inference
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+            self.inference += self.smoothing * (inference - self.inference)
+
+        if self.latency > self.latency_budget or self.inference > self.frame_budget:
+            self.over += 1
+            self.under = 0
+        elif self.latency < self.upgrade_margin * self.latency_budget and self.inference < self.upgrade_margin * self.frame_budget:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = self.under = 0
+
+        if now - self.last_change < self.cooldown:
+            return False
+        if self.over >= self.degrade_after and self.level < self.num_levels - 1:
+            return self._set_level(self.level + 1, now)
+        if self.under >= self.upgrade_after and self.level > 0:
+            return self._set_level(self.level - 1, now)
+        return False
+
+    def _set_level(self, level, now):
+        self.level = level
+        self.last_change = now
+        self.changes += 1
+        self.over = self.under = 0
+        # measurements of the old level say nothing about the new one
+        self.latency = self.inference = None
+        return True
+
+    def hold(self, now=None):
+        '''
+            Restart the cooldown and the measurements, e.g. after a slow
+            backend reconfiguration: the stall it caused is not a measurement
+            of the new level.
+        '''
+        self.last_change = time.monotonic() if now is None else now
+        self.over = self.under = 0
+        self.latency = self.inference = None
+
+    def describe(self):
+        return f"{self.net_resolution}" + (f" skip {self.skip}" if self.skip else "")
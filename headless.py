@@ -0,0 +1,161 @@
+'''
+    Headless runner: builds the same processes as the panel buttons from a
+    JSON run file, without a window, e.g. on machines without a display.
+
+    {
+        "cameras": [0, 1],
+        "stages": ["CameraReader", "BatchPoseEstimator", "PoseEstimator3D", "Recorder", "KeypointRecorder"],
+        "capture": {"resolution_fps_setting": "1280x720@60", "exposure": -7, "gain": 200},
+        "hpe": {"pose_backend": "openpose", "openpose_path": "...", "governor": true},
+        "3d": {"filter_3d": true},
+        "recorder": {"record_format": "chunked"},
+        "outputs": {"record_path": "./outputs", "summary_file": "outputs/headless_summary.jsonl"},
+        "metrics": {"metrics_port": 9108, "metrics_file": "outputs/metrics.csv"},
+        "summary_interval": 10,
+        "duration": 0
+    }
+
+    The sections are merged into the flat config of main.py (same keys;
+    "api" may be named, e.g. "CAP_DSHOW"). Stages are started after their
+    inputs (pipeline.STAGE_INPUTS); SIGTERM or Ctrl+C, or the end of
+    "duration" seconds (0: run until stopped), stops them in reverse order.
+    Every summary_interval seconds the throughput, drops and latency of
+    every running process, and the p50 / p95 / p99 of the latency
+    histograms (latency.py) of the interval, are printed and appended to
+    summary_file as one JSON line, the final line holding the whole run.
+    With a "metrics" section the Prometheus endpoint and / or the rolling
+    metrics file of metrics.py run alongside.
+
+    python headless.py run.json
+'''
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import cv2
+from pipeline import Pipeline, STAGES
+from metrics import create_metrics_exporter
+
+from singleton_lock import tprint
+
+CONFIG_SECTIONS = ["capture", "hpe", "3d", "recorder", "calibration", "outputs", "metrics", "config"]
+
+def load_run(fn):
+    with open(fn) as f:
+        run = json.load(f)
+    config = {
+        'api': cv2.CAP_MSMF if sys.platform == 'win32' else cv2.CAP_ANY,
+        # nothing to show it on
+        'show_3d': False,
+    }
+    for section in CONFIG_SECTIONS:
+        config.update(run.get(section, {}))
+    if isinstance(config['api'], str):
+        config['api'] = getattr(cv2, config['api'])
+    config.setdefault('resolution_fps_setting', "1280x720@60")
+    return run, config
+
+class RunSummary:
+    '''
+        Interval and whole-run throughput from the `frames` counters of the
+        status table (frame_id means something else in every process).
+    '''
+    def __init__(self, pipeline, summary_file=None):
+        self.pipeline = pipeline
+        self.summary_file = summary_file
+        self.start_time = time.time()
+        self.first = {}
+        self.prev = {}
+        self.latency_prev = pipeline.latency_table.snapshot()
+
+    def rows(self):
+        return {name: row for name, row in self.pipeline.summary().items() if row['running'] or row['error']}
+
+    def report(self, final=False):
+        current_time = time.time()
+        rows = self.rows()
+        for name, row in rows.items():
+            # counters start at 0 when a process is reset
+            self.first.setdefault(name, (self.start_time, 0))
+            if final:
+                start_time, start_frame = self.first[name]
+            else:
+                start_time, start_frame = self.prev.get(name, self.first[name])
+            row['throughput'] = (row['frames'] - start_frame) / max(current_time - start_time, 1e-6)
+            self.prev[name] = (current_time, row['frames'])
+        elapsed = current_time - self.start_time
+        tprint(f"---- {'run total' if final else 'summary'} at {elapsed:.0f} s ----")
+        tprint(f"{'process':>24} {'fps':>7} {'frames/s':>9} {'frames':>8} {'dropped':>8} {'latency ms':>11} {'skew ms':>8}")
+        for name, row in rows.items():
+            state = " ERROR" if row['error'] else ""
+            tprint(f"{name:>24} {row['fps']:>7.2f} {row['throughput']:>9.2f} {row['frames']:>8} {row['dropped']:>8} "
+                   f"{row['latency'] * 1e3:>11.1f} {row['skew'] * 1e3:>8.2f}{state}")
+        latency = self.report_latency(final)
+        if self.summary_file:
+            os.makedirs(os.path.dirname(self.summary_file) or '.', exist_ok=True)
+            with open(self.summary_file, 'a') as f:
+                f.write(json.dumps({'time': current_time, 'elapsed': elapsed, 'final': final, 'processes': rows, 'latency': latency}) + "\n")
+
+    def report_latency(self, final):
+        table = self.pipeline.latency_table
+        snapshot = table.snapshot()
+        latency = table.summary(snapshot if final else snapshot - self.latency_prev)
+        self.latency_prev = snapshot
+        if latency:
+            tprint(f"{'latency':>24} {'frames':>7} {'age p50':>8} {'p95':>7} {'p99':>7} {'stage p50':>10} {'p99':>7}  (ms)")
+        for name, kinds in latency.items():
+            age = kinds.get('age')
+            stage = kinds.get('stage')
+            text = f"{name:>24} {age['count'] if age else 0:>7}"
+            text += f" {age['p50'] * 1e3:>8.1f} {age['p95'] * 1e3:>7.1f} {age['p99'] * 1e3:>7.1f}" if age else f" {'-':>8} {'-':>7} {'-':>7}"
+            text += f" {stage['p50'] * 1e3:>10.1f} {stage['p99'] * 1e3:>7.1f}" if stage else f" {'-':>10} {'-':>7}"
+            tprint(text)
+        return latency
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('run', help="run file (JSON)")
+    parser.add_argument('--duration', type=float, default=None, help="s, overrides the run file")
+    args = parser.parse_args()
+
+    run, config = load_run(args.run)
+    camera_ids = run.get('cameras', [0, 1])
+    stages = run.get('stages', ["CameraReader"])
+    duration = run.get('duration', 0) if args.duration is None else args.duration
+    interval = run.get('summary_interval', 10)
+
+    stop = []
+    def request_stop(signum, frame):
+        stop.append(signum)
+    # installed before the workers start: they inherit it, so a Ctrl+C to the
+    # process group does not interrupt them, only the halt flag stops them
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    print('\n==============Start headless run==============')
+    pipeline = Pipeline(config, camera_ids)
+    summary = RunSummary(pipeline, run.get('outputs', {}).get('summary_file'))
+    metrics = create_metrics_exporter(config, pipeline)
+    if metrics is not None:
+        metrics.start()
+    try:
+        pipeline.start_stages(stages)
+        tprint(f"Running {[stage for stage in STAGES if stage in stages]} on cameras {camera_ids}")
+        next_report = time.time() + interval
+        while not stop and not (duration and time.time() - summary.start_time >= duration):
+            time.sleep(0.2)
+            if time.time() >= next_report:
+                summary.report()
+                next_report += interval
+    finally:
+        summary.report(final=True)
+        pipeline.stop_all()
+        if metrics is not None:
+            metrics.stop()
+            tprint(f"Metrics exporter: {metrics.scrapes} scrapes, {metrics.samples} samples, {metrics.cpu_time * 1e3:.1f} ms CPU")
+        tprint(f"Stopped{' by signal ' + signal.Signals(stop[0]).name if stop else ''}")
+
+if __name__ == "__main__":
+    main()
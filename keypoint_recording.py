@@ -0,0 +1,178 @@
+import os
+import json
+import numpy as np
+
+KEYPOINTS_META_FILE = "keypoints.json"
+
+class GrowableColumn:
+    '''
+        One column of fixed-shape rows in a raw binary file "<name>.bin",
+        written through a memmap. The file is preallocated to `capacity`
+        rows and doubled (truncate + remap, no copy) when full, so appending
+        is a slice assignment into the map; trim() cuts it to the rows used.
+    '''
+    def __init__(self, fn, dtype, row_shape=(), capacity=4096):
+        self.fn = fn
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.row_size = int(np.prod(self.row_shape, dtype=np.int64)) * self.dtype.itemsize
+        self.capacity = 0
+        self._map = None
+        self.data = None
+        open(fn, 'wb').close()
+        self._resize(capacity)
+
+    def _resize(self, capacity):
+        if self._map is not None:
+            self._map.flush()
+            self._map = self.data = None
+        with open(self.fn, 'r+b') as f:
+            f.truncate(capacity * self.row_size)
+        self.capacity = capacity
+        if capacity:
+            self._map = np.memmap(self.fn, dtype=self.dtype, mode='r+', shape=(capacity,) + self.row_shape)
+            # plain ndarray view: indexing a memmap builds memmap objects, too slow per frame
+            self.data = self._map.view(np.ndarray)
+
+    def reserve(self, rows):
+        if rows > self.capacity:
+            self._resize(max(rows, 2 * self.capacity))
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def trim(self, rows):
+        self._resize(rows)
+
+class KeypointStreamWriter:
+    '''
+        Columns of one keypoint stream (a camera's 2D poses or the 3D
+        skeletons): frame_id (int64), timestamp (float64, capture_clock),
+        count (int32, valid people) and keypoints (max_people, J, C) float32.
+        append() copies into the mapped rows, nothing is allocated per frame.
+    '''
+    def __init__(self, path, name, row_shape, capacity=4096):
+        self.name = name
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        self.capacity = capacity
+        self.columns = {
+            'frame_id': GrowableColumn(os.path.join(path, f"{name}.frame_id.bin"), np.int64, (), capacity),
+            'timestamp': GrowableColumn(os.path.join(path, f"{name}.timestamp.bin"), np.float64, (), capacity),
+            'count': GrowableColumn(os.path.join(path, f"{name}.count.bin"), np.int32, (), capacity),
+            'keypoints': GrowableColumn(os.path.join(path, f"{name}.keypoints.bin"), np.float32, self.row_shape, capacity),
+        }
+
+    def append(self, frame_id, timestamp, people):
+        row = self.rows
+        if row >= self.capacity:
+            for column in self.columns.values():
+                column.reserve(row + 1)
+            self.capacity = self.columns['frame_id'].capacity
+        count = min(len(people), self.row_shape[0])
+        self.columns['frame_id'].data[row] = frame_id
+        self.columns['timestamp'].data[row] = timestamp
+        self.columns['count'].data[row] = count
+        keypoints = self.columns['keypoints'].data[row]
+        keypoints[:count] = people[:count]
+        keypoints[count:] = 0
+        self.rows = row + 1
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+
+    def close(self):
+        for column in self.columns.values():
+            column.trim(self.rows)
+
+    def describe(self):
+        return {'rows': self.rows, 'row_shape': list(self.row_shape)}
+
+class KeypointWriter:
+    '''
+        Keypoint recording directory: per stream the column files of
+        KeypointStreamWriter and "keypoints.json" with the row count and
+        shape of every stream. flush() rewrites keypoints.json, so a
+        recording cut short (crash, power loss) still loads up to the last
+        flush; rows past it are preallocated zeros and ignored.
+    '''
+    def __init__(self, path, capacity=4096):
+        self.path = path
+        self.capacity = capacity
+        os.makedirs(path, exist_ok=True)
+        self.streams = {}
+
+    def add_stream(self, name, row_shape):
+        self.streams[name] = KeypointStreamWriter(self.path, name, row_shape, self.capacity)
+        return self.streams[name]
+
+    def append(self, name, frame_id, timestamp, people):
+        self.streams[name].append(frame_id, timestamp, people)
+
+    def flush(self):
+        for stream in self.streams.values():
+            stream.flush()
+        self._write_meta()
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.close()
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {'streams': {name: stream.describe() for name, stream in self.streams.items()}}
+        with open(os.path.join(self.path, KEYPOINTS_META_FILE + '.tmp'), 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(os.path.join(self.path, KEYPOINTS_META_FILE + '.tmp'), os.path.join(self.path, KEYPOINTS_META_FILE))
+
+class KeypointRecording:
+    '''
+        Loader of a keypoint recording: every column is memory-mapped
+        read-only, so opening hours of data only reads keypoints.json.
+            streams                       stream names, e.g. "2d_0", "3d"
+            column(stream, name)          (rows, ...) memmap of a column
+            time_range(stream, t0, t1)    row slice captured in [t0, t1)
+            slice(stream, t0, t1)         dict of the columns in that range
+            people(stream, row)           keypoints of the valid people of a row
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, KEYPOINTS_META_FILE)) as f:
+            self.meta = json.load(f)
+        self.streams = list(self.meta['streams'].keys())
+        self._columns = {}
+
+    def __len__(self):
+        return max((stream['rows'] for stream in self.meta['streams'].values()), default=0)
+
+    def column(self, stream, name):
+        key = (stream, name)
+        if key not in self._columns:
+            rows = self.meta['streams'][stream]['rows']
+            if name == 'keypoints':
+                dtype, row_shape = np.float32, tuple(self.meta['streams'][stream]['row_shape'])
+            else:
+                dtype, row_shape = {'frame_id': np.int64, 'timestamp': np.float64, 'count': np.int32}[name], ()
+            if rows == 0:
+                self._columns[key] = np.zeros((0,) + row_shape, dtype=dtype)
+            else:
+                self._columns[key] = np.memmap(os.path.join(self.path, f"{stream}.{name}.bin"), dtype=dtype, mode='r', shape=(rows,) + row_shape)
+        return self._columns[key]
+
+    def time_range(self, stream, start=None, end=None):
+        timestamps = self.column(stream, 'timestamp')
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        last = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return slice(first, last)
+
+    def slice(self, stream, start=None, end=None):
+        rows = self.time_range(stream, start, end)
+        return {name: self.column(stream, name)[rows] for name in ['frame_id', 'timestamp', 'count', 'keypoints']}
+
+    def people(self, stream, row):
+        return self.column(stream, 'keypoints')[row, :self.column(stream, 'count')[row]]
+
+    def close(self):
+        self._columns = {}
@@ -0,0 +1,162 @@
+import math
+import ctypes
+import numpy as np
+from collections import deque
+from multiprocessing import RawArray
+
+# every row holds two histograms:
+#   'age'   capture -> output of the process (glass-to-glass for the displayers),
+#   'stage' time the process itself spent on the frame, input taken -> output
+LATENCY_KINDS = ['age', 'stage']
+
+# log-spaced bins, BINS_PER_OCTAVE per doubling (about 9 % wide) from
+# MIN_LATENCY up to MIN_LATENCY * 2 ** OCTAVES (26 s); bin 0 holds everything
+# below MIN_LATENCY and the last bin everything above the range
+MIN_LATENCY = 1e-4
+BINS_PER_OCTAVE = 8
+OCTAVES = 18
+NUM_BINS = BINS_PER_OCTAVE * OCTAVES + 2
+# after the bins: sum of the samples in microseconds (the sample count is the sum of the bins)
+SUM_COLUMN = NUM_BINS
+ROW_SIZE = NUM_BINS + 1
+
+_SCALE = BINS_PER_OCTAVE / math.log(2)
+
+def latency_bin(seconds):
+    if seconds < MIN_LATENCY:
+        return 0
+    return min(int(math.log(seconds / MIN_LATENCY) * _SCALE) + 1, NUM_BINS - 1)
+
+def bin_edge(index):
+    '''Lower edge (s) of bin index, 0 for the underflow bin.'''
+    if index <= 0:
+        return 0.0
+    return MIN_LATENCY * 2 ** ((index - 1) / BINS_PER_OCTAVE)
+
+def percentiles(counts, qs=(50, 95, 99)):
+    '''
+        Percentiles (s) of the histogram counts (NUM_BINS,), interpolated
+        log-linearly inside the bin, None for an empty histogram.
+    '''
+    counts = np.asarray(counts[:NUM_BINS], dtype=np.float64)
+    total = counts.sum()
+    if total <= 0:
+        return None
+    cumulative = np.cumsum(counts)
+    values = []
+    for q in qs:
+        target = q / 100 * total
+        index = min(int(np.searchsorted(cumulative, target, side='left')), NUM_BINS - 1)
+        below = cumulative[index - 1] if index > 0 else 0.0
+        fraction = (target - below) / counts[index] if counts[index] else 1.0
+        if index == 0:
+            values.append(MIN_LATENCY * fraction)
+        elif index == NUM_BINS - 1:
+            values.append(bin_edge(index))
+        else:
+            values.append(bin_edge(index) * 2 ** (fraction / BINS_PER_OCTAVE))
+    return values
+
+class LatencyRecorder:
+    '''Writer handle of one row of a LatencyTable, kept by the process that owns the row.'''
+    def __init__(self, counts):
+        # (len(LATENCY_KINDS), ROW_SIZE) view on the shared row
+        self.counts = counts
+
+    def record(self, kind, seconds):
+        row = self.counts[kind]
+        row[latency_bin(seconds)] += 1
+        row[SUM_COLUMN] += int(seconds * 1e6)
+
+    def age(self, capture_time, now):
+        self.record(0, now - capture_time)
+
+    def stage(self, start_time, now):
+        self.record(1, now - start_time)
+
+class LatencyTable:
+    '''
+        Latency histograms in shared memory, one row per stream name (e.g.
+        "PoseEstimator 0", "CameraDisplayer 1", "Recorder 0"), with the
+        LATENCY_KINDS histograms of cumulative int64 counts. Like the
+        StatusTable every row has a single writer (the process, or the
+        encoder thread of a camera, that owns it) which only increments its
+        counters, so there is no lock; readers copy the counts and take
+        percentiles of the difference of two copies for a time window.
+    '''
+    def __init__(self, row_names):
+        self.row_names = list(row_names)
+        self._index = {name: i for i, name in enumerate(self.row_names)}
+        self._counts = RawArray(ctypes.c_int64, len(self.row_names) * len(LATENCY_KINDS) * ROW_SIZE)
+        self._attach()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_counts_np']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def _attach(self):
+        self._counts_np = np.frombuffer(self._counts, dtype=np.int64).reshape((len(self.row_names), len(LATENCY_KINDS), ROW_SIZE))
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def recorder(self, name):
+        return LatencyRecorder(self._counts_np[self._index[name]])
+
+    def reset(self, name):
+        # only while the writer of the row is not running
+        self._counts_np[self._index[name]] = 0
+
+    def snapshot(self):
+        '''Copy of all counts, (rows, kinds, ROW_SIZE).'''
+        return self._counts_np.copy()
+
+    def summary(self, counts=None, qs=(50, 95, 99)):
+        '''{row name: {kind: {'count', 'mean', 'p50', ...}}} (s) of the rows with samples, of counts or since start.'''
+        counts = self.snapshot() if counts is None else counts
+        rows = {}
+        for name, i in self._index.items():
+            kinds = {}
+            for k, kind in enumerate(LATENCY_KINDS):
+                count = int(counts[i, k, :NUM_BINS].sum())
+                if count == 0:
+                    continue
+                kinds[kind] = {'count': count, 'mean': counts[i, k, SUM_COLUMN] / count * 1e-6}
+                kinds[kind].update({f"p{q:g}": value for q, value in zip(qs, percentiles(counts[i, k], qs))})
+            if kinds:
+                rows[name] = kinds
+        return rows
+
+class LatencyWindow:
+    '''Percentiles over the last `length` calls of update(), from the difference of the first and last snapshot.'''
+    def __init__(self, table, length=10):
+        self.table = table
+        self.snapshots = deque(maxlen=length + 1)
+
+    def update(self):
+        self.snapshots.append(self.table.snapshot())
+
+    def counts(self):
+        if not self.snapshots:
+            return self.table.snapshot()
+        first, last = self.snapshots[0], self.snapshots[-1]
+        # a row reset inside the window would go negative, take it from zero instead
+        reset = last[..., :NUM_BINS].sum(axis=-1, keepdims=True) < first[..., :NUM_BINS].sum(axis=-1, keepdims=True)
+        return np.where(reset, last, last - first)
+
+    def percentiles(self, name, kind='age', qs=(50, 95, 99)):
+        if name not in self.table:
+            return None
+        counts = self.counts()[self.table._index[name], LATENCY_KINDS.index(kind)]
+        return percentiles(counts, qs)
+
+def format_percentiles(values):
+    '''"p50/p95/p99 ms" text of percentiles() values.'''
+    if values is None:
+        return "-"
+    return "/".join(f"{value * 1e3:.0f}" for value in values) + " ms"
@@ -1,3 +1,4 @@
+import sys
 import cv2
 from singleton_lock import SingletonLock
 import tkinter as tk
@@ -5,15 +6,63 @@ from panel import CameraControlPanel
 
 print_lock = SingletonLock.get_lock('print')
 
+# without a display: python headless.py run.json (same config keys, see headless.py)
 def main():
     print('\n==============Start program==============')
     config = {
         # 'resolution_fps_setting': "640x480@30",
         'resolution_fps_setting': "1280x720@60",
         # 'resolution_fps_setting': "1920x1080@30",
-        'api': cv2.CAP_MSMF,
+        'api': cv2.CAP_MSMF if sys.platform == 'win32' else cv2.CAP_ANY,
         'exposure': -7,
         'gain': 200,
+        # replay recordings instead of opening the cameras (video file or image folder per camera)
+        # 'replay': {0: 'outputs/2024-09-01_10-30-06_0.avi', 1: 'outputs/2024-09-01_10-30-06_1.avi'},
+        # 'replay_realtime': True,   # False: as fast as possible, for throughput benchmarks
+        # 'replay_loop': False,
+        # 2D pose backend: 'openpose' (openpose_path / openpose_build / net_resolution) or 'stub' without GPU
+        # 'pose_backend': 'openpose',
+        # 'openpose_path': "D:/coding/pose_estimation_projects/openpose/",
+        # 2D inference on a crop around the previous pose instead of the full frame
+        # 'roi': True,
+        # 'roi_padding': 0.25,
+        # 'roi_refresh_interval': 30,
+        # adaptive 2D quality: steps through quality_tiers (then frame skipping) to hold the latency budget (s)
+        # 'governor': True,
+        # 'quality_tiers': ['656x368', '496x272', '368x208', '256x144', '192x112'],
+        # 'target_hpe_fps': 30,
+        # 'latency_budget': 0.05,
+        # 'max_frame_skip': 2,
+        # people kept per camera / in 3D, and the epipolar distance (px) for matching them across views
+        # 'max_people': 4,
+        # 'max_epipolar_distance': 20.0,
+        # 3D temporal filter (constant-velocity Kalman); predict_latency: 'auto', seconds, or 0 for none
+        # 'filter_3d': True,
+        # 'predict_latency': 'auto',
+        # max capture time difference (s) of the views triangulated together; 'auto': half the period of the slowest 2D stage
+        # 'sync_tolerance': 'auto',
+        # recordings and keypoints are written under record_path
+        # 'record_path': './outputs',
+        # recorder: frames queued per camera encoder, repeat the last frame for missing ones
+        # 'record_queue_size': 8,
+        # 'record_fill_gaps': False,
+        # 'avi', or 'chunked': indexed JPEG recording with random access (recording.py, tools/export_video.py)
+        # 'record_format': 'chunked',
+        # 2D / 3D keypoints recorded with the video as memmap columns (keypoint_recording.py)
+        # 'record_keypoints': True,
+        # calibration capture ("Photo"): keeps synchronized views with the board in every camera until the coverage targets are met
+        # 'calib_checkerboard_size': (8, 6),
+        # 'calib_check_fps': 5,
+        # 'calib_target_coverage': 0.7,
+        # 'calib_max_photos': 40,
+        # 3D viewer: opened with 3D HPE unless show_3d is False, redraws at most viewer_fps
+        # 'show_3d': False,
+        # 'viewer_fps': 15,
+        # metrics of every process: Prometheus text on http://127.0.0.1:<metrics_port>/metrics and / or
+        # a rolling metrics_file (.csv or JSON lines) sampled every metrics_interval s (metrics.py)
+        # 'metrics_port': 9108,
+        # 'metrics_file': 'outputs/metrics.csv',
+        # 'metrics_interval': 5,
     }
 
     root = tk.Tk()
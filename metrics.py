@@ -0,0 +1,234 @@
+import os
+import csv
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from latency import LatencyWindow, LATENCY_KINDS, NUM_BINS, SUM_COLUMN, percentiles
+
+from singleton_lock import tprint
+
+QUANTILES = (50, 95, 99)
+
+# status field -> (metric name, type, help)
+PROCESS_METRICS = {
+    'running': ("pipeline_process_running", "gauge", "1 while the process runs."),
+    'error': ("pipeline_process_error", "gauge", "1 if the process stopped on an exception."),
+    'frames': ("pipeline_frames_total", "counter", "Frames (poses, rows, checks) handled by the process."),
+    'dropped': ("pipeline_dropped_total", "counter", "Frames the process had to drop."),
+    'fps': ("pipeline_fps", "gauge", "Frames per second over the last 60 frames."),
+    'latency': ("pipeline_latency_seconds", "gauge", "Smoothed capture to result latency."),
+    'queue_depth': ("pipeline_queue_depth", "gauge", "Items waiting in the process' own queues."),
+    'cpu_time': ("pipeline_cpu_seconds_total", "counter", "CPU time of the process, all threads."),
+    'skew': ("pipeline_capture_skew_seconds", "gauge", "Mean multi-view capture skew of the 3D stage."),
+    'quality_tier': ("pipeline_quality_tier", "gauge", "Quality level of the 2D stage, -1 without governor."),
+}
+LATENCY_METRICS = {
+    'age': ("pipeline_frame_age_seconds", "Capture to output of the stream (glass-to-glass for the displays)."),
+    'stage': ("pipeline_stage_seconds", "Time the process spent on a frame."),
+}
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsExporter:
+    '''
+        Pipeline metrics for monitoring, read from the StatusTable and the
+        LatencyTable in the parent process: the workers only keep their
+        shared rows up to date, so the exporter costs them nothing.
+
+        port     serves GET /metrics in the Prometheus text format on host
+                 (local only by default), rendered when scraped
+        file     every interval s one sample is appended, ".csv" as rows of
+                 time, name, metric, value, otherwise JSON lines; the file
+                 is rotated at max_bytes, keeping `backups` old ones
+        window   latency quantiles are taken over the last window s (in
+                 steps of interval), _sum / _count since the start
+
+        The CPU time the exporter spends itself (sampling, rendering,
+        writing) is exported as pipeline_metrics_cpu_seconds_total.
+    '''
+    def __init__(self, status_table, latency_table, port=None, host="127.0.0.1", file=None,
+                 interval=5.0, window=60.0, max_bytes=10 << 20, backups=3):
+        self.status_table = status_table
+        self.latency_table = latency_table
+        self.port = port
+        self.host = host
+        self.file = file
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.latency_window = LatencyWindow(latency_table, length=max(int(round(window / interval)), 1))
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.server = None
+        self.threads = []
+        self.cpu_time = 0.0
+        self.scrapes = 0
+        self.samples = 0
+
+    def start(self):
+        self.latency_window.update()
+        if self.port is not None:
+            try:
+                self.server = ThreadingHTTPServer((self.host, self.port), make_handler(self))
+            except OSError as e:
+                tprint(f"Metrics: cannot serve on {self.host}:{self.port}: {e}")
+            else:
+                self.server.daemon_threads = True
+                self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+                tprint(f"Metrics on http://{self.host}:{self.server.server_address[1]}/metrics")
+        self.threads.append(threading.Thread(target=self.sample_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.file:
+            # the final counters
+            self.write_sample(self.collect())
+
+    def sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            start = time.thread_time()
+            with self.lock:
+                self.latency_window.update()
+            if self.file:
+                self.write_sample(self.collect())
+            self.samples += 1
+            self.add_cpu_time(time.thread_time() - start)
+
+    def add_cpu_time(self, seconds):
+        with self.lock:
+            self.cpu_time += seconds
+
+    # ---------------- collection ----------------
+    def collect(self):
+        '''{'time', 'processes': {name: status fields}, 'latency': {stream: {kind: {count, sum, p50...}}}}'''
+        processes = {}
+        for name in self.status_table.process_names:
+            status = self.status_table[name]
+            if status.last_update == 0:
+                # never started
+                continue
+            processes[name] = {field: getattr(status, field) for field in PROCESS_METRICS}
+        with self.lock:
+            window = self.latency_window.counts()
+        total = self.latency_table.snapshot()
+        latency = {}
+        for i, name in enumerate(self.latency_table.row_names):
+            kinds = {}
+            for k, kind in enumerate(LATENCY_KINDS):
+                count = int(total[i, k, :NUM_BINS].sum())
+                if count == 0:
+                    continue
+                kinds[kind] = {'count': count, 'sum': total[i, k, SUM_COLUMN] * 1e-6}
+                values = percentiles(window[i, k], QUANTILES)
+                kinds[kind].update({f"p{q}": value for q, value in zip(QUANTILES, values or [None] * len(QUANTILES))})
+            if kinds:
+                latency[name] = kinds
+        return {'time': time.time(), 'processes': processes, 'latency': latency}
+
+    def render(self):
+        '''Prometheus text exposition of collect().'''
+        start = time.thread_time()
+        sample = self.collect()
+        lines = []
+        for field, (metric, metric_type, help_text) in PROCESS_METRICS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for name, values in sample['processes'].items():
+                lines.append(f'{metric}{{process="{escape_label(name)}"}} {values[field]}')
+        for kind, (metric, help_text) in LATENCY_METRICS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} summary")
+            for name, kinds in sample['latency'].items():
+                if kind not in kinds:
+                    continue
+                values = kinds[kind]
+                label = f'stream="{escape_label(name)}"'
+                for q in QUANTILES:
+                    value = values[f"p{q}"]
+                    lines.append(f'{metric}{{{label},quantile="{q / 100:g}"}} {"NaN" if value is None else value}')
+                lines.append(f"{metric}_sum{{{label}}} {values['sum']}")
+                lines.append(f"{metric}_count{{{label}}} {values['count']}")
+        self.scrapes += 1
+        self.add_cpu_time(time.thread_time() - start)
+        lines.append("# HELP pipeline_metrics_cpu_seconds_total CPU time spent by the metrics exporter.")
+        lines.append("# TYPE pipeline_metrics_cpu_seconds_total counter")
+        lines.append(f"pipeline_metrics_cpu_seconds_total {self.cpu_time}")
+        lines.append("# HELP pipeline_metrics_scrapes_total Scrapes served.")
+        lines.append("# TYPE pipeline_metrics_scrapes_total counter")
+        lines.append(f"pipeline_metrics_scrapes_total {self.scrapes}")
+        return "\n".join(lines) + "\n"
+
+    # ---------------- rolling file ----------------
+    def rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.file}.{i}"):
+                os.replace(f"{self.file}.{i}", f"{self.file}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.file, f"{self.file}.1")
+        else:
+            os.remove(self.file)
+
+    def write_sample(self, sample):
+        os.makedirs(os.path.dirname(self.file) or '.', exist_ok=True)
+        if os.path.exists(self.file) and os.path.getsize(self.file) >= self.max_bytes:
+            self.rotate()
+        new_file = not os.path.exists(self.file)
+        with open(self.file, 'a', newline='') as f:
+            if not self.file.endswith(".csv"):
+                f.write(json.dumps(sample) + "\n")
+                return
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["time", "name", "metric", "value"])
+            timestamp = f"{sample['time']:.3f}"
+            for name, values in sample['processes'].items():
+                for field, value in values.items():
+                    writer.writerow([timestamp, name, field, value])
+            for name, kinds in sample['latency'].items():
+                for kind, values in kinds.items():
+                    for key, value in values.items():
+                        writer.writerow([timestamp, name, f"{kind}_{key}", "" if value is None else value])
+
+def make_handler(exporter):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = exporter.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # a scrape every few seconds would flood the console
+            pass
+    return MetricsHandler
+
+def create_metrics_exporter(config, pipeline):
+    '''MetricsExporter for config 'metrics_port' / 'metrics_file' (default off), None without either.'''
+    if config.get('metrics_port') is None and not config.get('metrics_file'):
+        return None
+    return MetricsExporter(
+        pipeline.status_table, pipeline.latency_table,
+        port = config.get('metrics_port'),
+        host = config.get('metrics_host', "127.0.0.1"),
+        file = config.get('metrics_file'),
+        interval = config.get('metrics_interval', 5.0),
+        window = config.get('metrics_window', 60.0),
+        max_bytes = config.get('metrics_file_max_bytes', 10 << 20),
+        backups = config.get('metrics_file_backups', 3)
+    )
@@ -1,18 +1,9 @@
-import os
 import time
-import numpy as np
 import tkinter as tk
-from multiprocessing import Manager, Array
-from camera_reader import CameraReader
-from camera_displayer import CameraDisplayer
-from pose_estimation_2d import PoseEstimator
-from pose_estimation_3d import PoseEstimator3D
-from recorder import Recorder, photo
-import ctypes
-
-from singleton_lock import tprint
-
-PROCTYPES = ["CameraReader", "CameraDisplayer", "PoseEstimator"]
+from pipeline import Pipeline
+from governor import DEFAULT_QUALITY_TIERS
+from latency import LatencyWindow, format_percentiles
+from metrics import create_metrics_exporter
 
 class CameraControlPanel(tk.Frame):
     def __init__(self, master=None, config=None, camera_ids=[0, 1]):
@@ -21,23 +12,22 @@ class CameraControlPanel(tk.Frame):
         self.config = config
         self.camera_ids = camera_ids
 
-        self.processes = {
-            "CameraReader": {},
-            "CameraDisplayer": {},
-            "PoseEstimator": {},
-            "Recorder": {},
-            "PoseEstimator3D": {}
-        }
+        # buffers, status table and processes, shared with the headless runner (headless.py)
+        self.pipeline = Pipeline(config, camera_ids)
+        self.processes = self.pipeline.processes
+        self.status_table = self.pipeline.status_table
+        # capture -> output percentiles over the last 10 updates (s)
+        self.latency_window = LatencyWindow(self.pipeline.latency_table, length=10)
+        # optional Prometheus endpoint / metrics file
+        self.metrics = create_metrics_exporter(config, self.pipeline)
+        if self.metrics is not None:
+            self.metrics.start()
 
         self.read_fps_labels = {}
         self.display_fps_labels = {}
         self.hpe_fps_labels = {}
-
-        self.process_manager = Manager()
-        self.shared_dict = self.process_manager.dict()
-        self.shared_dict["control signals"] = {}
-        self.original_image = {}
-        self.pose_2d = {}
+        self.latency_labels = {}
+        self.hpe_latency_labels = {}
 
         self.create_widgets()
         self.update_fps()
@@ -69,6 +59,11 @@ class CameraControlPanel(tk.Frame):
             display_fps_label = tk.Label(fps_frame, text=" Display FPS: 0")
             display_fps_label.pack(side="left")
             self.display_fps_labels[cam_id] = display_fps_label
+
+            # capture -> ring and glass-to-glass latency, p50/p95/p99
+            latency_label = tk.Label(input_panel_frame, text="Latency: -")
+            latency_label.pack()
+            self.latency_labels[cam_id] = latency_label
             
             # buttons
             button_frame = tk.Frame(input_panel_frame)
@@ -117,6 +112,10 @@ class CameraControlPanel(tk.Frame):
             hpe_fps_label = tk.Label(fps_frame, text="HPE FPS: 0")
             hpe_fps_label.pack(side="left")
             self.hpe_fps_labels[cam_id] = hpe_fps_label
+
+            hpe_latency_label = tk.Label(hpe_panel_frame, text="2D latency: -")
+            hpe_latency_label.pack()
+            self.hpe_latency_labels[cam_id] = hpe_latency_label
             
             # buttons
             button_frame = tk.Frame(hpe_panel_frame)
@@ -155,9 +154,37 @@ class CameraControlPanel(tk.Frame):
         photo_button = tk.Button(
             button_frame, 
             text = "Photo", 
-            command = self.take_photo
+            command = self.start_calibration_capture
         )
         photo_button.pack(side = "left")
+        stop_photo_button = tk.Button(
+            button_frame, 
+            text = "Stop Photo", 
+            command = self.stop_calibration_capture
+        )
+        stop_photo_button.pack(side = "left")
+        self.calibration_label = tk.Label(button_frame, text="")
+        self.calibration_label.pack(side = "left")
+        self.record_latency_label = tk.Label(record_panel_frame, text="")
+        self.record_latency_label.pack()
+
+        # one HPE worker batching all cameras
+        hpe_batch_panel_frame = tk.Frame(self)
+        hpe_batch_panel_frame.pack(pady=10)
+        button_frame = tk.Frame(hpe_batch_panel_frame)
+        button_frame.pack()
+        start_hpe_batch_button = tk.Button(
+            button_frame, 
+            text = "Start Batched HPE", 
+            command = self.start_hpe_batch
+        )
+        start_hpe_batch_button.pack(side = "left")
+        stop_hpe_batch_button = tk.Button(
+            button_frame, 
+            text = "Stop Batched HPE", 
+            command = self.stop_hpe_batch
+        )
+        stop_hpe_batch_button.pack(side = "left")
 
         # 3D HPE
         hpe_3D_panel_frame = tk.Frame(self)
@@ -176,143 +203,122 @@ class CameraControlPanel(tk.Frame):
             command = self.stop_hpe_3D
         )
         stop_hpe_3D_button.pack(side = "left")
+        start_viewer_3D_button = tk.Button(
+            button_frame, 
+            text = "Start 3D Viewer", 
+            command = self.start_viewer_3D
+        )
+        start_viewer_3D_button.pack(side = "left")
+        stop_viewer_3D_button = tk.Button(
+            button_frame, 
+            text = "Stop 3D Viewer", 
+            command = self.stop_viewer_3D
+        )
+        stop_viewer_3D_button.pack(side = "left")
+        self.latency_3D_label = tk.Label(hpe_3D_panel_frame, text="")
+        self.latency_3D_label.pack()
 
-    def start_process(self, process_class, cam_id, proc_type):
-        if cam_id not in self.processes[proc_type].keys():
-            if proc_type == "CameraReader":
-                self.original_image[cam_id] = Array(ctypes.c_uint8, 720 * 1280 * 3) # magic number should be changed
-                self.pose_2d[cam_id] = Array(ctypes.c_float, 25 * 3) # magic number should be changed
-                process = process_class(
-                    cam_id, self.config, 
-                    self.original_image[cam_id], 
-                    self.shared_dict
-                )
-            elif proc_type == "CameraDisplayer":
-                process = process_class(
-                    cam_id, self.config, 
-                    self.original_image[cam_id],
-                    self.pose_2d[cam_id],
-                    f"CameraReader {cam_id}",
-                    f"PoseEstimator {cam_id}",
-                    self.shared_dict
-                )
-            elif proc_type == "PoseEstimator":
-                process = process_class(
-                    cam_id, self.config, 
-                    self.original_image[cam_id],
-                    self.pose_2d[cam_id],
-                    f"CameraReader {cam_id}",
-                    self.shared_dict
-                )
-            elif proc_type == "PoseEstimator3D":
-                process = process_class(
-                    cam_id, self.config,
-                    self.pose_2d,
-                    self.camera_ids,
-                    self.shared_dict
-                )
-            local_control_dict = self.shared_dict["control signals"]
-            local_control_dict[f"{proc_type} {cam_id}"] = {}
-            local_control_dict[f"{proc_type} {cam_id}"]["halt"] = False
-            self.shared_dict["control signals"] = local_control_dict
-            process.start()
-            self.processes[proc_type][cam_id] = process
-            tprint(f"{proc_type} {cam_id} started!")
-
-    def stop_process(self, cam_id, proc_type):
-        if cam_id in self.processes[proc_type].keys():
-            local_control_dict = self.shared_dict["control signals"]
-            local_control_dict[f"{proc_type} {cam_id}"]["halt"] = True
-            self.shared_dict["control signals"] = local_control_dict
-            self.processes[proc_type][cam_id].join()
-            del self.processes[proc_type][cam_id]
-            if proc_type == "CameraReader":
-                del self.original_image[cam_id]
-            tprint(f"{proc_type} {cam_id} stopped!")
-        
     def start_camera(self, cam_id):
-        self.start_process(CameraReader, cam_id, 'CameraReader')
+        self.pipeline.start_camera(cam_id)
 
     def stop_camera(self, cam_id):
-        self.stop_process(cam_id, 'CameraReader')
+        self.pipeline.stop_camera(cam_id)
     
     def start_display(self, cam_id):
-        self.start_process(CameraDisplayer, cam_id, 'CameraDisplayer')
+        self.pipeline.start_display(cam_id)
 
     def stop_display(self, cam_id):
-        self.stop_process(cam_id, 'CameraDisplayer')
+        self.pipeline.stop_display(cam_id)
     
     def start_hpe(self, cam_id):
-        self.start_process(PoseEstimator, cam_id, 'PoseEstimator')
+        self.pipeline.start_hpe(cam_id)
 
     def stop_hpe(self, cam_id):
-        self.stop_process(cam_id, 'PoseEstimator')
+        self.pipeline.stop_hpe(cam_id)
     
+    def start_hpe_batch(self):
+        self.pipeline.start_hpe_batch()
+
+    def stop_hpe_batch(self):
+        self.pipeline.stop_hpe_batch()
+
     def start_hpe_3D(self):
-        self.start_process(PoseEstimator3D, 0, 'PoseEstimator3D')
+        self.pipeline.start_hpe_3D()
+        if self.config.get('show_3d', True):
+            self.start_viewer_3D()
 
     def stop_hpe_3D(self):
-        self.stop_process(0, 'PoseEstimator3D')
+        self.pipeline.stop_hpe_3D()
+
+    def start_viewer_3D(self):
+        self.pipeline.start_viewer_3D()
+
+    def stop_viewer_3D(self):
+        self.pipeline.stop_viewer_3D()
 
     def update_fps(self):
         for cam_id in self.camera_ids:
             for proc_type, labels in [('CameraReader', self.read_fps_labels), ('CameraDisplayer', self.display_fps_labels), ('PoseEstimator', self.hpe_fps_labels)]:
-                if cam_id in self.processes[proc_type]:
-                    status = self.shared_dict[f"{proc_type} {cam_id}"]
-                    labels[cam_id].config(text=f"{proc_type.split('er')[0]} FPS: {status['fps']:.2f}")
+                if cam_id in self.processes[proc_type] or (proc_type == 'PoseEstimator' and self.processes['BatchPoseEstimator']):
+                    status = self.status_table[f"{proc_type} {cam_id}"]
+                    text = f"{proc_type.split('er')[0]} FPS: {status.fps:.2f}"
+                    if proc_type == 'PoseEstimator' and status.quality_tier >= 0:
+                        # adaptive quality level and smoothed latency of the 2D stage
+                        text += f" [{self.quality_level_name(status.quality_tier)}, {status.latency * 1e3:.0f} ms]"
+                    labels[cam_id].config(text=text)
                 else:
                     labels[cam_id].config(text=f"{proc_type.split('er')[0]} FPS: invalid")
+        if 0 in self.processes["CalibrationCapture"]:
+            status = self.status_table["CalibrationCapture"]
+            state = f"{status.progress * 100:.0f}%" if status.running else "done"
+            self.calibration_label.config(text=f"Calibration: {max(status.frame_id, 0)} views, {state}")
+        self.update_latency()
         self.after(1000, self.update_fps)
 
+    def update_latency(self):
+        '''p50/p95/p99 of the capture -> output latency of every stage, over the last 10 s.'''
+        self.latency_window.update()
+        window = self.latency_window
+        for cam_id in self.camera_ids:
+            self.latency_labels[cam_id].config(
+                text=f"Latency p50/p95/p99 read: {format_percentiles(window.percentiles(f'CameraReader {cam_id}'))}"
+                     f" glass-to-glass: {format_percentiles(window.percentiles(f'CameraDisplayer {cam_id}'))}"
+            )
+            self.hpe_latency_labels[cam_id].config(
+                text=f"2D latency: {format_percentiles(window.percentiles(f'PoseEstimator {cam_id}'))}"
+            )
+        if self.processes["Recorder"]:
+            self.record_latency_label.config(text="Record latency " + ", ".join(
+                f"camera {cam_id}: {format_percentiles(window.percentiles(f'Recorder {cam_id}'))}" for cam_id in self.camera_ids
+            ))
+        if self.processes["PoseEstimator3D"] or self.processes["PoseViewer3D"]:
+            self.latency_3D_label.config(
+                text=f"3D latency: {format_percentiles(window.percentiles('PoseEstimator3D 0'))}"
+                     f" viewer glass-to-glass: {format_percentiles(window.percentiles('PoseViewer3D 0'))}"
+            )
+
+    def quality_level_name(self, level):
+        tiers = self.config.get('quality_tiers', DEFAULT_QUALITY_TIERS)
+        if level < len(tiers):
+            return tiers[level]
+        return f"{tiers[-1]} skip {level - len(tiers) + 1}"
+
     def on_closing(self):
         # Close every proc before closing the panel
-        for proc_type, proc_dict in self.processes.items():
-            for cam_id in list(proc_dict.keys()):
-                if proc_type == 'CameraReader':
-                    self.stop_camera(cam_id)
-                elif proc_type == 'CameraDisplayer':
-                    self.stop_display(cam_id)
-                elif proc_type == 'PoseEstimator':
-                    self.stop_hpe(cam_id)
-                elif proc_type == 'Recorder':
-                    self.stop_record()
+        self.pipeline.stop_all()
+        if self.metrics is not None:
+            self.metrics.stop()
         time.sleep(1)
         self.master.destroy()
 
     def start_record(self):
-        # check the environment is ready
-        for cam_id in self.camera_ids:
-            for proc_type in ["CameraReader"]:
-                if cam_id not in self.processes[proc_type].keys():
-                    tprint(f"{proc_type} {cam_id} is not ready")
-                    return
-        process = Recorder(
-            self.config, 
-            self.original_image,
-            self.shared_dict
-        )
-        local_control_dict = self.shared_dict["control signals"]
-        local_control_dict["Recorder"] = {}
-        local_control_dict["Recorder"]["halt"] = False
-        self.shared_dict["control signals"] = local_control_dict
-        process.start()
-        self.processes["Recorder"][0] = process
-        tprint(f"Recorder started!")
+        self.pipeline.start_record()
 
     def stop_record(self):
-        if 0 in self.processes["Recorder"].keys():
-            local_control_dict = self.shared_dict["control signals"]
-            local_control_dict["Recorder"]["halt"] = True
-            self.shared_dict["control signals"] = local_control_dict
-            self.processes["Recorder"][0].join()
-            del self.processes["Recorder"][0]
-            tprint(f"Recorder stopped!")
-
-    # TODO: this might not be in panel process
-    def take_photo(self):
-        try:
-            while True:
-                photo(self)
-                time.sleep(5)
-        except Exception as e:
-            print(f"Exception in take_photo : {e}")
\ No newline at end of file
+        self.pipeline.stop_record()
+
+    def start_calibration_capture(self):
+        self.pipeline.start_calibration_capture()
+
+    def stop_calibration_capture(self):
+        self.pipeline.stop_calibration_capture()
@@ -0,0 +1,371 @@
+import numpy as np
+from camera_reader import CameraReader
+from camera_displayer import CameraDisplayer
+from pose_estimation_2d import PoseEstimator, BatchPoseEstimator
+from pose_estimation_3d import PoseEstimator3D
+from pose_viewer_3d import PoseViewer3D
+from recorder import Recorder, KeypointRecorder
+from calibration_capture import CalibrationCapture
+from frame_buffer import FrameRing, PoseRing, FrameNotifier
+from status_table import StatusTable
+from latency import LatencyTable
+from utils import decode_frame_size_rate
+
+from singleton_lock import tprint
+
+PROCTYPES = ["CameraReader", "CameraDisplayer", "PoseEstimator"]
+
+# stage -> stages it reads from (any one of them for the 3D stage); STAGES is a valid start order
+STAGE_INPUTS = {
+    "CameraReader": [],
+    "CameraDisplayer": ["CameraReader"],
+    "PoseEstimator": ["CameraReader"],
+    "BatchPoseEstimator": ["CameraReader"],
+    "PoseEstimator3D": ["PoseEstimator", "BatchPoseEstimator"],
+    "PoseViewer3D": ["PoseEstimator3D"],
+    "Recorder": ["CameraReader"],
+    "KeypointRecorder": ["PoseEstimator", "BatchPoseEstimator"],
+    "CalibrationCapture": ["CameraReader"],
+}
+STAGES = list(STAGE_INPUTS.keys())
+
+class Pipeline:
+    '''
+        The shared buffers, status table and worker processes of one run,
+        used by the panel buttons and by the headless runner alike. Stages
+        (process types) are started with start_stage / start_stages, which
+        orders them after their inputs, and stop_all stops them in reverse
+        order, consumers before producers.
+    '''
+    def __init__(self, config, camera_ids=[0, 1]):
+        self.config = config
+        self.camera_ids = camera_ids
+
+        self.processes = {stage: {} for stage in STAGES}
+
+        process_names = [f"{proc_type} {cam_id}" for cam_id in self.camera_ids for proc_type in PROCTYPES]
+        process_names += ["BatchPoseEstimator 0", "PoseEstimator3D 0", "PoseViewer3D 0", "Recorder", "KeypointRecorder", "CalibrationCapture"]
+        self.status_table = StatusTable(process_names)
+        # capture -> output latency histograms, per camera where the process handles several
+        latency_names = [f"{proc_type} {cam_id}" for cam_id in self.camera_ids for proc_type in PROCTYPES + ["Recorder"]]
+        latency_names += ["PoseEstimator3D 0", "PoseViewer3D 0", "KeypointRecorder"]
+        self.latency_table = LatencyTable(latency_names)
+        self.original_image = {}
+        self.pose_2d = {}
+        self.frame_notifier = FrameNotifier(
+            [f"{proc_type} {cam_id}" for cam_id in self.camera_ids for proc_type in ["CameraReader", "PoseEstimator"]] + ["PoseEstimator3D 0"],
+            max_subscribers = self.config.get('max_frame_subscribers', 16)
+        )
+        # latest 3D skeletons (people, 25, 4): x, y, z, confidence, read by the optional viewer
+        self.pose_3d = PoseRing(
+            self.config.get('max_people', 4), channels = 4,
+            num_slots = 3,
+            notifier = self.frame_notifier,
+            stream = "PoseEstimator3D 0"
+        )
+
+    def start_process(self, process_class, cam_id, proc_type):
+        if cam_id not in self.processes[proc_type].keys():
+            if proc_type == "CameraReader":
+                frameWidth, frameHeight, _ = decode_frame_size_rate(self.config['resolution_fps_setting'])
+                self.original_image[cam_id] = FrameRing(
+                    (frameHeight, frameWidth, 3), np.uint8,
+                    num_slots = self.config.get('frame_slots', 3),
+                    notifier = self.frame_notifier,
+                    stream = f"CameraReader {cam_id}"
+                )
+                # up to max_people skeletons (25, 3): u, v, confidence per frame
+                self.pose_2d[cam_id] = PoseRing(
+                    self.config.get('max_people', 4),
+                    num_slots = 3,
+                    notifier = self.frame_notifier,
+                    stream = f"PoseEstimator {cam_id}"
+                )
+                process = process_class(
+                    cam_id, self.config,
+                    self.original_image[cam_id],
+                    self.status_table,
+                    self.latency_table
+                )
+            elif proc_type == "CameraDisplayer":
+                process = process_class(
+                    cam_id, self.config,
+                    self.original_image[cam_id],
+                    self.pose_2d[cam_id],
+                    f"CameraReader {cam_id}",
+                    f"PoseEstimator {cam_id}",
+                    self.status_table,
+                    self.latency_table
+                )
+            elif proc_type == "PoseEstimator":
+                process = process_class(
+                    cam_id, self.config,
+                    self.original_image[cam_id],
+                    self.pose_2d[cam_id],
+                    f"CameraReader {cam_id}",
+                    self.status_table,
+                    self.latency_table
+                )
+            elif proc_type == "PoseEstimator3D":
+                process = process_class(
+                    cam_id, self.config,
+                    self.pose_2d,
+                    self.pose_3d,
+                    self.camera_ids,
+                    self.status_table,
+                    self.latency_table
+                )
+            elif proc_type == "PoseViewer3D":
+                process = process_class(
+                    cam_id, self.config,
+                    self.pose_3d,
+                    self.status_table,
+                    self.latency_table
+                )
+            self.status_table.reset(f"{proc_type} {cam_id}")
+            self.latency_table.reset(f"{proc_type} {cam_id}")
+            process.start()
+            self.processes[proc_type][cam_id] = process
+            tprint(f"{proc_type} {cam_id} started!")
+        return True
+
+    def stop_process(self, cam_id, proc_type):
+        if cam_id in self.processes[proc_type].keys():
+            self.status_table[f"{proc_type} {cam_id}"].halt = 1
+            self.processes[proc_type][cam_id].join()
+            del self.processes[proc_type][cam_id]
+            if proc_type == "CameraReader":
+                del self.original_image[cam_id]
+            tprint(f"{proc_type} {cam_id} stopped!")
+
+    def cameras_ready(self):
+        for cam_id in self.camera_ids:
+            if cam_id not in self.processes["CameraReader"].keys():
+                tprint(f"CameraReader {cam_id} is not ready")
+                return False
+        return True
+
+    def start_camera(self, cam_id):
+        return self.start_process(CameraReader, cam_id, 'CameraReader')
+
+    def stop_camera(self, cam_id):
+        self.stop_process(cam_id, 'CameraReader')
+
+    def start_display(self, cam_id):
+        return self.start_process(CameraDisplayer, cam_id, 'CameraDisplayer')
+
+    def stop_display(self, cam_id):
+        self.stop_process(cam_id, 'CameraDisplayer')
+
+    def start_hpe(self, cam_id):
+        if self.processes["BatchPoseEstimator"]:
+            tprint(f"Batched HPE is running, PoseEstimator {cam_id} not started")
+            return False
+        return self.start_process(PoseEstimator, cam_id, 'PoseEstimator')
+
+    def stop_hpe(self, cam_id):
+        self.stop_process(cam_id, 'PoseEstimator')
+
+    def start_hpe_batch(self):
+        # check the environment is ready
+        if not self.cameras_ready():
+            return False
+        for cam_id in self.camera_ids:
+            if cam_id in self.processes["PoseEstimator"].keys():
+                tprint(f"PoseEstimator {cam_id} is running, stop it before batched HPE")
+                return False
+        if 0 in self.processes["BatchPoseEstimator"].keys():
+            return True
+        process = BatchPoseEstimator(
+            0, self.config,
+            self.original_image,
+            self.pose_2d,
+            self.camera_ids,
+            self.status_table,
+            self.latency_table
+        )
+        self.status_table.reset("BatchPoseEstimator 0")
+        for cam_id in self.camera_ids:
+            self.status_table.reset(f"PoseEstimator {cam_id}")
+            self.latency_table.reset(f"PoseEstimator {cam_id}")
+        process.start()
+        self.processes["BatchPoseEstimator"][0] = process
+        tprint(f"BatchPoseEstimator started!")
+        return True
+
+    def stop_hpe_batch(self):
+        self.stop_process(0, 'BatchPoseEstimator')
+
+    def start_hpe_3D(self):
+        return self.start_process(PoseEstimator3D, 0, 'PoseEstimator3D')
+
+    def stop_hpe_3D(self):
+        self.stop_process(0, 'PoseEstimator3D')
+
+    def start_viewer_3D(self):
+        return self.start_process(PoseViewer3D, 0, 'PoseViewer3D')
+
+    def stop_viewer_3D(self):
+        self.stop_process(0, 'PoseViewer3D')
+
+    def start_record(self, keypoints=None):
+        # check the environment is ready
+        if not self.cameras_ready():
+            return False
+        if 0 in self.processes["Recorder"].keys():
+            return True
+        process = Recorder(
+            self.config,
+            self.original_image,
+            self.status_table,
+            save_path = self.config.get('record_path', "./outputs"),
+            latency_table = self.latency_table
+        )
+        self.status_table.reset("Recorder")
+        for cam_id in self.camera_ids:
+            self.latency_table.reset(f"Recorder {cam_id}")
+        process.start()
+        self.processes["Recorder"][0] = process
+        tprint(f"Recorder started!")
+        if self.config.get('record_keypoints', True) if keypoints is None else keypoints:
+            self.start_keypoint_record()
+        return True
+
+    def start_keypoint_record(self):
+        if not self.cameras_ready():
+            return False
+        if 0 in self.processes["KeypointRecorder"].keys():
+            return True
+        # 2D / 3D keypoints next to the video, written while HPE runs
+        process = KeypointRecorder(
+            self.config,
+            {cam_id: self.pose_2d[cam_id] for cam_id in self.camera_ids},
+            self.pose_3d,
+            self.status_table,
+            save_path = self.config.get('record_path', "./outputs"),
+            latency_table = self.latency_table
+        )
+        self.status_table.reset("KeypointRecorder")
+        self.latency_table.reset("KeypointRecorder")
+        process.start()
+        self.processes["KeypointRecorder"][0] = process
+        return True
+
+    def stop_record(self):
+        if 0 in self.processes["Recorder"].keys():
+            self.status_table["Recorder"].halt = 1
+            self.processes["Recorder"][0].join()
+            del self.processes["Recorder"][0]
+            tprint(f"Recorder stopped!")
+        self.stop_keypoint_record()
+
+    def stop_keypoint_record(self):
+        if 0 in self.processes["KeypointRecorder"].keys():
+            self.status_table["KeypointRecorder"].halt = 1
+            self.processes["KeypointRecorder"][0].join()
+            del self.processes["KeypointRecorder"][0]
+
+    def start_calibration_capture(self):
+        if not self.cameras_ready():
+            return False
+        if 0 in self.processes["CalibrationCapture"].keys():
+            if self.processes["CalibrationCapture"][0].is_alive():
+                return True
+            # finished by itself: clear it and start another round
+            self.stop_calibration_capture()
+        process = CalibrationCapture(
+            self.config,
+            {cam_id: self.original_image[cam_id] for cam_id in self.camera_ids},
+            self.status_table
+        )
+        self.status_table.reset("CalibrationCapture")
+        process.start()
+        self.processes["CalibrationCapture"][0] = process
+        tprint(f"CalibrationCapture started!")
+        return True
+
+    def stop_calibration_capture(self):
+        if 0 in self.processes["CalibrationCapture"].keys():
+            self.status_table["CalibrationCapture"].halt = 1
+            self.processes["CalibrationCapture"][0].join()
+            del self.processes["CalibrationCapture"][0]
+            tprint(f"CalibrationCapture stopped!")
+
+    def start_stage(self, stage):
+        '''Start every process of a stage (per camera stages for all cameras). Returns False if it could not start.'''
+        if stage == "CameraReader":
+            return all([self.start_camera(cam_id) for cam_id in self.camera_ids])
+        elif stage == "CameraDisplayer":
+            return self.cameras_ready() and all([self.start_display(cam_id) for cam_id in self.camera_ids])
+        elif stage == "PoseEstimator":
+            return self.cameras_ready() and all([self.start_hpe(cam_id) for cam_id in self.camera_ids])
+        elif stage == "BatchPoseEstimator":
+            return self.start_hpe_batch()
+        elif stage == "PoseEstimator3D":
+            return self.start_hpe_3D()
+        elif stage == "PoseViewer3D":
+            return self.start_viewer_3D()
+        elif stage == "Recorder":
+            return self.start_record(keypoints=False)
+        elif stage == "KeypointRecorder":
+            return self.start_keypoint_record()
+        elif stage == "CalibrationCapture":
+            return self.start_calibration_capture()
+        raise ValueError(f"unknown stage {stage}, expected one of {STAGES}")
+
+    def stop_stage(self, stage):
+        if stage == "Recorder":
+            self.stop_record()
+        elif stage == "KeypointRecorder":
+            self.stop_keypoint_record()
+        elif stage == "CalibrationCapture":
+            self.stop_calibration_capture()
+        else:
+            for cam_id in list(self.processes[stage].keys()):
+                self.stop_process(cam_id, stage)
+
+    def start_stages(self, stages):
+        '''
+            Start the given stages in dependency order. Raises ValueError for
+            a stage whose inputs are not in the list, RuntimeError if a stage
+            does not start.
+        '''
+        for stage in stages:
+            if stage not in STAGE_INPUTS:
+                raise ValueError(f"unknown stage {stage}, expected one of {STAGES}")
+            inputs = STAGE_INPUTS[stage]
+            if inputs and not any(stage_input in stages for stage_input in inputs):
+                raise ValueError(f"stage {stage} needs one of {inputs}")
+        for stage in STAGES:
+            if stage in stages and not self.start_stage(stage):
+                raise RuntimeError(f"stage {stage} could not be started")
+
+    def stop_all(self):
+        for stage in reversed(STAGES):
+            self.stop_stage(stage)
+
+    def summary(self):
+        '''
+            {process name: status fields} of the processes started in this run.
+            Throughput is taken from 'frames', counted from 0 by every process;
+            'frame_id' is process specific and -1 until the first output.
+        '''
+        rows = {}
+        for name in self.status_table.process_names:
+            status = self.status_table[name]
+            if status.last_update == 0:
+                continue
+            rows[name] = {
+                'running': status.running,
+                'error': status.error,
+                'fps': status.fps,
+                'frame_id': status.frame_id,
+                'dropped': status.dropped,
+                'latency': status.latency,
+                'quality_tier': status.quality_tier,
+                'skew': status.skew,
+                'frames': status.frames,
+                'queue_depth': status.queue_depth,
+                'cpu_time': status.cpu_time,
+            }
+        return rows
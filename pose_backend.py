@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import numpy as np
+
+NUM_KEYPOINTS = 25 # BODY_25
+
+def is_debugging():
+    gettrace = getattr(sys, 'gettrace', None)
+    if gettrace is None:
+        return False
+    else:
+        return gettrace() is not None
+
+class PoseBackend:
+    '''
+        2D pose estimator interface used by the PoseEstimator processes.
+            load()        load the model, once per process
+            infer(frames) run a batch of BGR frames, returns one (people, 25, 3)
+                          float32 array of (u, v, confidence) per frame
+            close()       release the model
+        and set_net_resolution() to change the network input size at run time.
+    '''
+    name = None
+
+    def __init__(self, config):
+        self.config = config
+        self.net_resolution = config.get('net_resolution', '128x192')
+
+    def load(self):
+        pass
+
+    def set_net_resolution(self, net_resolution):
+        self.net_resolution = net_resolution
+
+    def infer(self, frames):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class OpenPoseBackend(PoseBackend):
+    '''
+        OpenPose through its python wrapper. The openpose repo and build
+        directories come from config 'openpose_path' / 'openpose_build'; a
+        batch is sent as one VectorDatum so the frames of all cameras go
+        through the network in a single emplaceAndPop call.
+    '''
+    name = 'openpose'
+
+    def load(self):
+        # path to openpose repo directory
+        openpose_path = self.config.get('openpose_path', "D:/coding/pose_estimation_projects/openpose/")
+        # path to build directory
+        build_path = os.path.join(openpose_path, self.config.get('openpose_build', "build/python37/"))
+        # load builded files according to Debug/Release mode
+        if is_debugging():
+            print("Currently running in debug mode.")
+            build_type = "Debug/"
+        else:
+            print("Not running in debug mode.")
+            build_type = "Release/"
+        # pyd file
+        sys.path.append(os.path.join(build_path, 'python/openpose/', build_type))
+        # openpose.dll and other dll files
+        os.environ['PATH'] = os.pathsep.join([
+            os.environ['PATH'],
+            os.path.join(build_path, 'x64/', build_type),
+            os.path.join(build_path, 'bin/')
+        ])
+        import pyopenpose as op # type: ignore
+        self.op = op
+        self.model_folder = os.path.join(openpose_path, "models/")
+        self._start()
+        self.datums = []
+
+    def _start(self):
+        #------------選擇模式--------------
+        params = dict()
+        params["model_folder"] = self.model_folder
+        params["net_resolution"] = self.net_resolution
+        params["model_pose"] = "BODY_25"
+        params["render_pose"] = 0
+        params["face"] = False
+        params["hand"] = False
+        #---------------------------------
+
+        self.wrapper = self.op.WrapperPython()
+        self.wrapper.configure(params)
+        self.wrapper.start()
+
+    def set_net_resolution(self, net_resolution):
+        # the network input size is fixed per wrapper, restart it (reloads the model,
+        # seconds; apply_governor holds the governor off until this returns)
+        if net_resolution != self.net_resolution:
+            self.net_resolution = net_resolution
+            self.wrapper.stop()
+            self._start()
+
+    def infer(self, frames):
+        while len(self.datums) < len(frames):
+            self.datums.append(self.op.Datum())
+        datums = self.datums[:len(frames)]
+        for datum, frame in zip(datums, frames):
+            # ROI crops are strided views of the frame
+            datum.cvInputData = np.ascontiguousarray(frame)
+        self.wrapper.emplaceAndPop(self.op.VectorDatum(datums))
+        results = []
+        for datum in datums:
+            keypoints = datum.poseKeypoints
+            if keypoints is None or keypoints.ndim != 3:
+                keypoints = np.zeros((0, NUM_KEYPOINTS, 3), dtype=np.float32)
+            results.append(np.asarray(keypoints, dtype=np.float32))
+        return results
+
+    def close(self):
+        self.wrapper.stop()
+        print("openpose closed")
+
+# standing person in normalized image coordinates (x right, y down), BODY_25 order
+STUB_SKELETON = np.array([
+    [0.50, 0.15], [0.50, 0.25], [0.42, 0.25], [0.38, 0.38], [0.36, 0.50],
+    [0.58, 0.25], [0.62, 0.38], [0.64, 0.50], [0.50, 0.52], [0.45, 0.52],
+    [0.45, 0.70], [0.45, 0.88], [0.55, 0.52], [0.55, 0.70], [0.55, 0.88],
+    [0.48, 0.13], [0.52, 0.13], [0.46, 0.14], [0.54, 0.14], [0.57, 0.92],
+    [0.59, 0.91], [0.55, 0.90], [0.43, 0.92], [0.41, 0.91], [0.45, 0.90]
+], dtype=np.float32)
+
+class StubPoseBackend(PoseBackend):
+    '''
+        Deterministic backend for machines without OpenPose / GPU. Every
+        frame yields one person whose skeleton is shifted by the mean colour
+        of a coarse grid of the frame, so equal frames give equal poses.
+        'stub_call_cost' and 'stub_frame_cost' (seconds) emulate the time
+        of one accelerator call and of each frame in it, the latter at
+        net_resolution 128x192 and growing with the network area; when a
+        'stub_device_lock' is given those waits are serialized across
+        processes, like kernels of several workers sharing one GPU.
+    '''
+    name = 'stub'
+
+    def load(self):
+        time.sleep(self.config.get('stub_load_time', 0.0))
+        self.device_lock = self.config.get('stub_device_lock')
+
+    def infer(self, frames):
+        width, height = [abs(int(value)) for value in self.net_resolution.split('x')]
+        frame_cost = self.config.get('stub_frame_cost', 0.0) * width * height / (128 * 192)
+        cost = self.config.get('stub_call_cost', 0.0) + len(frames) * frame_cost
+        if cost > 0:
+            if self.device_lock is not None:
+                with self.device_lock:
+                    time.sleep(cost)
+            else:
+                time.sleep(cost)
+        results = []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            shift = frame[::32, ::32].reshape(-1, frame.shape[-1]).mean(axis=0)[:2] / 255 - 0.5
+            keypoints = np.empty((1, NUM_KEYPOINTS, 3), dtype=np.float32)
+            keypoints[0, :, 0] = (STUB_SKELETON[:, 0] + 0.2 * shift[0]) * width
+            keypoints[0, :, 1] = (STUB_SKELETON[:, 1] + 0.1 * shift[1]) * height
+            keypoints[0, :, 2] = 0.9
+            results.append(keypoints)
+        return results
+
+POSE_BACKENDS = {backend.name: backend for backend in [OpenPoseBackend, StubPoseBackend]}
+
+def create_pose_backend(config):
+    '''Backend selected by config 'pose_backend' (default 'openpose').'''
+    name = config.get('pose_backend', 'openpose')
+    if name not in POSE_BACKENDS:
+        raise ValueError(f"Unknown pose backend {name}, expected one of {list(POSE_BACKENDS)}")
+    return POSE_BACKENDS[name](config)
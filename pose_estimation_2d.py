@@ -5,48 +5,15 @@ from multiprocessing import Process, Queue
 import time
 import numpy as np
 from singleton_lock import print_lock, tprint
-from utils import decode_frame_size_rate
-
-global_op = None
-OPENPOSE_VALID = False
-
-def is_debugging():
-    gettrace = getattr(sys, 'gettrace', None)
-    if gettrace is None:
-        return False
-    else:
-        return gettrace() is not None
-
-def load_openpose_module():
-    global global_op, OPENPOSE_VALID
-    # path to openpose repo directory
-    OPENPOSE_PATH = "D:/coding/pose_estimation_projects/openpose/"
-    # path to build directory
-    BUILD_PATH = "build/python37/"
-    # load builded files according to Debug/Release mode
-    if is_debugging():
-        print("Currently running in debug mode.")
-        BUILD_TYPE = "Debug/"
-    else:
-        print("Not running in debug mode.")
-        BUILD_TYPE = "Release/"
-    # pyd file
-    sys.path.append(OPENPOSE_PATH + BUILD_PATH + 'python/openpose/' + BUILD_TYPE)
-    # openpose.dll
-    os.environ['PATH']  = os.environ['PATH'] + ';' + OPENPOSE_PATH + BUILD_PATH + 'x64/' + BUILD_TYPE
-    # other dll files
-    os.environ['PATH']  = os.environ['PATH'] + ';' +  OPENPOSE_PATH + BUILD_PATH + 'bin/;'
-    try:
-        import pyopenpose as op # type: ignore
-        global_op = op
-        OPENPOSE_VALID = True
-    except Exception as e:
-        print(e)
-        return False
-    return True
+from utils import decode_frame_size_rate, capture_clock, RateMeter
+from status_table import STATUS_ERROR
+from frame_buffer import subscribe_frames
+from pose_backend import create_pose_backend
+from roi import RoiTracker
+from governor import QualityGovernor, DEFAULT_QUALITY_TIERS
 
 class PoseEstimator(Process):
-    def __init__(self, cam_id, config, original_image, pose_2d, input_camera_name, shared_dict):
+    def __init__(self, cam_id, config, original_image, pose_2d, input_camera_name, status_table, latency_table=None):
         super().__init__()
         self.cam_id = cam_id
         self.process_name = f"PoseEstimator {self.cam_id}"
@@ -54,91 +21,255 @@ class PoseEstimator(Process):
         self.original_image = original_image
         self.pose_2d = pose_2d
         self.input_camera_name = input_camera_name
-        self.shared_dict = shared_dict
-        self.shared_dict[self.process_name] = {
-            'fps': 0,
-            'running': True,
-            'poseKeypoints': None
-        }
+        self.status_table = status_table
+        self.latency_table = latency_table
 
     def run(self):
-        if not OPENPOSE_VALID:
-            print("Loading OpenPose Start")
-            if not load_openpose_module():
-                print("OpenPose invalie!")
-                return
-            print("Loading OpenPose Success")
-            
-            
+        self.status = self.status_table[self.process_name]
+        backend = create_pose_backend(self.config)
+        try:
+            print(f"Loading {backend.name} Start")
+            backend.load()
+            print(f"Loading {backend.name} Success")
+        except Exception as e:
+            print(f"{backend.name} invalid! {e}")
+            self.status.error = STATUS_ERROR
+            self.status.running = 0
+            return
+
         tprint(f"Start HPE {self.cam_id}")
         try:
-            self.pose_estimation()
+            self.pose_estimation(backend)
         except Exception as e:
+            self.status.error = STATUS_ERROR
             tprint(f"Exception in HPE {self.cam_id}: {e}")
         finally:
-            # queue cancel_join_thread() to prevent block join_thread()
-            # https://docs.python.org/3/library/multiprocessing.html#pipes-and-queues
+            self.status.running = 0
+            backend.close()
             tprint(f"Stopping HPE {self.cam_id}")
     
-    def pose_estimation(self):
-        frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
-        OPENPOSE_PATH = "D:/coding/pose_estimation_projects/openpose/"
-
-        #------------選擇模式--------------
-        params = dict()
-        params["model_folder"] = OPENPOSE_PATH + "/models/"
-        params["net_resolution"] = '128x192'
-        params["model_pose"] = "BODY_25"
-        params["render_pose"] = 1
-        params["face"] = False
-        params["hand"] = False
-        #---------------------------------
-
-        #----------引入openpose--------
-        opWrapper = global_op.WrapperPython()
-        opWrapper.configure(params)
-        opWrapper.start()
-        datum = global_op.Datum()
-        #-----------------------------
-
-        prev_time = time.time()
-        times = [1]
-        maxCount = 60
+    def pose_estimation(self, backend):
+        roi = create_roi_tracker(self.config)
+        governor = create_governor(self.config)
+        if governor is not None and governor.net_resolution != backend.net_resolution:
+            # net_resolution is not one of the tiers, start at the governor's level
+            apply_governor(governor, True, backend, [roi], self.status, self.process_name)
+        # capture -> 2D pose published, and frame taken -> published
+        latency_histograms = self.latency_table.recorder(self.process_name) if self.latency_table is not None else None
+        rate = RateMeter()
         prev_image_id = -1
-        while not self.shared_dict["control signals"][self.process_name]["halt"]:
-            input_frame = np.frombuffer(self.original_image.get_obj(), dtype=np.uint8).reshape((frameHeight, frameWidth, 3))
-            if (input_frame is not None) and not (prev_image_id == self.shared_dict[self.input_camera_name]['image_id']):
-                prev_image_id = self.shared_dict[self.input_camera_name]['image_id']
-                current_time = time.time()
-                times.append(round(current_time - prev_time, 2))
-                times = times[-maxCount:]
-                local_dict = self.shared_dict[self.process_name]
-                local_dict['fps'] = 1 / np.mean(times) #計算時間
-                prev_time = current_time
-                self.shared_dict[self.process_name] = local_dict
+        prev_processed_id = -1
+        input_frame = np.empty(self.original_image.shape, dtype=self.original_image.dtype)
+        subscription = self.original_image.subscribe()
+        while not self.status.halt:
+            latest_id = self.original_image.latest_id()
+            if not (prev_image_id == latest_id):
+                if governor is not None and 0 <= latest_id - prev_processed_id <= governor.skip:
+                    # frame skipping of the lowest quality levels
+                    prev_image_id = latest_id
+                    continue
+                start_time = capture_clock()
+                # private copy of the latest frame: the camera recycles a slot
+                # within a few frame periods, faster than one inference
+                prev_image_id, capture_time, input_frame = self.original_image.read(out=input_frame)
+                prev_processed_id = prev_image_id
+                self.status.fps = rate.tick(start_time) #計算時間
+                self.status.frame_id = prev_image_id
+                self.status.last_update = time.time()
+                self.status.cpu_time = time.process_time()
 
-                datum.cvInputData = input_frame    
-                #opWrapper.emplaceAndPop([datum]) #原本的但有問題
-                opWrapper.emplaceAndPop(global_op.VectorDatum([datum])) #改成這個程式碼
-                # OutputData = datum.cvOutputData #加上骨架後影像
-                poseKeypoints = datum.poseKeypoints
-                faceKeypoints = datum.faceKeypoints
-                handKeypoints = datum.handKeypoints
-                pose_2d = np.frombuffer(self.pose_2d.get_obj(), dtype=np.float32).reshape((25, 3))
-                if poseKeypoints is not None:
-                    pose_2d[:] = poseKeypoints[0]
+                inference_start = time.perf_counter()
+                if roi is not None:
+                    # crop around the previous pose, full frame when tracking is lost
+                    image, region = roi.crop(input_frame)
+                    people = roi.to_frame(backend.infer([image])[0], region)
+                    roi.update(people)
                 else:
-                    pass
-                    # pose_2d[:] = pose_2d[:] * 0
-                # 縮放 OutputData 成指定大小
-                # resized_output = cv2.resize(OutputData, (frameWidth, frameHeight))
-                # local_dict['poseKeypoints'] = poseKeypoints
+                    people = backend.infer([input_frame])[0]
+                inference_time = time.perf_counter() - inference_start
+                # stamped before the write, which may hand the core to a woken consumer
+                publish_time = capture_clock()
+                publish_pose(self.pose_2d, people, prev_image_id, capture_time)
+                self.status.frames += 1
+                latency = publish_time - capture_time
+                self.status.latency += 0.1 * (latency - self.status.latency)
+                if latency_histograms is not None:
+                    latency_histograms.age(capture_time, publish_time)
+                    latency_histograms.stage(start_time, publish_time)
+                if governor is not None:
+                    apply_governor(governor, governor.observe(latency, inference_time), backend, [roi], self.status, self.process_name)
             else:
-                # tprint(f"queue {self.cam_id} empty!")
-                # time.sleep(0.01)
-                pass
-            # tprint(f"                      queue size: {self.queue.qsize()}")
+                # sleep until the camera publishes a new frame
+                subscription.wait(timeout=0.1)
+        subscription.close()
+        if roi is not None:
+            tprint(f"HPE {self.cam_id} ROI statistics: {roi.stats()}")
         print("finish hpe")
 
-        opWrapper.stop()
-        print("openpose closed")
\ No newline at end of file
+def create_roi_tracker(config):
+    '''RoiTracker for config 'roi' (default off), None for full-frame inference.'''
+    if not config.get('roi', False):
+        return None
+    frameWidth, frameHeight, _ = decode_frame_size_rate(config['resolution_fps_setting'])
+    return RoiTracker(
+        (frameWidth, frameHeight),
+        net_resolution = config.get('net_resolution', '128x192'),
+        padding = config.get('roi_padding', 0.25),
+        refresh_interval = config.get('roi_refresh_interval', 30)
+    )
+
+def create_governor(config):
+    '''QualityGovernor for config 'governor' (default off), None for a fixed net_resolution.'''
+    if not config.get('governor', False):
+        return None
+    return QualityGovernor(
+        tiers = config.get('quality_tiers', DEFAULT_QUALITY_TIERS),
+        initial_tier = config.get('net_resolution', '128x192'),
+        max_skip = config.get('max_frame_skip', 2),
+        target_fps = config.get('target_hpe_fps', 30),
+        latency_budget = config.get('latency_budget', 0.05)
+    )
+
+def apply_governor(governor, changed, backend, rois, status, process_name):
+    status.quality_tier = governor.level
+    if changed:
+        backend.set_net_resolution(governor.net_resolution)
+        # OpenPose reloads the model for a new net_resolution, which takes seconds
+        governor.hold()
+        for roi in rois:
+            if roi is not None:
+                roi.set_net_resolution(governor.net_resolution)
+        tprint(f"{process_name} quality level {governor.level}: {governor.describe()}")
+
+def publish_pose(pose_ring, people, frame_id, capture_time):
+    # the 2D result carries the frame id and capture time of its source frame;
+    # most confident people first, an empty result still keeps the 3D stage in sync
+    order = np.argsort(-people[..., 2].sum(axis=-1), kind='stable')
+    pose_ring.write_people(people[order], frame_id, capture_time)
+
+class BatchPoseEstimator(Process):
+    '''
+        One inference worker for all cameras: gathers the newest frame of
+        every camera that has one and runs them through the backend as a
+        single batch, so the model is loaded once and the accelerator sees
+        one call per round instead of one per camera. Per-camera results
+        are published to the same pose rings as PoseEstimator, and the
+        per-camera "PoseEstimator <id>" status rows are kept up to date.
+    '''
+    def __init__(self, cam_id, config, original_images, pose_2d, camera_ids, status_table, latency_table=None):
+        super().__init__()
+        self.cam_id = cam_id
+        self.process_name = f"BatchPoseEstimator {self.cam_id}"
+        self.config = config
+        self.original_images = original_images
+        self.pose_2d = pose_2d
+        self.camera_ids = list(camera_ids)
+        self.status_table = status_table
+        self.latency_table = latency_table
+
+    def run(self):
+        self.status = self.status_table[self.process_name]
+        backend = create_pose_backend(self.config)
+        try:
+            print(f"Loading {backend.name} Start")
+            backend.load()
+            print(f"Loading {backend.name} Success")
+        except Exception as e:
+            print(f"{backend.name} invalid! {e}")
+            self.status.error = STATUS_ERROR
+            self.status.running = 0
+            return
+
+        tprint(f"Start batched HPE for cameras {self.camera_ids}")
+        try:
+            self.pose_estimation(backend)
+        except Exception as e:
+            self.status.error = STATUS_ERROR
+            tprint(f"Exception in batched HPE: {e}")
+        finally:
+            self.status.running = 0
+            backend.close()
+            tprint(f"Stopping batched HPE")
+
+    def pose_estimation(self, backend):
+        camera_status = {
+            cam_id: self.status_table[f"PoseEstimator {cam_id}"]
+            for cam_id in self.camera_ids if f"PoseEstimator {cam_id}" in self.status_table
+        }
+        # the per-camera "PoseEstimator <id>" histograms, the batch fills them instead of PoseEstimator
+        latency_histograms = {
+            cam_id: self.latency_table.recorder(f"PoseEstimator {cam_id}")
+            for cam_id in self.camera_ids if self.latency_table is not None and f"PoseEstimator {cam_id}" in self.latency_table
+        }
+        rate = RateMeter()
+        # per-camera rates of their own frames, a batch often holds only some cameras
+        camera_rates = {cam_id: RateMeter() for cam_id in camera_status}
+        prev_image_ids = {cam_id: -1 for cam_id in self.camera_ids}
+        rois = {cam_id: create_roi_tracker(self.config) for cam_id in self.camera_ids}
+        # one governor for the whole batch, the backend runs a single net_resolution
+        governor = create_governor(self.config)
+        if governor is not None and governor.net_resolution != backend.net_resolution:
+            # net_resolution is not one of the tiers, start at the governor's level
+            apply_governor(governor, True, backend, rois.values(), self.status, self.process_name)
+        skip = governor.skip if governor is not None else 0
+        # one private frame buffer per camera, inference never runs on a ring slot
+        buffers = {
+            cam_id: np.empty(self.original_images[cam_id].shape, dtype=self.original_images[cam_id].dtype)
+            for cam_id in self.camera_ids
+        }
+        subscription = subscribe_frames(self.original_images[cam_id] for cam_id in self.camera_ids)
+        while not self.status.halt:
+            # copies of the newest frame of every camera that has a new one
+            start_time = capture_clock()
+            batch = []
+            for cam_id in self.camera_ids:
+                ring = self.original_images[cam_id]
+                if not 0 <= ring.latest_id() - prev_image_ids[cam_id] <= skip:
+                    frame_id, capture_time, frame = ring.read(out=buffers[cam_id])
+                    if frame_id >= 0:
+                        batch.append((cam_id, frame_id, capture_time, frame))
+            if not batch:
+                # sleep until any camera publishes a new frame
+                subscription.wait(timeout=0.1)
+                continue
+
+            current_time = time.time()
+            self.status.fps = rate.tick(start_time)
+            self.status.frame_id += 1 # batches run
+            self.status.last_update = current_time
+            self.status.cpu_time = time.process_time()
+
+            # crop around the previous pose of every camera, full frame when tracking is lost
+            crops = [
+                rois[cam_id].crop(frame) if rois[cam_id] is not None else (frame, None)
+                for cam_id, _, _, frame in batch
+            ]
+            inference_start = time.perf_counter()
+            results = backend.infer([image for image, _ in crops])
+            inference_time = time.perf_counter() - inference_start
+            latency = 0
+            for (cam_id, frame_id, capture_time, _), (_, region), people in zip(batch, crops, results):
+                prev_image_ids[cam_id] = frame_id
+                if rois[cam_id] is not None:
+                    people = rois[cam_id].to_frame(people, region)
+                    rois[cam_id].update(people)
+                publish_time = capture_clock()
+                publish_pose(self.pose_2d[cam_id], people, frame_id, capture_time)
+                self.status.frames += 1
+                latency = max(latency, publish_time - capture_time)
+                if cam_id in latency_histograms:
+                    latency_histograms[cam_id].age(capture_time, publish_time)
+                    latency_histograms[cam_id].stage(start_time, publish_time)
+                if cam_id in camera_status:
+                    camera_status[cam_id].fps = camera_rates[cam_id].tick(start_time)
+                    camera_status[cam_id].frame_id = frame_id
+                    camera_status[cam_id].frames += 1
+                    camera_status[cam_id].last_update = current_time
+            self.status.latency += 0.1 * (latency - self.status.latency)
+            if governor is not None:
+                apply_governor(governor, governor.observe(latency, inference_time), backend, rois.values(), self.status, self.process_name)
+                skip = governor.skip
+                for status in camera_status.values():
+                    status.quality_tier = governor.level
+        subscription.close()
+        print("finish batched hpe")
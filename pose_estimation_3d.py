@@ -1,176 +1,145 @@
-import os
-import cv2
-import sys
-import json
 from multiprocessing import Process
 import time
-import numpy as np
-from singleton_lock import print_lock, tprint
-from utils import decode_frame_size_rate
-from utils import BODY25_SKELETON_EDGES
-
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
+from singleton_lock import tprint
+from utils import decode_frame_size_rate, capture_clock, RateMeter
+from status_table import STATUS_ERROR
+from frame_buffer import subscribe_frames
+from frame_sync import FrameSynchronizer
+from triangulation import Triangulator
+from association import PersonAssociator
+from filtering import SkeletonFilter
+from camera_model import CalibrationWatcher
 
 class PoseEstimator3D(Process):
-    def __init__(self, cam_id, config, pose_2d, camera_ids, shared_dict):
+    def __init__(self, cam_id, config, pose_2d, pose_3d, camera_ids, status_table, latency_table=None):
         super().__init__()
         self.cam_id = cam_id
         self.process_name = f"PoseEstimator3D {self.cam_id}"
         self.config = config
         self.pose_2d = pose_2d
+        self.pose_3d = pose_3d
         self.camera_ids = camera_ids
-        self.shared_dict = shared_dict
-        self.shared_dict[self.process_name] = {
-            'fps': 0,
-            'running': True
-        }
+        self.status_table = status_table
+        self.latency_table = latency_table
 
     def run(self):
         tprint(f"Start 3D HPE {self.cam_id}")
+        self.status = self.status_table[self.process_name]
         try:
             self.pose_estimation_3D()
         except Exception as e:
+            self.status.error = STATUS_ERROR
             tprint(f"Exception in 3D HPE: {e}")
         finally:
+            self.status.running = 0
             tprint(f"Stopping 3D HPE")
     
+    def calibrated_ids(self, rig):
+        return [cam_id for cam_id in self.camera_ids if cam_id in rig.cameras]
+
     def pose_estimation_3D(self):
         frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
 
-        # read camera parameters
-        with open('outputs/calibration/parameters.json', 'r') as fin:
-            parameters = json.load(fin)
-
-        # 3D plot initialization
-        fig = plt.figure()
-        ax = fig.add_subplot(111, projection='3d')
-
-        # 設置軸的範圍
-        ax.set_xlim([350, 550])
-        ax.set_ylim([-175, -110])
-        ax.set_zlim([-400, 150])
-
-        # 初始化24條線條，初始時設置為空
-        lines = [ax.plot([], [], [], 'bo-', linewidth=2)[0] for _ in range(24)]
-
-        prev_time = time.time()
-        times = [1]
-        maxCount = 60
-        prev_image_id = -1
-        while not self.shared_dict["control signals"][self.process_name]["halt"]:
-            current_time = time.time()
-            times.append(round(current_time - prev_time, 2))
-            times = times[-maxCount:]
-            local_dict = self.shared_dict[self.process_name]
-            local_dict['fps'] = 1 / np.mean(times) #計算時間
-            prev_time = current_time
-            self.shared_dict[self.process_name] = local_dict
-
-            pose_2ds = {}
+        # camera parameters, reloaded when parameters.json changes
+        calibration = CalibrationWatcher(self.config.get('calibration_path', 'outputs/calibration/parameters.json'))
+        rig = calibration.rig
+        # every calibrated camera takes part, views are selected per joint
+        triangulator = Triangulator(
+            rig.subset(self.calibrated_ids(rig)),
+            max_reprojection_error = self.config.get('max_reprojection_error', 15.0),
+            max_views = self.config.get('max_views_per_joint')
+        )
+        # matches the people of every view before triangulating each person
+        associator = PersonAssociator(
+            triangulator.rig,
+            max_distance = self.config.get('max_epipolar_distance', 20.0)
+        )
+
+        # temporal smoothing, gap filling and latency compensation of the 3D output
+        skeleton_filter = SkeletonFilter(
+            max_people = self.pose_3d.max_people,
+            process_noise = self.config.get('filter_process_noise', 2e6),
+            measurement_noise = self.config.get('filter_measurement_noise', 100.0),
+            max_gap = self.config.get('filter_max_gap', 0.25)
+        ) if self.config.get('filter_3d', True) else None
+        # 'auto': predict ahead by the measured capture -> 3D latency, or a fixed lead in seconds
+        predict_latency = self.config.get('predict_latency', 'auto')
+        latency = 0.0
+
+        # only triangulate views captured within sync_tolerance (s) of each other. 'auto':
+        # half the period of the slowest 2D stage, measured on the capture times of its
+        # poses; every estimator picks its own latest frame, so below the camera rate the
+        # views of one instant are up to a pose period apart, not half a camera frame
+        sync_tolerance = self.config.get('sync_tolerance', 'auto')
+        synchronizer = FrameSynchronizer(
+            self.camera_ids,
+            tolerance = 0.5 / fps if sync_tolerance == 'auto' else sync_tolerance
+        )
+        pose_rates = {cam_id: RateMeter(30) for cam_id in self.camera_ids}
+        pose_fps = {cam_id: 0.0 for cam_id in self.camera_ids}
+        # complete bundles replaced by a newer one before triangulation
+        stale_bundles = 0
+        prev_pose_ids = {cam_id: -1 for cam_id in self.camera_ids}
+        subscription = subscribe_frames(self.pose_2d[cam_id] for cam_id in self.camera_ids)
+
+        # capture of the oldest view -> 3D pose published, and bundle complete -> published
+        latency_histograms = self.latency_table.recorder(self.process_name) if self.latency_table is not None else None
+        rate = RateMeter()
+        while not self.status.halt:
+            bundles = []
             for cam_id in self.camera_ids:
-                pose_2ds[cam_id] = np.copy(np.frombuffer(self.pose_2d[cam_id].get_obj(), dtype=np.float32).reshape((25, 3)))
-
-            # process each keypoint
-            pose_3d = np.zeros((25, 4), dtype=np.float32)
-            for i in range(25):
-                u0, v0, c0 = pose_2ds[0][i]
-                u1, v1, c1 = pose_2ds[1][i]
-                if c0 < 0.1 or c1 < 0.1:
-                    continue
-                vec3 = self.camera_2D_to_global(parameters, [[u0, v0], [u1, v1]])
-                M = np.array([
-                    [1, 0, 0],
-                    [0, 0, 1],
-                    [0, -1, 0]
-                ])
-                vec3_rotate = M @ vec3
-                pose_3d[i, 0:3] = vec3_rotate.T
-                pose_3d[i, 3] = c0 * c1
-
-            for i in range(len(BODY25_SKELETON_EDGES)):
-                start_idx = BODY25_SKELETON_EDGES[i, 0]
-                end_idx = BODY25_SKELETON_EDGES[i, 1]
-                x1, y1, z1, c1 = pose_3d[start_idx]
-                x2, y2, z2, c2 = pose_3d[end_idx]
-                if c1 > 0.15 and c2 > 0.15:
-                    # 隨機生成兩個3D點
-                    point1 = [x1, y1, z1]
-                    point2 = [x2, y2, z2]
-                    
-                    # 更新線條的數據並顯示
-                    lines[i].set_data([point1[0], point2[0]], [point1[1], point2[1]])
-                    lines[i].set_3d_properties([point1[2], point2[2]])
-                    lines[i].set_visible(True)
-                else:
-                    # 隱藏不需要顯示的線條
-                    lines[i].set_visible(False)
-            
-            # 刷新視窗
-            plt.draw()
-            plt.pause(0.01)  # 暫停0.01秒以便更新視窗
-
-            # time.sleep(1)
+                pose_ring = self.pose_2d[cam_id]
+                if not (prev_pose_ids[cam_id] == pose_ring.latest_id()):
+                    prev_pose_ids[cam_id], capture_time, people = pose_ring.read_people()
+                    pose_fps[cam_id] = pose_rates[cam_id].tick(capture_time)
+                    if sync_tolerance == 'auto' and all(pose_fps.values()):
+                        synchronizer.tolerance = 0.5 / min(pose_fps.values())
+                    bundles += synchronizer.push(cam_id, prev_pose_ids[cam_id], capture_time, people)
+            if not bundles:
+                # sleep until any 2D estimator publishes a new pose
+                subscription.wait(timeout=0.1)
+                continue
+            # triangulate the newest complete set, older ones are already stale
+            bundle = bundles[-1]
+            stale_bundles += len(bundles) - 1
+
+            start_time = capture_clock()
+            sync_stats = synchronizer.stats()
+            self.status.fps = rate.tick(start_time) #計算時間
+            self.status.frame_id = bundle.frame_ids[self.camera_ids[0]]
+            # views that never made a bundle, and bundles skipped for a newer one
+            self.status.dropped = sum(sync_stats['dropped'].values()) + stale_bundles
+            self.status.skew = sync_stats['mean_skew']
+            self.status.queue_depth = sum(len(pending) for pending in synchronizer.pending.values())
+            self.status.last_update = time.time()
+            self.status.cpu_time = time.process_time()
+
+            if calibration.poll() is not rig:
+                # a new calibration was written, switch to it between two frames
+                rig = calibration.rig
+                triangulator.rig = rig.subset(self.calibrated_ids(rig))
+                associator.rig = triangulator.rig
+            # people matched across views: (persons, views, 25, 3)
+            persons = associator.associate([bundle.views[cam_id] for cam_id in triangulator.rig.camera_ids])
+            # all joints of all persons and views in one batched solve, (persons, 25, 4): x, y, z, confidence
+            pose_3d, joint_error, joint_views = triangulator.triangulate_robust(persons)
+
+            # publish for the viewer / recorder, stamped with the time the pose refers to
+            # and the capture time of its oldest view
+            timestamp = bundle.timestamp
+            if skeleton_filter is not None:
+                skeleton_filter.update(pose_3d, bundle.timestamp)
+                latency = 0.9 * latency + 0.1 * (capture_clock() - bundle.timestamp) if latency else capture_clock() - bundle.timestamp
+                lead = latency if predict_latency == 'auto' else predict_latency
+                pose_3d = skeleton_filter.predict(lead)
+                timestamp = bundle.timestamp + lead
+            # stamped before the write, which may hand the core to a woken consumer
+            publish_time = capture_clock()
+            self.pose_3d.write_people(pose_3d, self.status.frame_id, timestamp, bundle.timestamp)
+            self.status.frames += 1
+            if latency_histograms is not None:
+                latency_histograms.age(bundle.timestamp, publish_time)
+                latency_histograms.stage(start_time, publish_time)
+        subscription.close()
+        tprint(f"3D sync statistics: {synchronizer.stats()}, stale bundles {stale_bundles}, tolerance {synchronizer.tolerance * 1e3:.1f} ms")
         tprint("finish 3D  hpe")
-    
-    def camera_2D_to_global(self, parameters, vec):
-        u0 = vec[0][0]
-        v0 = vec[0][1]
-        u1 = vec[1][0]
-        v1 = vec[1][1]
-
-        mtx0 = np.array(parameters['mtx0'])
-        mtx1 = np.array(parameters['mtx1'])
-        dist0 = np.array(parameters['dist0'])
-        dist1 = np.array(parameters['dist1'])
-        R = np.array(parameters['R'])
-        T = np.array(parameters['T'])
-        
-        distorted_point_0 = np.array([[[u0, v0]]], dtype=np.float32)
-        undistorted_point_0 = cv2.undistortPoints(distorted_point_0, mtx0, dist0, P=mtx0)
-        distorted_point_1 = np.array([[[u1, v1]]], dtype=np.float32)
-        undistorted_point_1 = cv2.undistortPoints(distorted_point_1, mtx1, dist1, P=mtx1)
-
-        direction_0 = undistorted_point_0[0][0]
-        direction_1 = undistorted_point_1[0][0]
-
-        ray_0_camera = np.array([[direction_0[0]], [direction_0[1]], [1.0]])
-        ray_1_camera = np.array([[direction_1[0]], [direction_1[1]], [1.0]])
-
-        ray_0_world = ray_0_camera
-        ray_1_world = np.linalg.inv(R) @ ray_1_camera  # 旋轉
-        ray_1_world += T                              # 平移
-
-        # start of 0: (0, 0, 0)
-        # direction of 0: ray_0_world
-        # start of 1: T
-        # direction of 1: ray_1_world
-        O_L = np.array([[0], [0], [0]])  # 左相機起點 (世界坐標系)
-        O_R = T  # 右相機起點 (世界坐標系中的T)
-        d_L = ray_0_world / np.linalg.norm(ray_0_world)  # 左相機的方向向量，歸一化
-        d_R = ray_1_world / np.linalg.norm(ray_1_world)  # 右相機的方向向量，歸一化
-
-        # 計算 t 和 s
-        A = d_L.T @ d_L
-        B = d_L.T @ d_R
-        C = d_R.T @ d_R
-        D = (O_R - O_L).T @ d_L
-        E = (O_R - O_L).T @ d_R
-
-        denom = A * C - B * B
-
-        if denom != 0:
-            t = (B * E - C * D) / denom
-            s = (A * E - B * D) / denom
-        else:
-            t, s = 0, 0  # 射線平行的情況，使用某個默認值
-
-        # 射線上的最近點
-        P_L_closest = O_L + t * d_L
-        P_R_closest = O_R + s * d_R
-
-        # 計算兩個最近點的中點作為最終的3D位置
-        P_3D = (P_L_closest + P_R_closest) / 2
-
-        return P_3D
-
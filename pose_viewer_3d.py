@@ -0,0 +1,137 @@
+from multiprocessing import Process
+import time
+import numpy as np
+from singleton_lock import print_lock, tprint
+from utils import capture_clock, RateMeter, BODY25_SKELETON_EDGES
+from status_table import STATUS_ERROR
+
+class PoseViewer3D(Process):
+    '''
+        Optional matplotlib view of the 3D skeleton published by
+        PoseEstimator3D. Runs in its own process and redraws at most
+        `viewer_fps` times per second (blitting only the skeleton lines when
+        the backend supports it), so the plot never slows triangulation down.
+    '''
+    def __init__(self, cam_id, config, pose_3d, status_table, latency_table=None):
+        super().__init__()
+        self.cam_id = cam_id
+        self.process_name = f"PoseViewer3D {self.cam_id}"
+        self.config = config
+        self.pose_3d = pose_3d
+        self.status_table = status_table
+        self.latency_table = latency_table
+
+    def run(self):
+        tprint(f"Start 3D viewer {self.cam_id}")
+        self.status = self.status_table[self.process_name]
+        try:
+            self.display_3D()
+        except Exception as e:
+            self.status.error = STATUS_ERROR
+            tprint(f"Exception in 3D viewer: {e}")
+        finally:
+            self.status.running = 0
+            tprint(f"Stopping 3D viewer")
+
+    def display_3D(self):
+        # matplotlib is only imported by the viewer, the 3D estimator stays headless
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D
+
+        fig = plt.figure()
+        ax = fig.add_subplot(111, projection='3d')
+
+        # 設置軸的範圍
+        ax.set_xlim(self.config.get('viewer_xlim', [350, 550]))
+        ax.set_ylim(self.config.get('viewer_ylim', [-175, -110]))
+        ax.set_zlim(self.config.get('viewer_zlim', [-400, 150]))
+
+        # 初始化24條線條，初始時設置為空, one set per person
+        colors = ['b', 'r', 'g', 'm', 'c', 'y', 'k']
+        person_lines = [
+            [ax.plot([], [], [], f'{colors[person % len(colors)]}o-', linewidth=2)[0] for _ in range(len(BODY25_SKELETON_EDGES))]
+            for person in range(self.pose_3d.max_people)
+        ]
+        lines = [line for skeleton in person_lines for line in skeleton]
+        use_blit = fig.canvas.supports_blit
+        for line in lines:
+            line.set_animated(use_blit)
+        background = None
+
+        def on_draw(event):
+            # full redraws (first show, resize, rotating the view) refresh the cached axes
+            nonlocal background
+            background = fig.canvas.copy_from_bbox(fig.bbox)
+            for line in lines:
+                ax.draw_artist(line)
+
+        if use_blit:
+            fig.canvas.mpl_connect('draw_event', on_draw)
+        plt.show(block=False)
+        plt.pause(0.1)
+
+        min_interval = 1 / self.config.get('viewer_fps', 15)
+        people = np.zeros(self.pose_3d.shape, dtype=np.float32)
+        prev_pose_id = -1
+        prev_time = time.time()
+        # capture -> skeleton on screen (glass-to-glass of the 3D path), and read -> on screen
+        latency = self.latency_table.recorder(self.process_name) if self.latency_table is not None else None
+        rate = RateMeter()
+        subscription = self.pose_3d.subscribe()
+        while not self.status.halt and plt.fignum_exists(fig.number):
+            if prev_pose_id == self.pose_3d.latest_id():
+                # sleep until a new skeleton is published, keep the window responsive
+                subscription.wait(timeout=0.05)
+                fig.canvas.flush_events()
+                continue
+            # throttle to the display rate, intermediate skeletons are skipped
+            wait = prev_time + min_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            read_time = capture_clock()
+            prev_pose_id, _, pose_3ds = self.pose_3d.read_people(out=people)
+            # the timestamp is the predicted time of a filtered pose, take the capture time
+            capture_time = self.pose_3d.capture_time(prev_pose_id)
+
+            current_time = time.time()
+            self.status.fps = rate.tick(read_time)
+            self.status.frame_id = prev_pose_id
+            self.status.frames += 1
+            self.status.last_update = current_time
+            self.status.cpu_time = time.process_time()
+            prev_time = current_time
+
+            for person, skeleton in enumerate(person_lines):
+                for i in range(len(BODY25_SKELETON_EDGES)):
+                    if person >= len(pose_3ds):
+                        skeleton[i].set_visible(False)
+                        continue
+                    start_idx = BODY25_SKELETON_EDGES[i, 0]
+                    end_idx = BODY25_SKELETON_EDGES[i, 1]
+                    x1, y1, z1, c1 = pose_3ds[person, start_idx]
+                    x2, y2, z2, c2 = pose_3ds[person, end_idx]
+                    if c1 > 0.15 and c2 > 0.15:
+                        # 更新線條的數據並顯示
+                        skeleton[i].set_data([x1, x2], [y1, y2])
+                        skeleton[i].set_3d_properties([z1, z2])
+                        skeleton[i].set_visible(True)
+                    else:
+                        # 隱藏不需要顯示的線條
+                        skeleton[i].set_visible(False)
+
+            if use_blit and background is not None:
+                # redraw only the skeleton on top of the cached axes
+                fig.canvas.restore_region(background)
+                for line in lines:
+                    ax.draw_artist(line)
+                fig.canvas.blit(fig.bbox)
+            else:
+                fig.canvas.draw()
+            fig.canvas.flush_events()
+            if latency is not None:
+                shown_time = capture_clock()
+                if capture_time is not None:
+                    latency.age(capture_time, shown_time)
+                latency.stage(read_time, shown_time)
+        subscription.close()
+        plt.close(fig)
@@ -1,78 +1,360 @@
 import os
 import cv2
+import json
 import time
+import queue
+import threading
 import numpy as np
 import datetime
 from multiprocessing import Process
 from singleton_lock import tprint
-from utils import decode_frame_size_rate
+from utils import decode_frame_size_rate, capture_clock
+from frame_buffer import subscribe_frames
+from status_table import STATUS_ERROR
+from recording import RecordingWriter
+from keypoint_recording import KeypointWriter
+
+class VideoSink:
+    '''cv2.VideoWriter behind the sink interface of CameraWriter: write / write_duplicate / release.'''
+    def __init__(self, output_fn, fourcc, fps, frame_size):
+        self.writer = cv2.VideoWriter(output_fn, fourcc, fps, frame_size)
+
+    def is_open(self):
+        return self.writer.isOpened()
+
+    def write(self, frame_id, capture_time, frame):
+        self.writer.write(frame)
+
+    def write_duplicate(self, frame_id, capture_time, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+class CameraWriter(threading.Thread):
+    '''
+        Encoder worker of one camera. Frames come through a bounded queue of
+        preallocated buffers: the recorder takes a free buffer, copies the
+        frame into it and queues it, the worker encodes it and hands the
+        buffer back. A full queue means the encoder cannot keep up and the
+        frame is dropped (and counted) instead of stalling the other cameras.
+        The sink is a VideoSink (.avi) or a RecordingTrack (chunked
+        recording); both encode in OpenCV, which releases the GIL, so the
+        workers of several cameras encode in parallel. latency is the
+        LatencyRecorder of the camera ("Recorder <cam_id>"), written by this
+        thread only: capture -> encoded, and the encoding itself.
+    '''
+    def __init__(self, cam_id, sink, output_fn, frame_size, queue_size=8, fill_gaps=False, latency=None):
+        super().__init__(daemon=True)
+        self.cam_id = cam_id
+        self.sink = sink
+        self.output_fn = output_fn
+        self.fill_gaps = fill_gaps
+        self.latency = latency
+        self.frames = queue.Queue()
+        self.free = queue.Queue()
+        # one more buffer holds the last frame for fill_gaps
+        for _ in range(queue_size + int(fill_gaps)):
+            self.free.put(np.empty((frame_size[1], frame_size[0], 3), dtype=np.uint8))
+        self.prev_id = -1
+        self.written = 0
+        self.missed = 0      # never seen: overwritten in the FrameRing before the recorder read them
+        self.dropped = 0     # seen but dropped, the encoder queue was full
+        self.duplicated = 0  # previous frame written again in place of a missing one (fill_gaps)
+        self.max_queued = 0
+        self.encode_time = 0.0
+        self.index = [] # (frame_id, capture_time, duplicate) of every video frame
+
+    def get_buffer(self):
+        '''Free frame buffer, None when all of them are queued.'''
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            return None
+
+    def push(self, frame_id, capture_time, buffer):
+        self.frames.put((frame_id, capture_time, buffer))
+        self.max_queued = max(self.max_queued, self.frames.qsize())
+
+    def close(self):
+        '''Encode what is queued, then release the writer.'''
+        self.frames.put(None)
+        self.join()
+        self.sink.release()
+
+    def run(self):
+        prev_frame = None
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            frame_id, capture_time, buffer = item
+            start = time.perf_counter()
+            if self.fill_gaps and prev_frame is not None and frame_id > self.prev_id + 1:
+                # keep the video timeline: repeat the last frame for the missing ones
+                for missing_id in range(self.prev_id + 1, frame_id):
+                    self.sink.write_duplicate(missing_id, capture_time, prev_frame)
+                    self.index.append((missing_id, capture_time, 1))
+                    self.duplicated += 1
+            self.sink.write(frame_id, capture_time, buffer)
+            end = time.perf_counter()
+            self.encode_time += end - start
+            if self.latency is not None:
+                # perf_counter is the capture_clock
+                self.latency.age(capture_time, end)
+                self.latency.stage(start, end)
+            self.index.append((frame_id, capture_time, 0))
+            self.written += 1
+            self.prev_id = frame_id
+            if not self.fill_gaps:
+                self.free.put(buffer)
+                continue
+            # keep the last frame for filling the next gap
+            if prev_frame is not None:
+                self.free.put(prev_frame)
+            prev_frame = buffer
+        if prev_frame is not None:
+            self.free.put(prev_frame)
+
+    def summary(self):
+        return {
+            'file': os.path.basename(self.output_fn),
+            'written': self.written,
+            'missed': self.missed,
+            'dropped': self.dropped,
+            'duplicated': self.duplicated,
+            'first_frame_id': self.index[0][0] if self.index else -1,
+            'last_frame_id': self.prev_id,
+            'max_queued': self.max_queued,
+            'mean_encode_ms': self.encode_time / max(self.written, 1) * 1e3,
+        }
 
 class Recorder(Process):
-    def __init__(self, config, original_images, shared_dict, save_path = "./outputs"):
+    '''
+        Records every camera with one CameraWriter (encoder thread and
+        bounded queue) per camera. The main loop only copies frames out of
+        the FrameRings, in frame id order, so a slow encoder drops frames of
+        its own camera only. Frame ids are checked for gaps and at the end
+        "<date>_recording.json" holds the written / missed / dropped /
+        duplicated counters. Config:
+            'record_format'      'avi': "<date>_<cam_id>.avi" plus
+                                 "<date>_<cam_id>.frames.csv" with the frame
+                                 id and capture time of every video frame;
+                                 'chunked': indexed recording directory
+                                 "<date>/" (see recording.py)
+            'record_queue_size'  frames per camera, default 8
+            'record_fill_gaps'   repeat the last frame for missing ones, default False
+    '''
+    def __init__(self, config, original_images, status_table, save_path = "./outputs", latency_table=None):
         super().__init__()
         self.config = config
         self.original_images = original_images
-        self.shared_dict = shared_dict
+        self.status_table = status_table
+        self.latency_table = latency_table
         self.save_path = save_path
         self.process_name = "Recorder"
     
     def run(self):
         tprint(f"Start recorder")
+        self.status = self.status_table[self.process_name]
+        self.camera_writers = {}
         try:
             self.record()
         except Exception as e:
+            self.status.error = STATUS_ERROR
             tprint(f"Exception in Recorder: {e}")
         finally:
-            for cam_id, writer in self.video_writers.items():
-                writer.release()
+            for cam_id, writer in self.camera_writers.items():
+                writer.close()
+            if self.camera_writers:
+                self.write_sidecar()
+            self.status.running = 0
             tprint(f"Stopping Recorder")
 
     def record(self):
         frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
         fourcc = cv2.VideoWriter_fourcc(*'MJPG')
 
-        now = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        output_fns = {}
-        self.video_writers = {}
-        prev_image_ids = {}
+        self.now = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        os.makedirs(self.save_path, exist_ok=True)
+        self.record_format = self.config.get('record_format', 'avi')
+        if self.record_format == 'chunked':
+            recording_path = os.path.join(self.save_path, self.now)
+            self.recording = RecordingWriter(
+                recording_path, list(self.original_images.keys()), (frameWidth, frameHeight), fps,
+                chunk_size = self.config.get('record_chunk_size', 256 << 20),
+                quality = self.config.get('record_jpeg_quality', 90)
+            )
         for cam_id, _ in self.original_images.items():
-            output_fns[cam_id] = os.path.join(self.save_path, f"{now}_{cam_id}.avi")
-            self.video_writers[cam_id] = cv2.VideoWriter(output_fns[cam_id],
-                fourcc,
-                int(fps),
-                (frameWidth, frameHeight))
-            prev_image_ids[cam_id] = -1
-
-        while not self.shared_dict["control signals"][self.process_name]["halt"]:
-            for cam_id, frame_array in self.original_images.items():
-                if not (prev_image_ids[cam_id] == self.shared_dict[f"CameraReader {cam_id}"]['image_id']):
-                    prev_image_ids[cam_id] = self.shared_dict[f"CameraReader {cam_id}"]['image_id']
-
-                    frame = np.frombuffer(frame_array.get_obj(), dtype=np.uint8).reshape((frameHeight, frameWidth, 3))
-                    self.video_writers[cam_id].write(frame)
-                    # print(f"write frame {prev_image_ids[cam_id]} of camera {cam_id}")
-
-photo_id = 0
-
-def photo(self):
-    global photo_id
-    frameWidth, frameHeight, fps = decode_frame_size_rate(self.config['resolution_fps_setting'])
-    output_dir = "outputs/calibration"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    for cam_id in self.camera_ids:
-        # image_id = self.shared_dict[f"CameraReader {cam_id}"]['image_id']
-        output_fn = os.path.join(output_dir, f"{cam_id}", f"frame_{photo_id:05d}.jpg")
-        frame = np.frombuffer(self.original_image[cam_id].get_obj(), dtype=np.uint8).reshape((frameHeight, frameWidth, 3))
-        save_image(frame, output_fn)
-    
-    print(f"Saved")
-    photo_id = photo_id + 1
+            if self.record_format == 'chunked':
+                output_fn = recording_path
+                sink = self.recording.track(cam_id)
+            else:
+                output_fn = os.path.join(self.save_path, f"{self.now}_{cam_id}.avi")
+                sink = VideoSink(output_fn, fourcc, int(fps), (frameWidth, frameHeight))
+                if not sink.is_open():
+                    raise RuntimeError(f"cannot open {output_fn}")
+            writer = CameraWriter(
+                cam_id, sink, output_fn, (frameWidth, frameHeight),
+                queue_size = self.config.get('record_queue_size', 8),
+                fill_gaps = self.config.get('record_fill_gaps', False),
+                latency = self.latency_table.recorder(f"Recorder {cam_id}") if self.latency_table is not None else None
+            )
+            writer.start()
+            self.camera_writers[cam_id] = writer
+        prev_image_ids = {cam_id: -1 for cam_id in self.original_images}
 
-def save_image(frame, output_fn):
-    # Save the image
-    cv2.imwrite(output_fn, frame)
-    
-    # Optionally, print the save information
-    print(f"Saved {output_fn}")
\ No newline at end of file
+        prev_time = time.time()
+        written_total = 0
+        subscription = subscribe_frames(self.original_images.values())
+        while not self.status.halt:
+            got_frame = False
+            for cam_id, frame_ring in self.original_images.items():
+                writer = self.camera_writers[cam_id]
+                if prev_image_ids[cam_id] == frame_ring.latest_id():
+                    continue
+                got_frame = True
+                buffer = writer.get_buffer()
+                if buffer is None:
+                    # encoder queue full: take the newest frame id and drop it
+                    frame_id = frame_ring.latest_id()
+                    writer.dropped += frame_id - prev_image_ids[cam_id] if prev_image_ids[cam_id] >= 0 else 1
+                    prev_image_ids[cam_id] = frame_id
+                    continue
+                frame_id, capture_time, buffer = frame_ring.read_next(prev_image_ids[cam_id], out=buffer)
+                if frame_id < 0:
+                    writer.free.put(buffer)
+                    continue
+                if prev_image_ids[cam_id] >= 0 and frame_id > prev_image_ids[cam_id] + 1:
+                    writer.missed += frame_id - prev_image_ids[cam_id] - 1
+                prev_image_ids[cam_id] = frame_id
+                writer.push(frame_id, capture_time, buffer)
+
+            if not got_frame:
+                # sleep until any camera publishes a new frame
+                subscription.wait(timeout=0.1)
+
+            current_time = time.time()
+            if current_time - prev_time >= 1.0:
+                written = sum(writer.written for writer in self.camera_writers.values())
+                self.status.fps = (written - written_total) / (current_time - prev_time) / len(self.camera_writers)
+                self.status.frame_id = written
+                self.status.frames = written
+                self.status.dropped = sum(writer.missed + writer.dropped for writer in self.camera_writers.values())
+                self.status.queue_depth = sum(writer.frames.qsize() for writer in self.camera_writers.values())
+                self.status.last_update = current_time
+                self.status.cpu_time = time.process_time()
+                written_total = written
+                prev_time = current_time
+        subscription.close()
+
+    def write_sidecar(self):
+        summary = {'date': self.now, 'format': self.record_format, 'resolution_fps_setting': self.config['resolution_fps_setting'], 'cameras': {}}
+        for cam_id, writer in self.camera_writers.items():
+            if self.record_format != 'chunked':
+                # the chunked index already holds the frame ids and capture times
+                self.write_frame_list(cam_id, writer)
+            summary['cameras'][str(cam_id)] = writer.summary()
+            tprint(f"Recorder camera {cam_id}: {writer.summary()}")
+        with open(os.path.join(self.save_path, f"{self.now}_recording.json"), 'w') as f:
+            json.dump(summary, f, indent=4)
+
+    def write_frame_list(self, cam_id, writer):
+        with open(os.path.join(self.save_path, f"{self.now}_{cam_id}.frames.csv"), 'w') as f:
+            f.write("frame_id,capture_time,duplicate\n")
+            for frame_id, capture_time, duplicate in writer.index:
+                f.write(f"{frame_id},{capture_time:.6f},{duplicate}\n")
+
+class KeypointRecorder(Process):
+    '''
+        Records the 2D poses of every camera ("2d_<cam_id>") and the 3D
+        skeletons ("3d") to "<date>_keypoints/" as growable memmap columns
+        (keypoint_recording.py), with their frame ids and capture times.
+        Poses are taken from the PoseRings in frame id order, into
+        preallocated buffers, and the column metadata is flushed every
+        second so an interrupted recording stays loadable.
+    '''
+    def __init__(self, config, pose_2d, pose_3d, status_table, save_path = "./outputs", latency_table=None):
+        super().__init__()
+        self.config = config
+        self.pose_2d = pose_2d
+        self.pose_3d = pose_3d
+        self.status_table = status_table
+        self.latency_table = latency_table
+        self.save_path = save_path
+        self.process_name = "KeypointRecorder"
+
+    def run(self):
+        tprint(f"Start keypoint recorder")
+        self.status = self.status_table[self.process_name]
+        self.writer = None
+        try:
+            self.record()
+        except Exception as e:
+            self.status.error = STATUS_ERROR
+            tprint(f"Exception in KeypointRecorder: {e}")
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+                tprint(f"KeypointRecorder rows: { {name: stream.rows for name, stream in self.writer.streams.items()} }")
+            self.status.running = 0
+            tprint(f"Stopping keypoint recorder")
+
+    def record(self):
+        now = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        self.writer = KeypointWriter(os.path.join(self.save_path, f"{now}_keypoints"))
+        rings = {f"2d_{cam_id}": ring for cam_id, ring in self.pose_2d.items()}
+        rings["3d"] = self.pose_3d
+        buffers = {}
+        for name, ring in rings.items():
+            self.writer.add_stream(name, ring.shape)
+            buffers[name] = np.empty(ring.shape, dtype=ring.dtype)
+        # start with the poses published from now on
+        start_positions = {name: ring.write_position() for name, ring in rings.items()}
+        start_counts = {name: count for name, (count, _) in start_positions.items()}
+        prev_ids = {name: frame_id for name, (_, frame_id) in start_positions.items()}
+        # poses published before the last drain of each ring, all of them are either recorded or dropped
+        published = dict(start_counts)
+
+        # capture -> 3D pose written
+        latency = self.latency_table.recorder(self.process_name) if self.latency_table is not None else None
+        prev_time = time.time()
+        rows_total = 0
+        subscription = subscribe_frames(rings.values())
+        while not self.status.halt:
+            got_pose = False
+            for name, ring in rings.items():
+                published[name] = ring.write_count()
+                while True:
+                    # everything still in the ring, oldest first
+                    frame_id, timestamp, people = ring.read_people_next(prev_ids[name], out=buffers[name])
+                    if frame_id < 0:
+                        break
+                    prev_ids[name] = frame_id
+                    self.writer.append(name, frame_id, timestamp, people)
+                    got_pose = True
+                    if latency is not None and name == "3d":
+                        capture_time = ring.capture_time(frame_id)
+                        if capture_time is not None:
+                            latency.age(capture_time, capture_clock())
+            if not got_pose:
+                # sleep until any pose stream publishes
+                subscription.wait(timeout=0.1)
+
+            current_time = time.time()
+            if current_time - prev_time >= 1.0:
+                self.writer.flush()
+                rows = sum(stream.rows for stream in self.writer.streams.values())
+                self.status.fps = (rows - rows_total) / (current_time - prev_time)
+                self.status.frame_id = rows
+                self.status.frames = rows
+                # 2D frame ids skip the camera frames HPE did not run on, count missed ring writes instead;
+                # a drain may also record poses published after its count, those are not drops
+                self.status.dropped = sum(
+                    max(published[name] - start_counts[name] - self.writer.streams[name].rows, 0) for name in rings
+                )
+                self.status.last_update = current_time
+                self.status.cpu_time = time.process_time()
+                rows_total = rows
+                prev_time = current_time
+        subscription.close()
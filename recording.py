@@ -0,0 +1,247 @@
+import os
+import cv2
+import json
+import numpy as np
+
+RECORDING_VERSION = 1
+META_FILE = "recording.json"
+
+# one record per stored frame; the index files of a recording are arrays of these
+INDEX_DTYPE = np.dtype([
+    ('frame_id', '<i8'),
+    ('timestamp', '<f8'),   # capture_clock() time of the capture
+    ('offset', '<i8'),      # byte offset of the JPEG payload in its chunk file
+    ('camera', '<i4'),
+    ('chunk', '<i4'),
+    ('size', '<i4'),        # payload bytes
+    ('duplicate', '<i4'),   # 1: repeats the previous payload in place of a missing frame
+])
+
+def is_recording(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+def nearest_rows(timestamps, reference, tolerance=np.inf):
+    '''Row of the (sorted) timestamps nearest to every reference time, -1 where none lies within tolerance.'''
+    timestamps = np.asarray(timestamps)
+    reference = np.asarray(reference)
+    if not len(timestamps):
+        return np.full(len(reference), -1, dtype=np.int64)
+    after = np.clip(np.searchsorted(timestamps, reference), 0, len(timestamps) - 1)
+    before = np.clip(after - 1, 0, len(timestamps) - 1)
+    rows = np.where(np.abs(timestamps[before] - reference) <= np.abs(timestamps[after] - reference), before, after)
+    return np.where(np.abs(timestamps[rows] - reference) <= tolerance, rows, -1)
+
+class RecordingTrack:
+    '''
+        Writer of one camera of a recording: every frame is JPEG encoded and
+        appended to "<cam_id>_<chunk>.chunk", a new chunk starts once the
+        current one would exceed chunk_size bytes, and a fixed size
+        INDEX_DTYPE record is appended to "<cam_id>.index". Tracks of
+        different cameras share no state, so each can be fed from its own
+        encoder thread (cv2.imencode releases the GIL).
+    '''
+    def __init__(self, path, cam_id, chunk_size=256 << 20, quality=90):
+        self.path = path
+        self.cam_id = cam_id
+        self.chunk_size = chunk_size
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.chunk = -1
+        self.chunk_file = None
+        self.offset = 0
+        self.index_file = open(os.path.join(path, f"{cam_id}.index"), 'ab')
+        self.record = np.zeros(1, dtype=INDEX_DTYPE)
+        self.record['camera'] = cam_id
+
+    def _next_chunk(self):
+        if self.chunk_file is not None:
+            self.chunk_file.close()
+        self.chunk += 1
+        self.chunk_file = open(os.path.join(self.path, f"{self.cam_id}_{self.chunk:04d}.chunk"), 'wb')
+        self.offset = 0
+
+    def write(self, frame_id, timestamp, frame):
+        ok, payload = cv2.imencode('.jpg', frame, self.params)
+        if not ok:
+            raise RuntimeError(f"JPEG encoding failed for camera {self.cam_id} frame {frame_id}")
+        if self.chunk_file is None or (self.offset and self.offset + len(payload) > self.chunk_size):
+            self._next_chunk()
+        self.chunk_file.write(payload.data)
+        self._append(frame_id, timestamp, self.offset, len(payload), 0)
+        self.offset += len(payload)
+
+    def write_duplicate(self, frame_id, timestamp, frame=None):
+        '''Index frame_id with the payload of the previous frame, no bytes are stored.'''
+        if self.chunk_file is None:
+            return self.write(frame_id, timestamp, frame)
+        self._append(frame_id, timestamp, int(self.record['offset'][0]), int(self.record['size'][0]), 1)
+
+    def _append(self, frame_id, timestamp, offset, size, duplicate):
+        record = self.record[0]
+        record['frame_id'] = frame_id
+        record['timestamp'] = timestamp
+        record['offset'] = offset
+        record['chunk'] = self.chunk
+        record['size'] = size
+        record['duplicate'] = duplicate
+        self.index_file.write(self.record.tobytes())
+
+    def release(self):
+        if self.chunk_file is not None:
+            self.chunk_file.close()
+        self.index_file.close()
+
+class RecordingWriter:
+    '''
+        Creates a recording directory:
+            recording.json           cameras, frame size, fps, codec
+            <cam_id>.index           INDEX_DTYPE records, one per frame
+            <cam_id>_<chunk>.chunk   concatenated JPEG payloads
+        track(cam_id) returns the RecordingTrack a camera is written through.
+    '''
+    def __init__(self, path, camera_ids, frame_size, fps, chunk_size=256 << 20, quality=90):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta = {
+            'version': RECORDING_VERSION,
+            'cameras': [int(cam_id) for cam_id in camera_ids],
+            'frame_size': list(frame_size),
+            'fps': fps,
+            'codec': 'jpeg',
+            'chunk_size': chunk_size,
+        }
+        with open(os.path.join(path, META_FILE), 'w') as f:
+            json.dump(self.meta, f, indent=4)
+        self.tracks = {cam_id: RecordingTrack(path, cam_id, chunk_size, quality) for cam_id in camera_ids}
+
+    def track(self, cam_id):
+        return self.tracks[cam_id]
+
+    def release(self):
+        for track in self.tracks.values():
+            track.release()
+
+class Recording:
+    '''
+        Random access reader of a recording directory. The index of every
+        camera is memory-mapped, so opening hours of video only reads the
+        metadata, and a frame is one index lookup plus one read of its
+        payload; frames that are not asked for are never decoded.
+            index[cam_id]              INDEX_DTYPE records (memmap)
+            position(cam_id, frame_id) index row of a frame id
+            read_encoded / read        payload bytes / decoded BGR frame
+            nearest(cam_id, t)         row captured closest to time t
+            sync_table(tolerance)      rows of synchronized multi-camera instants
+        A recording that is still being written can be opened, its last
+        partial record is ignored.
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.camera_ids = self.meta['cameras']
+        self.frame_size = tuple(self.meta['frame_size'])
+        self.fps = self.meta['fps']
+        self.index = {cam_id: self._map_index(cam_id) for cam_id in self.camera_ids}
+        self._chunks = {}
+
+    def _map_index(self, cam_id):
+        fn = os.path.join(self.path, f"{cam_id}.index")
+        count = os.path.getsize(fn) // INDEX_DTYPE.itemsize if os.path.exists(fn) else 0
+        if count == 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.memmap(fn, dtype=INDEX_DTYPE, mode='r', shape=(count,))
+
+    def __len__(self):
+        return max((len(index) for index in self.index.values()), default=0)
+
+    def frame_ids(self, cam_id):
+        return self.index[cam_id]['frame_id']
+
+    def timestamps(self, cam_id):
+        return self.index[cam_id]['timestamp']
+
+    def position(self, cam_id, frame_id):
+        '''Index row of frame_id, -1 if it was not recorded.'''
+        frame_ids = self.frame_ids(cam_id)
+        if not len(frame_ids):
+            return -1
+        # frame ids without gaps map straight to rows, otherwise binary search
+        row = frame_id - frame_ids[0]
+        if not (0 <= row < len(frame_ids) and frame_ids[row] == frame_id):
+            row = np.searchsorted(frame_ids, frame_id)
+            if row >= len(frame_ids) or frame_ids[row] != frame_id:
+                return -1
+        return int(row)
+
+    def nearest(self, cam_id, timestamp):
+        '''Index row captured closest to timestamp, -1 for an empty track.'''
+        timestamps = self.timestamps(cam_id)
+        if not len(timestamps):
+            return -1
+        after = min(int(np.searchsorted(timestamps, timestamp)), len(timestamps) - 1)
+        before = max(after - 1, 0)
+        return before if abs(timestamps[before] - timestamp) <= abs(timestamps[after] - timestamp) else after
+
+    def _chunk(self, cam_id, chunk, end):
+        key = (cam_id, chunk)
+        if key not in self._chunks or len(self._chunks[key]) < end:
+            # (re)map, the last chunk of a live recording grows
+            fn = os.path.join(self.path, f"{cam_id}_{chunk:04d}.chunk")
+            self._chunks[key] = np.memmap(fn, dtype=np.uint8, mode='r') if os.path.getsize(fn) else np.zeros(0, np.uint8)
+        return self._chunks[key]
+
+    def read_encoded(self, cam_id, row):
+        '''JPEG payload of index row `row` of a camera (a memmap view).'''
+        record = self.index[cam_id][row]
+        start = int(record['offset'])
+        end = start + int(record['size'])
+        return self._chunk(cam_id, int(record['chunk']), end)[start:end]
+
+    def read(self, cam_id, row):
+        '''Decoded BGR frame of index row `row`.'''
+        return cv2.imdecode(np.asarray(self.read_encoded(cam_id, row)), cv2.IMREAD_COLOR)
+
+    def read_frame(self, cam_id, frame_id):
+        row = self.position(cam_id, frame_id)
+        return None if row < 0 else self.read(cam_id, row)
+
+    def sync_table(self, tolerance=None, camera_ids=None):
+        '''
+            Synchronized instants: one row per frame of the first camera, one
+            column per camera holding the index row captured nearest to it, or
+            -1 when no frame lies within tolerance (default half a frame period).
+        '''
+        camera_ids = self.camera_ids if camera_ids is None else camera_ids
+        tolerance = 0.5 / self.fps if tolerance is None else tolerance
+        reference = np.asarray(self.timestamps(camera_ids[0]))
+        table = np.full((len(reference), len(camera_ids)), -1, dtype=np.int64)
+        for column, cam_id in enumerate(camera_ids):
+            table[:, column] = nearest_rows(self.timestamps(cam_id), reference, tolerance)
+        return table
+
+    def close(self):
+        self._chunks = {}
+        self.index = {}
+
+def export_video(recording, cam_id, output_fn, fourcc='MJPG', start=0, stop=None):
+    '''Decode index rows [start, stop) of a camera into a standard video file, returns the frame count.'''
+    rows = range(len(recording.index[cam_id]))[start:stop]
+    writer = cv2.VideoWriter(output_fn, cv2.VideoWriter_fourcc(*fourcc), recording.fps, recording.frame_size)
+    if not writer.isOpened():
+        raise RuntimeError(f"cannot open {output_fn}")
+    for row in rows:
+        writer.write(recording.read(cam_id, row))
+    writer.release()
+    return len(rows)
+
+def extract_images(recording, cam_id, output_dir, rows=None):
+    '''Write the JPEG payloads of the given index rows as frame_<frame id>.jpg, without re-encoding.'''
+    os.makedirs(output_dir, exist_ok=True)
+    rows = range(len(recording.index[cam_id])) if rows is None else rows
+    output_fns = []
+    for row in rows:
+        output_fn = os.path.join(output_dir, f"frame_{int(recording.index[cam_id][row]['frame_id']):05d}.jpg")
+        with open(output_fn, 'wb') as f:
+            f.write(recording.read_encoded(cam_id, row).tobytes())
+        output_fns.append(output_fn)
+    return output_fns
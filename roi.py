@@ -0,0 +1,94 @@
+import numpy as np
+
+def parse_net_resolution(net_resolution, frame_size):
+    '''OpenPose "WxH" (-1 for one side keeps the frame aspect), returns the width / height ratio.'''
+    width, height = [int(value) for value in net_resolution.split('x')]
+    frame_width, frame_height = frame_size
+    if width <= 0 or height <= 0:
+        return frame_width / frame_height
+    return width / height
+
+class RoiTracker:
+    '''
+        Region of interest of one camera for the 2D estimator.
+
+        After every inference update() takes the keypoints found and makes
+        the next region their bounding box, padded by `padding` of its size,
+        grown to the aspect ratio of the network input and to min_size, and
+        clamped to the frame. crop() returns the region of the next frame
+        (a view, no copy) and to_frame() maps keypoints of the crop back to
+        full-frame pixels. Tracking is dropped, i.e. the next frame is run
+        full frame, when fewer than min_keypoints confident keypoints were
+        found, and every refresh_interval frames so people entering the
+        scene outside the region are picked up.
+    '''
+    def __init__(self, frame_size, net_resolution='128x192', padding=0.25, min_size=96,
+            min_confidence=0.15, min_keypoints=4, refresh_interval=30):
+        self.frame_width, self.frame_height = frame_size
+        self.aspect = parse_net_resolution(net_resolution, frame_size)
+        self.padding = padding
+        self.min_size = min_size
+        self.min_confidence = min_confidence
+        self.min_keypoints = min_keypoints
+        self.refresh_interval = refresh_interval
+        self.region = None # (x0, y0, x1, y1), None: full frame
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.lost = 0
+        self.since_refresh = 0
+
+    def set_net_resolution(self, net_resolution):
+        self.aspect = parse_net_resolution(net_resolution, (self.frame_width, self.frame_height))
+
+    def crop(self, frame):
+        '''Returns (image, region) for the next inference, region None for the full frame.'''
+        if self.region is None:
+            self.full_frames += 1
+            return frame, None
+        self.roi_frames += 1
+        x0, y0, x1, y1 = self.region
+        return frame[y0:y1, x0:x1], self.region
+
+    def to_frame(self, people, region):
+        '''Keypoints (people, J, 3) of a crop -> full-frame pixels, in place.'''
+        if region is not None and len(people):
+            detected = people[..., 2] > 0
+            people[..., 0] += region[0] * detected
+            people[..., 1] += region[1] * detected
+        return people
+
+    def update(self, people):
+        '''Set the region of the next frame from the full-frame keypoints (people, J, 3) just found.'''
+        self.since_refresh += 1
+        confident = people[..., 2] >= self.min_confidence if len(people) else np.zeros((0,), dtype=bool)
+        if confident.sum() < self.min_keypoints:
+            if self.region is not None:
+                self.lost += 1
+            self.region = None
+            return
+        if self.refresh_interval and self.since_refresh >= self.refresh_interval:
+            self.since_refresh = 0
+            self.region = None
+            return
+
+        points = people[..., :2][confident]
+        x_min, y_min = points.min(axis=0)
+        x_max, y_max = points.max(axis=0)
+        width = (x_max - x_min) * (1 + 2 * self.padding)
+        height = (y_max - y_min) * (1 + 2 * self.padding)
+        # grow the short side to the network aspect ratio, then to min_size
+        width, height = max(width, height * self.aspect), max(height, width / self.aspect)
+        scale = max(1.0, self.min_size / min(width, height))
+        width = min(width * scale, self.frame_width)
+        height = min(height * scale, self.frame_height)
+        if width >= self.frame_width and height >= self.frame_height:
+            self.region = None
+            return
+        x_center = (x_min + x_max) / 2
+        y_center = (y_min + y_max) / 2
+        x0 = int(np.clip(x_center - width / 2, 0, self.frame_width - width))
+        y0 = int(np.clip(y_center - height / 2, 0, self.frame_height - height))
+        self.region = (x0, y0, x0 + int(np.ceil(width)), y0 + int(np.ceil(height)))
+
+    def stats(self):
+        return {'roi_frames': self.roi_frames, 'full_frames': self.full_frames, 'lost': self.lost}
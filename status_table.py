@@ -0,0 +1,61 @@
+import time
+import ctypes
+from multiprocessing import RawArray
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+class ProcessStatus(ctypes.Structure):
+    _fields_ = [
+        ('halt', ctypes.c_int32),       # control: set by the panel, polled by the process
+        ('running', ctypes.c_int32),
+        ('error', ctypes.c_int32),      # STATUS_OK / STATUS_ERROR
+        ('fps', ctypes.c_double),
+        ('frame_id', ctypes.c_int64),   # last frame id handled by the process
+        ('dropped', ctypes.c_int64),    # frames the process had to drop
+        ('skew', ctypes.c_double),      # mean multi-view capture skew (s), 3D stage
+        ('last_update', ctypes.c_double),
+        ('quality_tier', ctypes.c_int32), # QualityGovernor level of the 2D stage, -1 without governor
+        ('latency', ctypes.c_double),     # smoothed capture -> result latency (s)
+        ('progress', ctypes.c_double),    # 0 .. 1 towards the goal of a finite task (calibration capture)
+        ('frames', ctypes.c_int64),       # frames (poses, rows...) handled since the start
+        ('queue_depth', ctypes.c_int32),  # items waiting in the process' own queues (encoder, synchronizer)
+        ('cpu_time', ctypes.c_double),    # time.process_time() of the process, all its threads (s)
+    ]
+
+class StatusTable:
+    '''
+        Fixed-layout control/status table in shared memory, one ProcessStatus
+        row per process name (e.g. "CameraReader 0", "Recorder"). Every
+        field is a plain aligned scalar with a single writer, so processes
+        read and write their row directly without going through a Manager.
+    '''
+    def __init__(self, process_names):
+        self.process_names = list(process_names)
+        self._index = {name: i for i, name in enumerate(self.process_names)}
+        self._table = RawArray(ProcessStatus, len(self.process_names))
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __getitem__(self, name):
+        # the returned structure is a view on the shared row
+        return self._table[self._index[name]]
+
+    def reset(self, name):
+        status = self[name]
+        status.halt = 0
+        status.running = 1
+        status.error = STATUS_OK
+        status.fps = 0
+        status.frame_id = -1
+        status.dropped = 0
+        status.skew = 0
+        status.last_update = time.time()
+        status.quality_tier = -1
+        status.latency = 0
+        status.progress = 0
+        status.frames = 0
+        status.queue_depth = 0
+        status.cpu_time = 0
+        return status
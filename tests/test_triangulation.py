@@ -0,0 +1,65 @@
+'''
+    Triangulator on a rig with parallel optical axes: joints whose rays are
+    parallel (the same detection in both views) must come out unsolved
+    instead of failing the whole batched solve.
+
+    python -m pytest tests/test_triangulation.py
+'''
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from camera_model import CameraModel, CameraRig
+from triangulation import Triangulator
+
+MTX = [[600, 0, 320], [0, 600, 240], [0, 0, 1]]
+
+def parallel_rig(baseline=0.3):
+    return CameraRig({
+        0: CameraModel(MTX, np.zeros(5)),
+        1: CameraModel(MTX, np.zeros(5), np.eye(3), [-baseline, 0, 0]),
+    })
+
+def detections(rig, point):
+    '''(V, 3) of (u, v, confidence) of a reference frame point.'''
+    rows = []
+    for cam_id in rig.camera_ids:
+        camera = rig.cameras[cam_id]
+        x = camera.projection @ np.append(point, 1.0)
+        rows.append([x[0] / x[2], x[1] / x[2], 0.9])
+    return np.array(rows)
+
+def poses(rig):
+    '''(V, 3 joints, 3): a point seen by both cameras, the same pixel in both views, and a joint below min_confidence.'''
+    views = np.zeros((2, 3, 3))
+    views[:, 0] = detections(rig, [0.1, -0.2, 3.0])
+    views[:, 1] = [400.0, 200.0, 0.9]
+    views[:, 2] = [300.0, 250.0, 0.05]
+    return views
+
+def check(pose_3d, rig):
+    expected = rig.world_transform @ np.array([0.1, -0.2, 3.0])
+    assert np.allclose(pose_3d[0, :3], expected, atol=1e-4)
+    assert pose_3d[0, 3] > 0
+    assert np.all(pose_3d[1:, 3] == 0)
+    assert np.all(pose_3d[1:, :3] == 0)
+
+def test_parallel_rays():
+    rig = parallel_rig()
+    triangulator = Triangulator(rig)
+    check(triangulator.triangulate(poses(rig)), rig)
+
+def test_parallel_rays_robust():
+    rig = parallel_rig()
+    triangulator = Triangulator(rig)
+    pose_3d, joint_error, num_views = triangulator.triangulate_robust(poses(rig))
+    check(pose_3d, rig)
+    assert np.isfinite(joint_error[0]) and np.isinf(joint_error[1])
+
+def test_parallel_rays_batched():
+    rig = parallel_rig()
+    triangulator = Triangulator(rig)
+    sequence = np.stack([poses(rig)] * 4)
+    for pose_3d in triangulator.triangulate(sequence):
+        check(pose_3d, rig)
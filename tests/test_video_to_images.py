@@ -0,0 +1,90 @@
+'''
+    tools/video_to_images.py on two cameras whose frame id counters and
+    first captures differ: the extracted views must pair up by file name.
+
+    python -m pytest tests/test_video_to_images.py
+'''
+import os
+import sys
+import json
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+from video_to_images import make_jobs, extract_job, merge_corners
+
+FPS = 30
+SIZE = (480, 360)
+# (first frame id, first instant, instants) per camera, camera 1 starts 3 frames later
+CAMERAS = [(100, 0, 30), (7, 3, 30)]
+
+def chessboard(square=30, inner=(8, 6)):
+    board = np.kron((np.indices((inner[1] + 1, inner[0] + 1)).sum(axis=0) % 2), np.ones((square, square)))
+    frame = np.full((SIZE[1], SIZE[0]), 255, np.uint8)
+    top, left = (SIZE[1] - board.shape[0]) // 2, (SIZE[0] - board.shape[1]) // 2
+    frame[top:top + board.shape[0], left:left + board.shape[1]] = (board * 255).astype(np.uint8)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+def level(instant):
+    return 7 * instant + 10
+
+def write_videos(path, hidden=None):
+    '''One video per camera plus its frames.csv; a frame shows the board (hidden: {cam_id: instants without it}) or the gray level of its instant.'''
+    board = chessboard() if hidden is not None else None
+    t0 = 1000.0
+    video_fns = []
+    for cam_id, (first_id, first_instant, count) in enumerate(CAMERAS):
+        video_fn = os.path.join(path, f"2024-01-01_00-00-00_{cam_id}.avi")
+        writer = cv2.VideoWriter(video_fn, cv2.VideoWriter_fourcc(*'MJPG'), FPS, SIZE)
+        rows = []
+        for i in range(count):
+            instant = first_instant + i
+            if board is not None and instant not in hidden[cam_id]:
+                frame = board
+            else:
+                frame = np.full((SIZE[1], SIZE[0], 3), level(instant), np.uint8)
+            writer.write(frame)
+            # a few ms of capture skew between the cameras
+            rows.append(f"{first_id + i},{t0 + instant / FPS + 0.004 * cam_id:.6f},0")
+        writer.release()
+        with open(os.path.splitext(video_fn)[0] + ".frames.csv", 'w') as f:
+            f.write("frame_id,capture_time,duplicate\n" + "\n".join(rows) + "\n")
+        video_fns.append(video_fn)
+    return video_fns
+
+def options(corners, stride):
+    return {
+        'selection': {'start': None, 'end': None, 'stride': stride, 'wanted': None},
+        'corners': corners, 'checkerboard_size': (8, 6), 'coarse_width': 640, 'quality': 95,
+    }
+
+def test_images_pair_up(tmp_path):
+    video_fns = write_videos(str(tmp_path))
+    output = os.path.join(str(tmp_path), "out", "{cam_id}")
+    results = [extract_job(job) for job in make_jobs(video_fns, None, output, options(False, 2))]
+    names = [sorted(os.listdir(output.format(cam_id=cam_id))) for cam_id in range(2)]
+    # instants 0, 2 are before camera 1 started
+    expected = [f"frame_{100 + instant:05d}.jpg" for instant in range(4, 30, 2)]
+    assert names[0] == names[1] == expected
+    assert [result['written'] for result in results] == [len(expected)] * 2
+    for name in expected:
+        instant = int(name[6:11]) - 100
+        for cam_id in range(2):
+            image = cv2.imread(os.path.join(output.format(cam_id=cam_id), name))
+            assert abs(image.mean() - level(instant)) < 3
+
+def test_corners_keep_common_views(tmp_path):
+    hidden = {0: {10, 11}, 1: {14}}
+    video_fns = write_videos(str(tmp_path), hidden)
+    output = os.path.join(str(tmp_path), "out", "{cam_id}")
+    opts = options(True, 1)
+    results = [extract_job(job) for job in make_jobs(video_fns, None, output, opts)]
+    cache = merge_corners(results, opts['checkerboard_size'], opts['coarse_width'])
+    expected = [f"frame_{100 + instant:05d}.jpg" for instant in range(3, 30) if instant not in hidden[0] | hidden[1]]
+    for cam_id in range(2):
+        output_dir = output.format(cam_id=cam_id)
+        with open(os.path.join(output_dir, "corners.json")) as f:
+            assert sorted(json.load(f)['frames']) == expected
+        assert sorted(fn for fn in os.listdir(output_dir) if fn.endswith(".jpg")) == expected
+    assert len(cache) >= 1
@@ -0,0 +1,32 @@
+'''
+    Export cameras of a chunked recording (record_format 'chunked') to
+    standard video files "<recording>_<cam_id>.avi", e.g. for players and
+    tools that only read video.
+
+    python tools/export_video.py outputs/2024-09-01_10-30-06 --cameras 0 1 --fourcc MJPG
+'''
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recording import Recording, export_video
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help="recording directory")
+    parser.add_argument('--cameras', type=int, nargs='+', default=None, help="default: all cameras")
+    parser.add_argument('--fourcc', default='MJPG')
+    parser.add_argument('--extension', default='avi')
+    parser.add_argument('--start', type=int, default=0, help="first index row")
+    parser.add_argument('--stop', type=int, default=None, help="index row to stop before")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    for cam_id in args.cameras or recording.camera_ids:
+        output_fn = f"{args.recording.rstrip('/')}_{cam_id}.{args.extension}"
+        count = export_video(recording, cam_id, output_fn, args.fourcc, args.start, args.stop)
+        print(f"Saved {count} frames of camera {cam_id} to {output_fn}")
+
+if __name__ == '__main__':
+    main()
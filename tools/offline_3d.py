@@ -0,0 +1,82 @@
+'''
+    Offline 3D reconstruction of a chunked recording.
+
+    The synchronized instants of the recording (frames of all cameras
+    captured within --tolerance of the first camera's frame) are looked up
+    in the memory-mapped index; only the frames of the instants inside the
+    --start / --end window, every --stride-th, are decoded. Every instant
+    runs the 2D backend on all views, cross-view association and robust
+    triangulation like PoseEstimator3D, and the result is saved as .npz:
+        timestamps (N,), frame_ids (N, cameras), pose_3d (N, max_people, 25, 4)
+
+    python tools/offline_3d.py outputs/2024-09-01_10-30-06 --calibration outputs/calibration/parameters.json
+'''
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recording import Recording
+from camera_model import CameraRig
+from pose_backend import create_pose_backend
+from association import PersonAssociator
+from triangulation import Triangulator
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help="recording directory")
+    parser.add_argument('--calibration', default='outputs/calibration/parameters.json')
+    parser.add_argument('--output', default=None, help="default: <recording>_3d.npz")
+    parser.add_argument('--backend', default='openpose', choices=['openpose', 'stub'])
+    parser.add_argument('--openpose-path', default=None)
+    parser.add_argument('--net', default='128x192', help="net_resolution")
+    parser.add_argument('--tolerance', type=float, default=None, help="sync tolerance (s), default half a frame")
+    parser.add_argument('--start', type=float, default=0.0, help="seconds after the first frame")
+    parser.add_argument('--end', type=float, default=None)
+    parser.add_argument('--stride', type=int, default=1)
+    parser.add_argument('--max-people', type=int, default=4)
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    rig = CameraRig.load(args.calibration)
+    camera_ids = [cam_id for cam_id in recording.camera_ids if cam_id in rig.cameras]
+    triangulator = Triangulator(rig.subset(camera_ids))
+    associator = PersonAssociator(triangulator.rig)
+
+    table = recording.sync_table(args.tolerance, camera_ids)
+    timestamps = np.asarray(recording.timestamps(camera_ids[0]))
+    relative = timestamps - timestamps[0] if len(timestamps) else timestamps
+    selected = (table >= 0).all(axis=1) & (relative >= args.start)
+    if args.end is not None:
+        selected &= relative < args.end
+    print(f"{selected.sum()} of {len(table)} instants in the window synchronized in all of cameras {camera_ids}")
+    instants = np.flatnonzero(selected)[::args.stride]
+
+    config = {'pose_backend': args.backend, 'net_resolution': args.net}
+    if args.openpose_path:
+        config['openpose_path'] = args.openpose_path
+    backend = create_pose_backend(config)
+    backend.load()
+
+    pose_3d = np.zeros((len(instants), args.max_people, 25, 4), dtype=np.float32)
+    frame_ids = np.zeros((len(instants), len(camera_ids)), dtype=np.int64)
+    for index, instant in enumerate(instants):
+        rows = table[instant]
+        frames = [recording.read(cam_id, row) for cam_id, row in zip(camera_ids, rows)]
+        views = backend.infer(frames)
+        persons = associator.associate(views)
+        people, _, _ = triangulator.triangulate_robust(persons)
+        count = min(len(people), args.max_people)
+        pose_3d[index, :count] = people[:count]
+        frame_ids[index] = [recording.index[cam_id][row]['frame_id'] for cam_id, row in zip(camera_ids, rows)]
+        if index % 100 == 0:
+            print(f"{index} / {len(instants)}")
+    backend.close()
+
+    output_fn = args.output or f"{args.recording.rstrip('/')}_3d.npz"
+    np.savez(output_fn, timestamps=timestamps[instants], frame_ids=frame_ids, camera_ids=camera_ids, pose_3d=pose_3d)
+    print(f"Saved {output_fn}")
+
+if __name__ == '__main__':
+    main()
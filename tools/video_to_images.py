@@ -1,43 +1,284 @@
-import cv2
+'''
+    Extract frames of recorded videos (.avi of the 'avi' record format, or
+    the cameras of a chunked recording directory) as JPEG images, e.g. for
+    calibration.
+
+    Selection, combined: --start / --end (seconds from the first frame),
+    --stride (every n-th frame of the window) and --frames / --frames-file
+    (frame ids; with the "<video>.frames.csv" of the Recorder these are the
+    camera frame ids, otherwise positions in the video). The selection is
+    made on the first input (the first camera of a recording); every other
+    input contributes the frame captured nearest to each selected one,
+    within half a frame period, and instants some input has no frame for
+    are left out. Frames that are not selected are only demuxed
+    (VideoCapture.grab), not decoded; a chunked recording copies the stored
+    JPEG payloads without re-encoding. Several inputs are processed in
+    parallel, one process per input.
+
+    --corners streams the selected frames into the chessboard detection
+    instead: only the views in which every input found the board are kept,
+    next to a corners.json, and the corners go into the corner cache of
+    calibration.detect_chessboards so calibration does not detect again
+    (for videos the corners come from the frame before JPEG encoding).
+
+    Output "frame_<frame id>.jpg" in --output, named by the frame id of the
+    first input for all inputs (the camera frame ids are independent
+    counters), so the views of the cameras pair up by file name. {cam_id}
+    is the camera of a recording, or the trailing number of
+    "<date>_<cam_id>.avi".
+
+    python tools/video_to_images.py outputs/2024-09-01_10-30-06_0.avi outputs/2024-09-01_10-30-06_1.avi --stride 30
+    python tools/video_to_images.py outputs/2024-09-01_10-30-06 --cameras 0 1 --start 10 --end 70 --stride 15 --corners
+'''
 import os
+import re
+import sys
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from recording import Recording, is_recording, nearest_rows
+from calibration import find_chessboard, corner_cache_key, load_corner_cache, save_corner_cache
+
+def read_frame_list(fn):
+    '''Frame ids from the first column of a text / csv file, header lines are skipped.'''
+    frame_ids = []
+    with open(fn) as f:
+        for line in f:
+            field = line.split(',')[0].strip()
+            if field.isdigit():
+                frame_ids.append(int(field))
+    return frame_ids
 
-# Input video file path and output images save path
-video_fn = "outputs/calibration/2024-09-01_10-30-06_1.avi"
-images_path = "outputs/calibration/1"
+def select(frame_ids, times, start=None, end=None, stride=1, wanted=None):
+    '''Positions of the frames inside [start, end) s, every stride-th of them, restricted to the wanted frame ids.'''
+    times = np.asarray(times, dtype=np.float64)
+    keep = np.ones(len(times), dtype=bool)
+    if start is not None:
+        keep &= times >= start
+    if end is not None:
+        keep &= times < end
+    positions = np.flatnonzero(keep)[::stride]
+    if wanted is not None:
+        positions = positions[np.isin(np.asarray(frame_ids)[positions], list(wanted))]
+    return positions
 
-# Ensure the output directory exists, create it if it doesn't
-if not os.path.exists(images_path):
-    os.makedirs(images_path)
+def video_frames(video_fn):
+    '''
+        (positions, frame ids, capture times) of the frames of a video that
+        are not duplicates, from the Recorder's frames.csv when there is
+        one, otherwise every position at 1 / fps from 0.
+    '''
+    cap = cv2.VideoCapture(video_fn)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    frame_list_fn = os.path.splitext(video_fn)[0] + ".frames.csv"
+    if os.path.exists(frame_list_fn):
+        table = np.loadtxt(frame_list_fn, delimiter=',', skiprows=1, ndmin=2)
+        if len(table) == count:
+            positions = np.flatnonzero(table[:, 2] == 0) if table.shape[1] > 2 else np.arange(count)
+            return positions, table[positions, 0].astype(np.int64), table[positions, 1]
+    return np.arange(count), np.arange(count), np.arange(count) / fps
 
-# Open the video file
-cap = cv2.VideoCapture(video_fn)
+def input_frames(source, cam_id):
+    '''(rows, frame ids, capture times) of a video (cam_id None) or of a camera of a recording, without duplicates.'''
+    if cam_id is None:
+        return video_frames(source)
+    recording = Recording(source)
+    index = recording.index[cam_id]
+    rows = np.flatnonzero(index['duplicate'] == 0)
+    frames = rows, np.array(index['frame_id'][rows]), np.array(index['timestamp'][rows])
+    recording.close()
+    return frames
 
-# Check if the video file was successfully opened
-if not cap.isOpened():
-    print(f"Error: Cannot open video file {video_fn}")
-    exit()
+def align(frames, selection):
+    '''
+        [(row, key)] per input of frames (input_frames of every input): the
+        selected frames of the first input, keyed by its frame id, and the
+        frames of the other inputs captured nearest to them. An instant is
+        kept only if every input has a frame within half a frame period.
+    '''
+    rows, frame_ids, times = frames[0]
+    positions = select(frame_ids, times - (times[0] if len(times) else 0), **selection)
+    reference = times[positions]
+    tolerance = 0.5 * np.median(np.diff(times)) if len(times) > 1 else np.inf
+    matched = [positions] + [nearest_rows(input_times, reference, tolerance) for _, _, input_times in frames[1:]]
+    complete = np.all(np.array(matched).reshape(len(frames), -1) >= 0, axis=0)
+    keys = frame_ids[positions][complete].tolist()
+    return [list(zip(input_rows[found[complete]].tolist(), keys)) for (input_rows, _, _), found in zip(frames, matched)]
 
-# Initialize frame counter
-frame_count = 0
+class FrameHandler:
+    '''Writes the frames (images mode) or only those with a chessboard, collecting their corners (corners mode).'''
+    def __init__(self, output_dir, corners, checkerboard_size, coarse_width, quality):
+        self.output_dir = output_dir
+        self.corners = corners
+        self.checkerboard_size = checkerboard_size
+        self.coarse_width = coarse_width
+        self.quality = quality
+        self.found = {}
+        self.image_size = None
+        self.written = 0
+        os.makedirs(output_dir, exist_ok=True)
 
-while True:
-    ret, frame = cap.read()  # Read a frame
-    if not ret:
-        break  # Exit the loop if there are no more frames to read
+    def __call__(self, key, frame, payload=None):
+        output_fn = os.path.join(self.output_dir, f"frame_{key:05d}.jpg")
+        if self.corners:
+            self.image_size = (frame.shape[1], frame.shape[0])
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            corners = find_chessboard(gray, self.checkerboard_size, self.coarse_width)
+            if corners is None:
+                return
+            self.found[output_fn] = corners.reshape(-1, 2).tolist()
+        if payload is not None:
+            with open(output_fn, 'wb') as f:
+                f.write(payload)
+        else:
+            cv2.imwrite(output_fn, frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        self.written += 1
 
-    # Construct the output image filename
-    img_filename = os.path.join(images_path, f"frame_{frame_count:05d}.jpg")
+def extract_job(job):
+    source, cam_id, output_dir, targets, options = job
+    start_time = time.perf_counter()
+    handler = FrameHandler(output_dir, options['corners'], options['checkerboard_size'], options['coarse_width'], options['quality'])
+    decoded = 0
+    if cam_id is not None:
+        recording = Recording(source)
+        for row, key in targets:
+            payload = recording.read_encoded(cam_id, row).tobytes()
+            frame = None
+            if options['corners']:
+                frame = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+                decoded += 1
+            handler(key, frame, payload)
+        recording.close()
+    else:
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise RuntimeError(f"cannot open video file {source}")
+        position = 0
+        for target, key in targets:
+            # skipped frames are demuxed only
+            while position < target and cap.grab():
+                position += 1
+            if position < target:
+                break
+            ok, frame = cap.read()
+            position += 1
+            if not ok:
+                break
+            decoded += 1
+            handler(key, frame)
+        cap.release()
+    return {
+        'source': source if cam_id is None else f"{source} camera {cam_id}",
+        'output_dir': output_dir,
+        'selected': len(targets),
+        'decoded': decoded,
+        'written': handler.written,
+        'found': handler.found,
+        'image_size': handler.image_size,
+        'seconds': time.perf_counter() - start_time,
+    }
 
-    # Save the image
-    cv2.imwrite(img_filename, frame)
+def merge_corners(results, checkerboard_size, coarse_width):
+    '''
+        Keeps the views in which every input found the board: the images of
+        the others are removed and each output directory gets its
+        corners.json. Returns the corner cache entries of the kept images.
+    '''
+    common = set.intersection(*[{os.path.basename(image_fn) for image_fn in result['found']} for result in results]) if results else set()
+    cache = {}
+    for result in results:
+        kept = {}
+        for image_fn, corners in result['found'].items():
+            if os.path.basename(image_fn) not in common:
+                os.remove(image_fn)
+                continue
+            kept[os.path.basename(image_fn)] = corners
+            cache[corner_cache_key(image_fn, checkerboard_size, coarse_width)] = {'corners': corners, 'size': list(result['image_size'])}
+        result['written'] = len(kept)
+        with open(os.path.join(result['output_dir'], "corners.json"), 'w') as f:
+            json.dump({
+                'checkerboard_size': list(checkerboard_size),
+                'image_size': None if result['image_size'] is None else list(result['image_size']),
+                'frames': kept,
+            }, f)
+    return cache
 
-    # Print save information
-    print(f"Saved {img_filename}")
+def make_jobs(inputs, cameras, output, options):
+    '''One job per video / camera of a recording, all aligned to the selected frames of the first one.'''
+    sources = []
+    for source in inputs:
+        source = source.rstrip('/\\')
+        if is_recording(source):
+            recording = Recording(source)
+            for cam_id in cameras or recording.camera_ids:
+                sources.append((source, cam_id, output.format(cam_id=cam_id)))
+            recording.close()
+        else:
+            stem = os.path.splitext(os.path.basename(source))[0]
+            match = re.search(r"_(\d+)$", stem)
+            sources.append((source, None, output.format(cam_id=match.group(1) if match else stem)))
+    if not sources:
+        return []
+    targets = align([input_frames(source, cam_id) for source, cam_id, _ in sources], options['selection'])
+    return [(source, cam_id, output_dir, input_targets, options) for (source, cam_id, output_dir), input_targets in zip(sources, targets)]
 
-    # Increment frame counter
-    frame_count += 1
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help="video files and / or chunked recording directories")
+    parser.add_argument('--output', default="outputs/calibration/{cam_id}", help="output directory, {cam_id} is filled in")
+    parser.add_argument('--cameras', type=int, nargs='+', default=None, help="cameras of a recording, default: all")
+    parser.add_argument('--start', type=float, default=None, help="s from the first frame")
+    parser.add_argument('--end', type=float, default=None, help="s from the first frame")
+    parser.add_argument('--stride', type=int, default=1)
+    parser.add_argument('--frames', type=int, nargs='+', default=None, help="frame ids of the first input")
+    parser.add_argument('--frames-file', default=None, help="file with one frame id per line (first csv column)")
+    parser.add_argument('--quality', type=int, default=95, help="JPEG quality of decoded video frames")
+    parser.add_argument('--corners', action='store_true', help="write only frames with a chessboard, plus their corners")
+    parser.add_argument('--checkerboard-size', type=int, nargs=2, default=[8, 6])
+    parser.add_argument('--coarse-width', type=int, default=640)
+    parser.add_argument('--cache', default='outputs/calibration/corners_cache.json', help="corner cache to update, '' for none")
+    parser.add_argument('--processes', type=int, default=None, help="default: one per input, up to the core count")
+    args = parser.parse_args()
 
-# Release the video capture object
-cap.release()
+    wanted = None
+    if args.frames or args.frames_file:
+        wanted = set(args.frames or []) | set(read_frame_list(args.frames_file) if args.frames_file else [])
+    options = {
+        'selection': {'start': args.start, 'end': args.end, 'stride': args.stride, 'wanted': wanted},
+        'corners': args.corners,
+        'checkerboard_size': tuple(args.checkerboard_size),
+        'coarse_width': args.coarse_width,
+        'quality': args.quality,
+    }
+    jobs = make_jobs(args.inputs, args.cameras, args.output, options)
+    processes = args.processes or min(len(jobs), os.cpu_count() or 1)
+    start_time = time.perf_counter()
+    if processes == 1 or len(jobs) == 1:
+        results = map(extract_job, jobs)
+    else:
+        pool = Pool(processes)
+        results = pool.imap_unordered(extract_job, jobs)
+    results = list(results)
+    if processes > 1 and len(jobs) > 1:
+        pool.close()
+        pool.join()
+    cache = merge_corners(results, options['checkerboard_size'], options['coarse_width']) if args.corners else {}
+    for result in results:
+        found = f", board found in {len(result['found'])}, in every input in {result['written']}" if args.corners else ""
+        print(f"{result['source']}: {result['written']} of {result['selected']} selected frames written to {result['output_dir']}{found} ({result['seconds']:.1f} s)")
+    if cache and args.cache:
+        # merged once here, the workers never write the shared cache file
+        merged = load_corner_cache(args.cache)
+        merged.update(cache)
+        save_corner_cache(args.cache, merged)
+    print(f"Finished in {time.perf_counter() - start_time:.1f} s")
 
-print("Finished extracting frames.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import numpy as np
+
+class Triangulator:
+    '''
+        Batched confidence-weighted linear (DLT) triangulation over a CameraRig.
+
+        triangulate() undistorts the keypoints of each view in a single call
+        and solves every joint with one batched 3x3 solve of the weighted DLT
+        normal equations, using the projection matrices cached by the rig.
+        Input can be one skeleton per view (V, J, 3) or a whole sequence
+        (T, V, J, 3) of (u, v, confidence), views in rig.camera_ids order;
+        output is (J, 4) / (T, J, 4) of (x, y, z, confidence) in the world
+        frame, with zero confidence for joints seen by fewer than two views.
+        Assign a new rig to `rig` to switch calibration between frames.
+    '''
+    def __init__(self, rig, min_confidence=0.1, max_reprojection_error=15.0, max_views=None, iterations=2):
+        self.rig = rig
+        self.min_confidence = min_confidence
+        self.max_reprojection_error = max_reprojection_error # pixels, triangulate_robust only
+        self.max_views = max_views # best views kept per joint, triangulate_robust only
+        self.iterations = iterations
+
+    @property
+    def num_views(self):
+        return len(self.rig)
+
+    def triangulate(self, poses):
+        rig = self.rig # one calibration for the whole call, even if swapped meanwhile
+        poses = np.asarray(poses)
+        points = rig.undistort(poses[..., :2])
+        confidence = poses[..., 2].astype(np.float64)
+        used = confidence >= self.min_confidence
+        X, solvable = self._solve(rig, points, confidence, used)
+        return self._output(rig, X, confidence, used, solvable)
+
+    def triangulate_robust(self, poses):
+        '''
+            Per-joint view selection for N views. Starting from the views
+            above min_confidence (the max_views most confident ones if set),
+            views whose reprojection error exceeds max_reprojection_error are
+            rejected and the joint is solved again, `iterations` times. A joint
+            always keeps its two most consistent views if it had two.
+            Returns pose_3d (..., J, 4), the mean reprojection error in pixels
+            of the kept views (..., J) and the number of kept views (..., J).
+        '''
+        rig = self.rig
+        poses = np.asarray(poses)
+        pixels = poses[..., :2].astype(np.float64)
+        points = rig.undistort(pixels)
+        confidence = poses[..., 2].astype(np.float64)
+        valid = confidence >= self.min_confidence
+        if self.max_views is not None and self.max_views < valid.shape[-2]:
+            # rank of every view per joint by confidence, 0 = most confident
+            rank = np.argsort(np.argsort(-np.where(valid, confidence, -1.0), axis=-2), axis=-2)
+            valid &= rank < self.max_views
+
+        used = valid
+        X, solvable = self._solve(rig, points, confidence, used)
+        error = self._reprojection_error(rig, X, pixels)
+        for _ in range(self.iterations):
+            inlier = valid & (error <= self.max_reprojection_error)
+            # keep the two most consistent valid views of joints that would drop below two
+            order = np.argsort(np.where(valid, error, np.inf), axis=-2)
+            best_two = np.zeros_like(valid)
+            np.put_along_axis(best_two, order[..., :2, :], True, axis=-2)
+            keep_best = (inlier.sum(axis=-2) < 2)[..., None, :]
+            inlier = np.where(keep_best, valid & best_two, inlier)
+            if np.array_equal(inlier, used):
+                break
+            used = inlier
+            X, solvable = self._solve(rig, points, confidence, used)
+            error = self._reprojection_error(rig, X, pixels)
+
+        num_views = used.sum(axis=-2)
+        joint_error = np.where(used, error, 0.0).sum(axis=-2) / np.maximum(num_views, 1)
+        joint_error[~solvable] = np.inf
+        return self._output(rig, X, confidence, used, solvable), joint_error.astype(np.float32), num_views
+
+    def _solve(self, rig, points, confidence, used):
+        '''
+            Weighted DLT for all joints at once, returns (..., J, 3) in the
+            reference camera frame and (..., J) whether the joint could be solved.
+        '''
+        weight = np.where(used, confidence, 0.0)
+
+        # one pair of DLT rows per view and joint: (u * P3 - P1) . [X, 1] = 0
+        P = rig.extrinsics[:, None] # (V, 1, 3, 4), broadcast over joints
+        rows = np.stack([
+            points[..., 0, None] * P[..., 2, :] - P[..., 0, :],
+            points[..., 1, None] * P[..., 2, :] - P[..., 1, :]
+        ], axis=-2) * weight[..., None, None] # (..., V, J, 2, 4)
+        # gather the rows of all views per joint: (..., J, 2V, 4)
+        rows = np.moveaxis(rows, -4, -3).reshape(rows.shape[:-4] + (rows.shape[-3], 2 * rows.shape[-4], 4))
+        A = rows[..., :3]
+        AtA = np.swapaxes(A, -1, -2) @ A # (..., J, 3, 3)
+        Atb = np.swapaxes(A, -1, -2) @ -rows[..., 3:] # (..., J, 3, 1)
+
+        solvable = used.sum(axis=-2) >= 2
+        # parallel rays (e.g. the same detection in cameras with parallel axes)
+        # leave AtA singular, such joints are dropped like those seen by one view
+        scale = np.trace(AtA, axis1=-2, axis2=-1) / 3
+        solvable &= np.linalg.det(AtA) > 1e-9 * scale ** 3
+        AtA[~solvable] = np.eye(3)
+        Atb[~solvable] = 0
+        return np.linalg.solve(AtA, Atb)[..., 0], solvable
+
+    def _reprojection_error(self, rig, X, pixels):
+        '''Pixel distance between the reprojection of X and the detections, (..., V, J).'''
+        projected, depth = rig.project(X, world=False)
+        error = np.linalg.norm(projected - pixels, axis=-1)
+        # points behind a camera are never consistent with it
+        return np.where(depth > 0, error, np.inf)
+
+    def _output(self, rig, X, confidence, used, solvable):
+        num_views = used.sum(axis=-2)
+        # confidence: (prod c) ** (2 / n), i.e. c0 * c1 for a stereo pair
+        log_confidence = np.where(used, np.log(np.where(used, confidence, 1.0)), 0.0).sum(axis=-2)
+        joint_confidence = np.where(solvable, np.exp(2 * log_confidence / np.maximum(num_views, 1)), 0.0)
+
+        pose_3d = np.empty(X.shape[:-1] + (4,), dtype=np.float32)
+        pose_3d[..., :3] = X @ rig.world_transform.T
+        pose_3d[..., 3] = joint_confidence
+        pose_3d[~solvable, :3] = 0
+        return pose_3d
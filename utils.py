@@ -1,19 +1,21 @@
 import cv2
+import time
 import numpy as np
 
+def capture_clock():
+    # monotonic, high resolution and shared by all processes of the machine
+    # (QueryPerformanceCounter on Windows, CLOCK_MONOTONIC on Linux)
+    return time.perf_counter()
+
+# resolution_fps_setting -> (width, height, fps)
+FRAME_SIZE_RATES = {
+    "640x480@30": (640, 480, 30),
+    "1280x720@60": (1280, 720, 60),
+    "1920x1080@30": (1920, 1080, 30),
+}
+
 def decode_frame_size_rate(setting_str):
-    if setting_str == "640x480@30":
-        frameWidth  = 640
-        frameHeight = 480
-        fps = 30
-    elif setting_str == "1280x720@60":
-        frameWidth  = 1280
-        frameHeight = 720
-        fps = 60
-    elif setting_str == "1920x1080@30":
-        frameWidth  = 1920
-        frameHeight = 1080
-        fps = 30
+    frameWidth, frameHeight, fps = FRAME_SIZE_RATES[setting_str]
     return frameWidth, frameHeight, fps
 
 def print_cam_informations(cam_id, cam, type="simple"):
@@ -44,4 +46,20 @@ BODY25_SKELETON_EDGES = np.array([
     [8, 12], [12, 13], [13, 14], [14, 19], [14, 21], [19, 20],
     [0, 15], [15, 17],
     [0, 16], [16, 18]
-])
\ No newline at end of file
+])
+
+class RateMeter:
+    '''Events per second over the last `window` events, from capture_clock() stamps.'''
+    def __init__(self, window=60):
+        self.stamps = np.zeros(window)
+        self.count = 0
+
+    def tick(self, now=None):
+        now = capture_clock() if now is None else now
+        window = len(self.stamps)
+        oldest = self.stamps[(self.count + 1) % window] if self.count >= window - 1 else self.stamps[0]
+        self.stamps[self.count % window] = now
+        self.count += 1
+        if self.count < 2 or now <= oldest:
+            return 0.0
+        return (min(self.count, window) - 1) / (now - oldest)